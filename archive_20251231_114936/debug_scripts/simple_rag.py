@@ -8,9 +8,36 @@ from config import Config
 from vector_store import VectorStore
 from rag_assistant import RAGAssistant
 from langchain_community.llms import Ollama
+from functools import lru_cache
 import time
 
 
+@lru_cache(maxsize=1024)
+def _optimize_query_cached(question: str) -> str:
+    """缓存查询优化结果，相同问题不再重复改写"""
+    return RAGAssistant.optimize_query(question)
+
+
+@lru_cache(maxsize=1)
+def _get_vector_store() -> VectorStore:
+    """复用同一个 VectorStore，避免每次查询都重新加载嵌入模型和数据库
+
+    Chroma 的只读检索可以并发调用，这里无需额外加锁。
+    """
+    return VectorStore()
+
+
+@lru_cache(maxsize=1)
+def _get_llm() -> Ollama:
+    """复用同一个 Ollama 客户端"""
+    return Ollama(
+        base_url=Config.OLLAMA_API_URL,
+        model=Config.OLLAMA_MODEL,
+        temperature=Config.TEMPERATURE,
+        num_predict=Config.MAX_TOKENS,
+    )
+
+
 def simple_rag_query(question: str, k: int = 3) -> dict:
     """简化的 RAG 查询
     
@@ -24,7 +51,7 @@ def simple_rag_query(question: str, k: int = 3) -> dict:
     print(f"\n📝 问题: {question}\n")
     
     # 0. 优化查询
-    optimized_q = RAGAssistant.optimize_query(question)
+    optimized_q = _optimize_query_cached(question)
     if optimized_q != question:
         print(f"✓ 查询优化: '{question}' → '{optimized_q}'")
         search_query = optimized_q
@@ -33,7 +60,7 @@ def simple_rag_query(question: str, k: int = 3) -> dict:
     
     # 1. 检索相关文档
     print("🔍 检索相关文档...")
-    vector_store = VectorStore()
+    vector_store = _get_vector_store()
     docs = vector_store.similarity_search(search_query, k=k)
     
     if not docs:
@@ -69,12 +96,7 @@ def simple_rag_query(question: str, k: int = 3) -> dict:
     print("🤖 LLM 生成答案...")
     start = time.time()
     
-    llm = Ollama(
-        base_url=Config.OLLAMA_API_URL,
-        model=Config.OLLAMA_MODEL,
-        temperature=Config.TEMPERATURE,
-        num_predict=Config.MAX_TOKENS,
-    )
+    llm = _get_llm()
     
     try:
         answer = llm.invoke(prompt)
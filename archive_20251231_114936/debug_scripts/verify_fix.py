@@ -5,6 +5,8 @@
 from rag_assistant import RAGAssistant
 from vector_store import VectorStore
 
+_NL_TRANS = str.maketrans({'\n': ' ', '\r': ' ', '\t': ' '})
+
 def verify_fix():
     """验证修复是否有效"""
     print("\n" + "="*70)
@@ -20,7 +22,7 @@ def verify_fix():
     
     if results:
         doc = results[0]
-        content = doc.page_content[:100].replace('\n', ' ')
+        content = doc.page_content[:100].translate(_NL_TRANS)
         source = doc.metadata.get('source', '未知')
         print(f"✓ 查询成功: '{query}'")
         print(f"  来源: {source}")
@@ -50,7 +52,7 @@ def verify_fix():
             try:
                 if hasattr(doc, 'metadata') and hasattr(doc, 'page_content'):
                     source = doc.metadata.get('source', '未知')
-                    content = doc.page_content[:80].replace('\n', ' ')
+                    content = doc.page_content[:80].translate(_NL_TRANS)
                     print(f"\n  [{i}] {source}")
                     print(f"      {content}...")
                 else:
@@ -1,5 +1,8 @@
 #!/usr/bin/env python
 """快速验证 Ollama 解析改进"""
+import mmap
+import os
+import re
 import sys
 import time
 
@@ -10,10 +13,6 @@ def verify_ollama_improvements():
     print("=" * 60)
     
     try:
-        # 读取 app_api.py
-        with open('app_api.py', 'r', encoding='utf-8') as f:
-            content = f.read()
-        
         # 检查项
         checks = [
             ("改进的提示词", "你是一个专业的信息提取助手"),
@@ -24,10 +23,20 @@ def verify_ollama_improvements():
             ("最终长度检查", "最终答案长度:"),
         ]
         
+        # 所有关键词合并为一个 bytes 交替式正则，直接在内存映射的 app_api.py 上扫描一次，
+        # 不把整个文件解码成 str
+        pattern = re.compile(b"|".join(re.escape(keyword.encode("utf-8")) for _, keyword in checks))
+        with open('app_api.py', 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:  # 空文件无法映射
+                found = set()
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    found = {m.group().decode("utf-8") for m in pattern.finditer(mm)}
+        
         print("\n✅ 检查改进项:\n")
         all_ok = True
         for name, keyword in checks:
-            if keyword in content:
+            if keyword in found:
                 print(f"✅ {name}")
             else:
                 print(f"❌ {name} - 未找到: '{keyword}'")
@@ -18,7 +18,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from src.config.settings import Config
 from src.core.document_processor import DocumentProcessor
-from src.core.vector_store import VectorStore
+from src.core.vector_store import create_vector_store
 from src.services.rag_assistant import RAGAssistant
 from src.services.ollama_client import generate as ollama_generate
 
@@ -45,7 +45,7 @@ def build_knowledge_base(documents_path: str):
         return
     
     # 创建向量数据库
-    vector_store = VectorStore()
+    vector_store = create_vector_store()
     vector_store.create_vectorstore(chunks)
     
     print("\n" + "="*60)
@@ -4,7 +4,7 @@ import json
 import re
 import logging
 import time
-from typing import List, Dict, Any, Optional, Callable, Generator, AsyncGenerator
+from typing import List, Dict, Any, Optional, Callable, Generator, AsyncGenerator, NamedTuple
 from dataclasses import dataclass, field
 from enum import Enum
 from abc import ABC, abstractmethod
@@ -12,11 +12,11 @@ from datetime import datetime
 import pytz
 
 from src.config.settings import Config
+from src.agent.tools.base import LazyToolRegistry
 
 
-@dataclass
-class StreamEvent:
-    """流式事件"""
+class StreamEvent(NamedTuple):
+    """流式事件（NamedTuple：每个 token 都会创建一个，比 dataclass 构造更轻量）"""
     type: str  # 'thinking', 'action', 'observation', 'answer', 'token', 'error', 'done'
     data: Any = None
     step: int = 0
@@ -45,6 +45,7 @@ class AgentConfig:
     enable_planning: bool = True    # 启用规划能力
     verbose: bool = True            # 详细输出
     llm_timeout: int = 30           # LLM请求超时时间（秒）
+    max_observation_chars: int = 2000  # 思考步骤中保留的观察结果最大长度
     
 
 @dataclass
@@ -72,7 +73,11 @@ class AgentResponse:
 
 class BaseAgent(ABC):
     """Agent 基类 - 实现 ReAct 推理循环"""
-    
+
+    # Final Answer 之后模型若继续输出新的推理段落，视为答案结束
+    FINAL_ANSWER_STOP_PATTERN = re.compile(r'\n\s*(?:Thought|Action|Observation):')
+    FINAL_ANSWER_STOP_WORDS = ("Thought:", "Action:", "Observation:")
+
     # ReAct 提示词模板
     REACT_PROMPT = """你是一个知识库助手，具备多种工具和能力。请按照以下格式进行推理和行动：
 
@@ -181,7 +186,7 @@ Step 2: [具体行动]
             config: Agent 配置
         """
         self.config = config or AgentConfig()
-        self.tools: Dict[str, 'BaseTool'] = {}
+        self.tools: LazyToolRegistry = LazyToolRegistry()
         self.state = AgentState.IDLE
         self.thought_history: List[ThoughtStep] = []
         self.llm = self._init_llm()
@@ -193,14 +198,14 @@ Step 2: [具体行动]
         Args:
             streaming: 是否启用流式输出
         """
-        if Config.MODEL_PROVIDER == "ollama":
+        if Config.get_model_provider() == "ollama":
             from langchain_community.llms import Ollama
             return Ollama(
                 base_url=Config.OLLAMA_API_URL,
                 model=Config.OLLAMA_MODEL,
                 temperature=self.config.temperature,
             )
-        elif Config.MODEL_PROVIDER == "deepseek":
+        elif Config.get_model_provider() == "deepseek":
             from langchain_deepseek import ChatDeepSeek
             return ChatDeepSeek(
                 model=Config.LLM_MODEL,
@@ -213,7 +218,7 @@ Step 2: [具体行动]
             return init_chat_model(
                 Config.LLM_MODEL,
                 temperature=self.config.temperature,
-                model_provider=Config.MODEL_PROVIDER,
+                model_provider=Config.get_model_provider(),
                 streaming=streaming,
             )
     
@@ -226,6 +231,17 @@ Step 2: [具体行动]
         self.tools[tool.name] = tool
         if self.config.verbose:
             print(f"✓ 注册工具: {tool.name}")
+
+    def register_lazy(self, name: str, factory: Callable[[], 'BaseTool']):
+        """注册延迟创建的工具，首次使用时才实例化
+
+        Args:
+            name: 工具名称
+            factory: 返回工具实例的无参可调用对象
+        """
+        self.tools.register_lazy(name, factory)
+        if self.config.verbose:
+            print(f"✓ 注册工具: {name}")
     
     def get_tools_description(self) -> str:
         """获取所有工具的描述"""
@@ -239,7 +255,22 @@ Step 2: [具体行动]
                 f"- {name}: {tool.description}\n  参数: {params_desc}"
             )
         return "\n".join(descriptions)
-    
+
+    @classmethod
+    def _stop_marker_tail(cls, text: str) -> int:
+        """text 结尾可能是停止标记开头部分的长度（如 "\n  Act"），不可能匹配时返回 0"""
+        last_newline = text.rfind("\n")
+        if last_newline == -1:
+            return 0
+        rest = text[last_newline + 1:].lstrip()
+        if not any(word.startswith(rest) for word in cls.FINAL_ANSWER_STOP_WORDS):
+            return 0
+        # 标记可从紧邻的连续空白中最早的换行开始匹配（\n\s*），一并暂缓
+        start = last_newline
+        while start > 0 and text[start - 1].isspace():
+            start -= 1
+        return len(text) - text.index("\n", start)
+
     def _parse_action(self, response: str) -> tuple:
         """解析 LLM 响应中的 Action
         
@@ -305,6 +336,12 @@ Step 2: [具体行动]
         
         return (None, None)
     
+    def _clip_observation(self, observation: Any) -> Any:
+        """截断过长的观察结果，避免大段工具输出在整个请求期间驻留内存"""
+        if isinstance(observation, str):
+            return observation[:self.config.max_observation_chars]
+        return observation
+    
     def _execute_action(self, action_name: str, action_input: Dict) -> tuple:
         """执行工具动作
         
@@ -319,8 +356,8 @@ Step 2: [具体行动]
             error_msg = f"错误: 未知工具 '{action_name}'，可用工具: {list(self.tools.keys())}"
             return (error_msg, {"error": error_msg})
         
-        tool = self.tools[action_name]
         try:
+            tool = self.tools[action_name]
             result = tool.execute(**action_input)
             if result.success:
                 # 返回文本输出和结构化数据
@@ -505,8 +542,8 @@ Step 2: [具体行动]
                 tool_elapsed = time.time() - tool_start
                 logger.info(f"[Agent] 工具执行完成 - 耗时: {tool_elapsed:.2f}秒, 结果长度: {len(str(observation_text))}")
                 
-                # 存储观察结果（包含文本和结构化数据）
-                thought_step.observation = observation_text
+                # 存储观察结果（包含文本和结构化数据），只保留前 max_observation_chars 个字符
+                thought_step.observation = self._clip_observation(observation_text)
                 # 添加结构化数据到thought_step中以供后续使用
                 if not hasattr(thought_step, 'observation_data'):
                     thought_step.observation_data = structured_data
@@ -608,36 +645,63 @@ Step 2: [具体行动]
                 # 使用流式 LLM
                 is_final_answer = False  # 标记是否进入 Final Answer 阶段
                 final_answer_buffer = ""  # 累积最终答案
-                
-                for chunk in self.llm_streaming.stream(current_prompt):
-                    # 处理不同类型的响应
-                    if isinstance(chunk, str):
-                        token = chunk
-                    elif hasattr(chunk, 'content'):
-                        token = chunk.content
-                    else:
-                        token = str(chunk)
-                    
-                    llm_output += token
-                    
-                    # 检测是否进入 Final Answer 阶段
-                    if not is_final_answer and "Final Answer:" in llm_output:
-                        is_final_answer = True
-                        # 提取 Final Answer 之后的部分
-                        final_start = llm_output.find("Final Answer:")
-                        final_answer_buffer = llm_output[final_start + len("Final Answer:"):].lstrip()
-                        yield StreamEvent(type='answer_start', step=iterations)
-                        # 发送已有的答案部分
-                        if final_answer_buffer:
-                            yield StreamEvent(type='answer_token', data=final_answer_buffer, step=iterations)
-                    elif is_final_answer:
-                        # 已经在 Final Answer 阶段，流式输出答案 token
-                        final_answer_buffer += token
-                        yield StreamEvent(type='answer_token', data=token, step=iterations)
+                emitted = 0  # final_answer_buffer 中已发送给客户端的字符数
+
+                stream = self.llm_streaming.stream(current_prompt)
+                try:
+                    for chunk in stream:
+                        # 处理不同类型的响应
+                        if isinstance(chunk, str):
+                            token = chunk
+                        elif hasattr(chunk, 'content'):
+                            token = chunk.content
+                        else:
+                            token = str(chunk)
+
+                        llm_output += token
+
+                        # 检测是否进入 Final Answer 阶段
+                        if not is_final_answer and "Final Answer:" in llm_output:
+                            is_final_answer = True
+                            # 提取 Final Answer 之后的部分
+                            final_start = llm_output.find("Final Answer:")
+                            final_answer_buffer = llm_output[final_start + len("Final Answer:"):].lstrip()
+                            yield StreamEvent(type='answer_start', step=iterations)
+                        elif is_final_answer:
+                            # 已经在 Final Answer 阶段，流式输出答案 token
+                            final_answer_buffer += token
+                        else:
+                            # 思考过程，发送状态更新（不逐字输出）
+                            continue
+
+                        # 答案之后模型又开始新的 Thought/Action：截断多余内容并提前结束生成
+                        stop_match = self.FINAL_ANSWER_STOP_PATTERN.search(final_answer_buffer)
+                        if stop_match:
+                            overflow = len(final_answer_buffer) - stop_match.start()
+                            llm_output = llm_output[:len(llm_output) - overflow]
+                            final_answer_buffer = final_answer_buffer[:stop_match.start()]
+                            safe_end = len(final_answer_buffer)
+                        else:
+                            # 结尾可能是被拆到多个 token 的停止标记（如 "\nThou"），确认不是之后再发送
+                            safe_end = len(final_answer_buffer) - self._stop_marker_tail(final_answer_buffer)
+
+                        if safe_end > emitted:
+                            yield StreamEvent(type='answer_token', data=final_answer_buffer[emitted:safe_end], step=iterations)
+                            emitted = safe_end
+
+                        if stop_match:
+                            logger.info(f"[Agent Stream] 检测到 Final Answer 结束，提前终止 LLM 生成")
+                            break
                     else:
-                        # 思考过程，发送状态更新（不逐字输出）
-                        pass
-                
+                        # 生成正常结束：补发暂缓发送的结尾
+                        if is_final_answer and emitted < len(final_answer_buffer):
+                            yield StreamEvent(type='answer_token', data=final_answer_buffer[emitted:], step=iterations)
+                finally:
+                    # 关闭底层生成器会断开 HTTP 连接，Ollama 等服务端随之停止生成
+                    close = getattr(stream, 'close', None)
+                    if close is not None:
+                        close()
+
                 yield StreamEvent(type='thinking_end', data=llm_output, step=iterations)
                 
             except Exception as e:
@@ -682,7 +746,7 @@ Step 2: [具体行动]
                 logger.info(f"[Agent Stream] 执行工具: {action_name}")
                 observation_text, structured_data = self._execute_action(action_name, action_input)
                 
-                thought_step.observation = observation_text
+                thought_step.observation = self._clip_observation(observation_text)
                 thought_step.observation_data = structured_data
                 tools_used.append(action_name)
                 
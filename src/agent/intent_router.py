@@ -110,14 +110,14 @@ class IntentRouter:
         
     def _init_llm(self):
         """初始化 LLM"""
-        if Config.MODEL_PROVIDER == "ollama":
+        if Config.get_model_provider() == "ollama":
             from langchain_community.llms import Ollama
             return Ollama(
                 base_url=Config.OLLAMA_API_URL,
                 model=Config.OLLAMA_MODEL,
                 temperature=0.1,  # 低温度以获得更确定的分析
             )
-        elif Config.MODEL_PROVIDER == "deepseek":
+        elif Config.get_model_provider() == "deepseek":
             from langchain_deepseek import ChatDeepSeek
             return ChatDeepSeek(
                 model=Config.LLM_MODEL,
@@ -129,7 +129,7 @@ class IntentRouter:
             return init_chat_model(
                 Config.LLM_MODEL,
                 temperature=0.1,
-                model_provider=Config.MODEL_PROVIDER,
+                model_provider=Config.get_model_provider(),
             )
     
     def analyze_intent(
@@ -1,6 +1,13 @@
 """RAG Agent - 具备自主决策能力的 RAG 智能体"""
 
+import copy
+import hashlib
 import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
 from typing import List, Dict, Any, Optional
 
 from src.agent.base import BaseAgent, AgentConfig, AgentResponse
@@ -26,13 +33,198 @@ from src.agent.tools.analysis_tools import (
     GenerateReportTool,
 )
 from src.agent.intent_router import IntentRouter, IntentType, IntentAnalysis
-
-logger = logging.getLogger(__name__)
-
 from src.core.vector_store import VectorStore
 from src.services.rag_assistant import RAGAssistant
 from src.services.conversation_manager import ConversationManager
 from src.models.schemas import ConversationMessage
+from src.utils.semantic_cache import SemanticCache
+
+logger = logging.getLogger(__name__)
+
+# 文件操作工具允许访问的路径（进程内只计算一次，所有 Agent 共享）
+HOME_DIR = str(Path.home())
+DESKTOP_DIR = str(Path.home() / "Desktop")
+DOCUMENTS_DIR = str(Path.home() / "Documents")
+ALLOWED_FILE_PATHS = (
+    "./documents",
+    "./uploads",
+    "./output",
+    HOME_DIR,
+    DESKTOP_DIR,
+    DOCUMENTS_DIR,
+)
+
+
+@dataclass
+class QueryCacheConfig:
+    """查询缓存配置"""
+    enabled: bool = True
+    max_size: int = 256      # 最大缓存条目数（LRU 淘汰）
+    ttl: float = 300.0       # 条目有效期（秒）
+    semantic: bool = True    # 是否启用语义匹配（同义改写的问题也能命中）
+    semantic_threshold: float = 0.95  # 语义命中所需的最小余弦相似度
+    negative_ttl: float = 60.0  # 知识库无结果的问题记录有效期（秒），0 表示不记录
+
+
+class QueryCache:
+    """查询结果缓存 - LRU + TTL，线程安全
+
+    以归一化后的问题为键缓存 AgentResponse，命中时跳过 RAG 检索与生成。
+    启用语义匹配时，额外记录问题向量，精确键未命中时按余弦相似度查找。
+    知识库检索无结果的问题单独以较短的有效期记录（负缓存），重复提问时直接返回。
+    """
+
+    NEGATIVE_ANSWER = "本地知识库中没有找到与该问题相关的信息。"
+
+    def __init__(self, config: QueryCacheConfig = None):
+        self.config = config or QueryCacheConfig()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, response)
+        self._negative: "OrderedDict[str, float]" = OrderedDict()  # key -> expires_at
+        self._lock = threading.RLock()
+        # 语义索引：问题向量 -> 缓存键，条目本身仍由 _entries 管理 LRU/TTL
+        self._semantic: Optional[SemanticCache] = None
+        if self.config.semantic:
+            self._semantic = SemanticCache(
+                threshold=self.config.semantic_threshold,
+                max_entries=self.config.max_size,
+            )
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.semantic_hits = 0
+        self.semantic_misses = 0
+        self.negative_hits = 0
+
+    @staticmethod
+    def make_key(question: str) -> str:
+        """归一化问题并生成缓存键"""
+        return hashlib.md5(question.strip().lower().encode("utf-8")).hexdigest()
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self._semantic is not None
+
+    def _get_entry(self, key: str) -> Optional[AgentResponse]:
+        """读取条目（调用方持有锁），过期条目视为未命中并移除"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, response = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.evictions += 1
+            return None
+
+        self._entries.move_to_end(key)
+        return copy.deepcopy(response)
+
+    def get(self, key: str) -> Optional[AgentResponse]:
+        """按精确键读取缓存"""
+        with self._lock:
+            response = self._get_entry(key)
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return response
+
+    def get_similar(self, embedding) -> Optional[AgentResponse]:
+        """按问题向量的语义相似度读取缓存"""
+        if self._semantic is None or embedding is None:
+            return None
+
+        key = self._semantic.lookup(embedding)
+        with self._lock:
+            response = self._get_entry(key) if key is not None else None
+            if response is None:
+                self.semantic_misses += 1
+            else:
+                self.semantic_hits += 1
+            return response
+
+    def put(self, key: str, response: AgentResponse, embedding=None):
+        """写入缓存，超出容量时淘汰最久未使用的条目
+
+        Args:
+            key: 缓存键
+            response: Agent 响应
+            embedding: 问题向量（可选），提供时同时写入语义索引
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.config.ttl, copy.deepcopy(response))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.config.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        # 语义索引只保存键，被淘汰的条目在读取时自然未命中
+        if self._semantic is not None and embedding is not None:
+            self._semantic.add(embedding, key)
+
+    def is_negative(self, key: str) -> bool:
+        """问题最近是否在知识库中检索无结果"""
+        with self._lock:
+            expires_at = self._negative.get(key)
+            if expires_at is None:
+                return False
+            if expires_at < time.monotonic():
+                del self._negative[key]
+                return False
+            self.negative_hits += 1
+            return True
+
+    def put_negative(self, key: str):
+        """记录知识库检索无结果的问题"""
+        if self.config.negative_ttl <= 0:
+            return
+        with self._lock:
+            self._negative[key] = time.monotonic() + self.config.negative_ttl
+            self._negative.move_to_end(key)
+            while len(self._negative) > self.config.max_size:
+                self._negative.popitem(last=False)
+
+    def negative_response(self) -> AgentResponse:
+        """负缓存命中时返回的响应"""
+        return AgentResponse(
+            success=True,
+            answer=self.NEGATIVE_ANSWER,
+            thought_process=[],
+            tools_used=[],
+            iterations=0,
+        )
+
+    def evict(self, key: str = None):
+        """移除指定条目；不指定时清空全部缓存"""
+        with self._lock:
+            if key is None:
+                self.evictions += len(self._entries)
+                self._entries.clear()
+                self._negative.clear()
+                if self._semantic is not None:
+                    self._semantic.clear()
+            else:
+                self._negative.pop(key, None)
+                if self._entries.pop(key, None) is not None:
+                    self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            return {
+                "enabled": self.config.enabled,
+                "size": len(self._entries),
+                "max_size": self.config.max_size,
+                "ttl": self.config.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "semantic_enabled": self.semantic_enabled,
+                "semantic_hits": self.semantic_hits,
+                "semantic_misses": self.semantic_misses,
+                "negative_size": len(self._negative),
+                "negative_hits": self.negative_hits,
+            }
 
 
 class RAGAgent(BaseAgent):
@@ -58,6 +250,8 @@ class RAGAgent(BaseAgent):
         enable_file_ops: bool = True,
         web_search_provider: str = "duckduckgo",
         conversation_manager: ConversationManager = None,
+        cache_config: QueryCacheConfig = None,
+        embeddings: Any = None,
     ):
         """初始化 RAG Agent
 
@@ -69,8 +263,11 @@ class RAGAgent(BaseAgent):
             enable_file_ops: 是否启用文件操作
             web_search_provider: 搜索提供者 ('duckduckgo', 'tavily', 'serpapi')
             conversation_manager: 对话管理器实例（可选）
+            cache_config: 查询缓存配置（可选）
+            embeddings: 工具共用的 Embedding 模型（可选，默认使用进程内共享的模型）
         """
         self._vector_store = vector_store
+        self._embeddings = embeddings
         self._assistant = assistant
         self._enable_web_search = enable_web_search
         self._enable_file_ops = enable_file_ops
@@ -79,6 +276,12 @@ class RAGAgent(BaseAgent):
         # 对话管理
         self._conversation_manager = conversation_manager or ConversationManager()
         self._current_conversation_id: Optional[str] = None
+
+        # 知识库查询结果缓存
+        self.query_cache = QueryCache(cache_config)
+        
+        # 核心 RAG 检索工具（在 setup_tools 中设置）
+        self._rag_tool: Optional[RAGSearchTool] = None
         
         # 智能意图路由器（在 setup_tools 后初始化）
         self._intent_router: Optional[IntentRouter] = None
@@ -92,82 +295,80 @@ class RAGAgent(BaseAgent):
         )
 
     def setup_tools(self):
-        """设置 Agent 可用的工具"""
+        """设置 Agent 可用的工具
+
+        除核心的 RAG 检索工具外，其余工具只注册工厂，首次被调用时才实例化。
+        重复调用时直接返回，不会重复注册。
+        """
+        if getattr(self, "_tools_ready", False):
+            return
 
         # 1. RAG 检索工具（核心能力）
         rag_search = RAGSearchTool(
-            vector_store=self._vector_store, assistant=self._assistant
+            vector_store=self._vector_store, assistant=self._assistant, embeddings=self._embeddings
         )
         self.register_tool(rag_search)
+        # 热路径（smart_query）直接通过属性访问，无需每次查工具表
+        self._rag_tool = rag_search
 
         # 2. 文档列表工具
-        doc_list = DocumentListTool()
-        self.register_tool(doc_list)
+        self.register_lazy("list_documents", DocumentListTool)
 
         # 3. 知识库信息工具
-        kb_info = KnowledgeBaseInfoTool(vector_store=self._vector_store)
-        self.register_tool(kb_info)
+        self.register_lazy(
+            "kb_info",
+            lambda: KnowledgeBaseInfoTool(vector_store=self._vector_store, embeddings=self._embeddings)
+        )
 
         # 4. 文件操作工具
         if self._enable_file_ops:
-            import os
-            from pathlib import Path
-            
-            # 定义允许的文件操作路径
-            home_dir = str(Path.home())
-            desktop_dir = str(Path.home() / "Desktop")
-            documents_dir = str(Path.home() / "Documents")
-            allowed_paths = [
-                "./documents",
-                "./uploads", 
-                "./output",
-                home_dir,
-                desktop_dir,
-                documents_dir
-            ]
+            allowed_paths = list(ALLOWED_FILE_PATHS)
             
-            self.register_tool(ReadFileTool(allowed_paths=allowed_paths))
-            self.register_tool(WriteFileTool(allowed_paths=allowed_paths))
-            self.register_tool(ListDirectoryTool(allowed_paths=allowed_paths))
-            self.register_tool(MoveFileTool(allowed_paths=allowed_paths))
-            self.register_tool(CreateDirectoryTool(allowed_paths=allowed_paths))
-            self.register_tool(DeleteFileTool(allowed_paths=allowed_paths))
+            self.register_lazy("read_file", lambda: ReadFileTool(allowed_paths=allowed_paths))
+            self.register_lazy("write_file", lambda: WriteFileTool(allowed_paths=allowed_paths))
+            self.register_lazy("list_directory", lambda: ListDirectoryTool(allowed_paths=allowed_paths))
+            self.register_lazy("move_file", lambda: MoveFileTool(allowed_paths=allowed_paths))
+            self.register_lazy("create_directory", lambda: CreateDirectoryTool(allowed_paths=allowed_paths))
+            self.register_lazy("view_file_info", lambda: DeleteFileTool(allowed_paths=allowed_paths))
 
         # 5. 网页搜索工具
         if self._enable_web_search:
-            web_search = WebSearchTool(provider=self._web_search_provider)
-            self.register_tool(web_search)
-            self.register_tool(FetchWebpageTool())
+            self.register_lazy(
+                "web_search", lambda: WebSearchTool(provider=self._web_search_provider)
+            )
+            self.register_lazy("fetch_webpage", FetchWebpageTool)
             
             # 添加热搜工具
-            self.register_tool(BaiduTrendingTool())
-            self.register_tool(TrendingNewsAggregatorTool())
+            self.register_lazy("baidu_trending", BaiduTrendingTool)
+            self.register_lazy("trending_news_aggregator", TrendingNewsAggregatorTool)
 
         # 6. 分析工具
-        self.register_tool(DocumentAnalysisTool())
-        self.register_tool(SummarizeTool())
-        self.register_tool(GenerateReportTool())
+        self.register_lazy("analyze_documents", DocumentAnalysisTool)
+        self.register_lazy("summarize", SummarizeTool)
+        self.register_lazy("generate_report", GenerateReportTool)
         
         # 7. 新增企业级工具
         try:
             from src.agent.tools.memory_tools import MemoryTool
-            self.register_tool(MemoryTool())
+            self.register_lazy("memory", MemoryTool)
         except ImportError:
             pass
         
         try:
             from src.agent.tools.task_tools import TaskTool
-            self.register_tool(TaskTool())
+            self.register_lazy("task_manager", TaskTool)
         except ImportError:
             pass
         
         try:
             from src.agent.tools.code_tools import CodeExecutorTool, DataAnalysisTool
-            self.register_tool(CodeExecutorTool(sandbox_mode=True))
-            self.register_tool(DataAnalysisTool())
+            self.register_lazy("code_executor", lambda: CodeExecutorTool(sandbox_mode=True))
+            self.register_lazy("data_analysis", DataAnalysisTool)
         except ImportError:
             pass
 
+        self._tools_ready = True
+
         if self.config.verbose:
             print(f"\n✓ RAG Agent 初始化完成，共注册 {len(self.tools)} 个工具")
 
@@ -209,7 +410,19 @@ class RAGAgent(BaseAgent):
         if self._current_conversation_id:
             self._conversation_manager.clear_conversation(self._current_conversation_id)
 
-    def smart_query(self, question: str, save_to_history: bool = True) -> AgentResponse:
+    def _record_assistant(self, response: AgentResponse):
+        """将成功的助手回复保存到当前会话历史"""
+        if self._current_conversation_id and response.success and response.answer:
+            self._conversation_manager.add_message(
+                self._current_conversation_id, "assistant", response.answer
+            )
+
+    def smart_query(
+        self,
+        question: str,
+        save_to_history: bool = True,
+        question_embedding: Optional[List[float]] = None,
+    ) -> AgentResponse:
         """智能查询 - 使用大模型分析问题并决定最佳处理方式
 
         核心流程：
@@ -220,6 +433,7 @@ class RAGAgent(BaseAgent):
         Args:
             question: 用户问题
             save_to_history: 是否保存到对话历史
+            question_embedding: 预先计算好的问题向量（可选，用于语义缓存）
 
         Returns:
             AgentResponse
@@ -271,24 +485,42 @@ class RAGAgent(BaseAgent):
             if analysis.intent == IntentType.CONVERSATION:
                 # 直接从历史对话中回答
                 response = self._handle_conversation_intent(question, chat_history, analysis)
-                if save_to_history and self._current_conversation_id and response.success:
-                    self._conversation_manager.add_message(
-                        self._current_conversation_id, "assistant", response.answer
-                    )
+                if save_to_history:
+                    self._record_assistant(response)
                 return response
             
             # 处理直接回答（常识、简单计算等）
             if analysis.intent == IntentType.DIRECT_ANSWER:
                 response = self._handle_direct_answer(question, analysis)
-                if save_to_history and self._current_conversation_id and response.success:
-                    self._conversation_manager.add_message(
-                        self._current_conversation_id, "assistant", response.answer
-                    )
+                if save_to_history:
+                    self._record_assistant(response)
                 return response
             
             # 处理知识库查询（简单RAG）
             if analysis.intent == IntentType.KNOWLEDGE_BASE and analysis.confidence >= 0.8:
-                rag_tool = self.tools.get("rag_search")
+                rag_tool = self._rag_tool
+
+                # 知识库答案与会话无关，先按归一化问题精确匹配，再按语义相似度匹配
+                cache_key = QueryCache.make_key(question)
+                if self.query_cache.config.enabled:
+                    cached = self.query_cache.get(cache_key)
+                    if cached is None and self.query_cache.is_negative(cache_key):
+                        # 近期已确认知识库中没有相关内容，不再检索也不进入 Agent 推理
+                        logger.info(f"[SmartQuery] 命中负缓存，知识库无相关信息")
+                        cached = self.query_cache.negative_response()
+                    if cached is None and rag_tool and self.query_cache.semantic_enabled:
+                        try:
+                            if question_embedding is None:
+                                question_embedding = rag_tool.embed_query(question)
+                        except Exception as e:
+                            logger.warning(f"[SmartQuery] 计算问题向量失败，跳过语义缓存: {e}")
+                        cached = self.query_cache.get_similar(question_embedding)
+                    if cached is not None:
+                        logger.info(f"[SmartQuery] 命中查询缓存")
+                        if save_to_history:
+                            self._record_assistant(cached)
+                        return cached
+
                 if rag_tool:
                     result = rag_tool.execute(query=question, generate_answer=True, top_k=3)
                     if result.success and result.output:
@@ -299,10 +531,14 @@ class RAGAgent(BaseAgent):
                             tools_used=["rag_search"],
                             iterations=1,
                         )
-                        if save_to_history and self._current_conversation_id:
-                            self._conversation_manager.add_message(
-                                self._current_conversation_id, "assistant", result.output
-                            )
+                        if self.query_cache.config.enabled:
+                            if (result.data or {}).get("sources"):
+                                self.query_cache.put(cache_key, response, embedding=question_embedding)
+                            else:
+                                # 没有检索到任何来源（如被相似度阈值全部过滤），记入负缓存
+                                self.query_cache.put_negative(cache_key)
+                        if save_to_history:
+                            self._record_assistant(response)
                         return response
         
         # 第三步：复杂问题使用完整 Agent 推理
@@ -310,13 +546,35 @@ class RAGAgent(BaseAgent):
         response = self.run(question, chat_history)
         
         # 保存助手回复到历史
-        if save_to_history and self._current_conversation_id and response.success:
-            self._conversation_manager.add_message(
-                self._current_conversation_id, "assistant", response.answer
-            )
+        if save_to_history:
+            self._record_assistant(response)
         
         return response
     
+    def smart_query_batch(self, questions: List[str]) -> List[AgentResponse]:
+        """批量智能查询（不保存对话历史）
+
+        所有问题的向量通过一次批量嵌入计算，供语义缓存复用，避免逐条调用嵌入模型。
+
+        Args:
+            questions: 问题列表
+
+        Returns:
+            与问题顺序一致的 AgentResponse 列表
+        """
+        embeddings: List[Optional[List[float]]] = [None] * len(questions)
+        rag_tool = self._rag_tool
+        if rag_tool and self.query_cache.config.enabled and self.query_cache.semantic_enabled:
+            try:
+                embeddings = rag_tool.embed_queries(questions)
+            except Exception as e:
+                logger.warning(f"[SmartQuery] 批量计算问题向量失败，逐条计算: {e}")
+
+        return [
+            self.smart_query(question, save_to_history=False, question_embedding=embedding)
+            for question, embedding in zip(questions, embeddings)
+        ]
+
     def _handle_conversation_intent(
         self, 
         question: str, 
@@ -475,7 +733,7 @@ class AgentBuilder:
     """Agent 构建器 - 便捷创建不同配置的 Agent"""
 
     @staticmethod
-    def create_simple_agent() -> RAGAgent:
+    def create_simple_agent(conversation_manager: ConversationManager = None) -> RAGAgent:
         """创建简单 Agent（仅 RAG 能力）"""
         config = AgentConfig(
             max_iterations=5,
@@ -483,10 +741,15 @@ class AgentBuilder:
             enable_planning=False,
             verbose=False,
         )
-        return RAGAgent(config=config, enable_web_search=False, enable_file_ops=False)
+        return RAGAgent(
+            config=config,
+            enable_web_search=False,
+            enable_file_ops=False,
+            conversation_manager=conversation_manager,
+        )
 
     @staticmethod
-    def create_full_agent() -> RAGAgent:
+    def create_full_agent(conversation_manager: ConversationManager = None) -> RAGAgent:
         """创建完整 Agent（所有能力）"""
         config = AgentConfig(
             max_iterations=10,
@@ -494,10 +757,18 @@ class AgentBuilder:
             enable_planning=True,
             verbose=True,
         )
-        return RAGAgent(config=config, enable_web_search=True, enable_file_ops=True)
+        return RAGAgent(
+            config=config,
+            enable_web_search=True,
+            enable_file_ops=True,
+            conversation_manager=conversation_manager,
+        )
 
     @staticmethod
-    def create_research_agent(web_provider: str = "tavily") -> RAGAgent:
+    def create_research_agent(
+        web_provider: str = "tavily",
+        conversation_manager: ConversationManager = None,
+    ) -> RAGAgent:
         """创建研究型 Agent（强化网络搜索）"""
         config = AgentConfig(
             max_iterations=15,
@@ -510,10 +781,11 @@ class AgentBuilder:
             enable_web_search=True,
             enable_file_ops=False,
             web_search_provider=web_provider,
+            conversation_manager=conversation_manager,
         )
 
     @staticmethod
-    def create_manager_agent() -> RAGAgent:
+    def create_manager_agent(conversation_manager: ConversationManager = None) -> RAGAgent:
         """创建管理型 Agent（强化文件操作）"""
         config = AgentConfig(
             max_iterations=10,
@@ -521,4 +793,9 @@ class AgentBuilder:
             enable_planning=True,
             verbose=True,
         )
-        return RAGAgent(config=config, enable_web_search=False, enable_file_ops=True)
+        return RAGAgent(
+            config=config,
+            enable_web_search=False,
+            enable_file_ops=True,
+            conversation_manager=conversation_manager,
+        )
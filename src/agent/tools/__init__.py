@@ -5,6 +5,7 @@ from src.agent.tools.base import (
     ToolResult,
     ToolCategory,
     ToolRegistry,
+    LazyToolRegistry,
     global_registry,
     register_tool,
 )
@@ -35,6 +36,7 @@ __all__ = [
     "ToolResult", 
     "ToolCategory",
     "ToolRegistry",
+    "LazyToolRegistry",
     "global_registry",
     "register_tool",
     # RAG 工具
@@ -212,7 +212,7 @@ class SummarizeTool(BaseTool):
     def _init_llm(self):
         """初始化 LLM"""
         if self._llm is None:
-            if Config.MODEL_PROVIDER == "ollama":
+            if Config.get_model_provider() == "ollama":
                 from langchain_community.llms import Ollama
                 self._llm = Ollama(
                     base_url=Config.OLLAMA_API_URL,
@@ -322,7 +322,7 @@ class GenerateReportTool(BaseTool):
     
     def _init_llm(self):
         if self._llm is None:
-            if Config.MODEL_PROVIDER == "ollama":
+            if Config.get_model_provider() == "ollama":
                 from langchain_community.llms import Ollama
                 self._llm = Ollama(
                     base_url=Config.OLLAMA_API_URL,
@@ -1,8 +1,10 @@
 """工具基类和通用工具定义"""
 
 from abc import ABC, abstractmethod
+from collections.abc import MutableMapping
 from dataclasses import dataclass, field
-from typing import List, Dict, Any, Optional
+from threading import Lock
+from typing import List, Dict, Any, Optional, Callable, Iterator
 from enum import Enum
 
 
@@ -189,6 +191,67 @@ class ToolRegistry:
         return [tool.to_function_schema() for tool in self._tools.values()]
 
 
+class LazyToolRegistry(MutableMapping):
+    """延迟实例化的工具表 - 注册工厂函数，首次访问时才创建工具实例
+
+    用法与 Dict[str, BaseTool] 一致：keys()/in/len 不会创建工具，
+    按名称取值、values()/items() 时才实例化对应工具并缓存。
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Optional[Callable[[], BaseTool]]] = {}  # 同时维护注册顺序
+        self._tools: Dict[str, BaseTool] = {}
+        self._lock = Lock()
+
+    def register_lazy(self, name: str, factory: Callable[[], BaseTool]):
+        """注册工具工厂
+
+        Args:
+            name: 工具名称，必须与工厂创建的工具 name 一致
+            factory: 无参可调用对象，返回工具实例
+        """
+        self._tools.pop(name, None)
+        self._factories[name] = factory
+
+    def is_loaded(self, name: str) -> bool:
+        """工具是否已经实例化"""
+        return name in self._tools
+
+    def __getitem__(self, name: str) -> BaseTool:
+        tool = self._tools.get(name)
+        if tool is not None:
+            return tool
+
+        with self._lock:
+            tool = self._tools.get(name)
+            if tool is None:
+                factory = self._factories.get(name)
+                if factory is None:
+                    raise KeyError(name)
+                tool = factory()
+                if tool.name != name:
+                    raise ValueError(f"工具名称不一致: 注册为 '{name}'，实际为 '{tool.name}'")
+                self._tools[name] = tool
+        return tool
+
+    def __setitem__(self, name: str, tool: BaseTool):
+        self._factories[name] = None
+        self._tools[name] = tool
+
+    def __delitem__(self, name: str):
+        del self._factories[name]
+        self._tools.pop(name, None)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._factories
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._factories)
+
+    def __len__(self) -> int:
+        return len(self._factories)
+
+
 # 全局工具注册表
 global_registry = ToolRegistry()
 
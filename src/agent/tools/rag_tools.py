@@ -3,7 +3,7 @@
 from typing import List, Dict, Any, Optional
 
 from src.agent.tools.base import BaseTool, ToolResult, ToolCategory
-from src.core.vector_store import VectorStore
+from src.core.vector_store import VectorStore, create_vector_store
 from src.services.rag_assistant import RAGAssistant
 from src.config.settings import Config
 
@@ -14,9 +14,10 @@ class RAGSearchTool(BaseTool):
     使用向量数据库检索相关文档，并可选择使用 LLM 生成答案
     """
     
-    def __init__(self, vector_store: VectorStore = None, assistant: RAGAssistant = None):
+    def __init__(self, vector_store: VectorStore = None, assistant: RAGAssistant = None, embeddings: Any = None):
         self._vector_store = vector_store
         self._assistant = assistant
+        self._embeddings = embeddings
         super().__init__()
     
     @property
@@ -63,12 +64,22 @@ class RAGSearchTool(BaseTool):
     def _ensure_initialized(self):
         """确保向量数据库已初始化"""
         if self._vector_store is None:
-            self._vector_store = VectorStore()
+            self._vector_store = create_vector_store(embeddings=self._embeddings)
             self._vector_store.load_vectorstore()
         
         if self._assistant is None and self._vector_store.vectorstore is not None:
             self._assistant = RAGAssistant(vector_store=self._vector_store)
             self._assistant.setup_qa_chain()
+
+    def embed_query(self, query: str) -> List[float]:
+        """使用知识库的嵌入模型计算查询向量（与检索共用向量缓存）"""
+        self._ensure_initialized()
+        return self._vector_store.embed_query(query)
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """一次性批量计算多个查询的向量（单次模型调用）"""
+        self._ensure_initialized()
+        return self._vector_store.embeddings.embed_documents(queries)
     
     def execute(self, **kwargs) -> ToolResult:
         """执行 RAG 检索
@@ -274,8 +285,9 @@ class DocumentListTool(BaseTool):
 class KnowledgeBaseInfoTool(BaseTool):
     """知识库信息工具 - 获取知识库的统计信息"""
     
-    def __init__(self, vector_store: VectorStore = None):
+    def __init__(self, vector_store: VectorStore = None, embeddings: Any = None):
         self._vector_store = vector_store
+        self._embeddings = embeddings
         super().__init__()
     
     @property
@@ -298,7 +310,7 @@ class KnowledgeBaseInfoTool(BaseTool):
         """获取知识库信息"""
         try:
             if self._vector_store is None:
-                self._vector_store = VectorStore()
+                self._vector_store = create_vector_store(embeddings=self._embeddings)
                 self._vector_store.load_vectorstore()
             
             if self._vector_store.vectorstore is None:
@@ -309,22 +321,21 @@ class KnowledgeBaseInfoTool(BaseTool):
                 )
             
             # 获取向量数据库信息
-            collection = self._vector_store.vectorstore._collection
-            count = collection.count()
+            count = self._vector_store.count()
             
             info = {
                 "total_chunks": count,
                 "embedding_model": Config.EMBEDDING_MODEL,
                 "vector_db_path": Config.VECTOR_DB_PATH,
                 "llm_model": Config.LLM_MODEL,
-                "model_provider": Config.MODEL_PROVIDER
+                "model_provider": Config.get_model_provider()
             }
             
             output = f"""知识库统计信息:
 - 文档块数量: {count}
 - 嵌入模型: {Config.EMBEDDING_MODEL}
 - LLM 模型: {Config.LLM_MODEL}
-- 模型提供者: {Config.MODEL_PROVIDER}
+- 模型提供者: {Config.get_model_provider()}
 - 存储路径: {Config.VECTOR_DB_PATH}"""
             
             return ToolResult(
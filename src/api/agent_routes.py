@@ -1,18 +1,23 @@
 """Agent API 路由 - 提供 Agent 相关的 REST API"""
 
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
-import json
+from typing import Optional, List, Dict, Any, Tuple
+from collections import OrderedDict
 import asyncio
+import contextlib
+import contextvars
 import logging
 import time
 import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from src.agent.rag_agent import RAGAgent, AgentBuilder
 from src.agent.base import AgentConfig, AgentResponse, StreamEvent
-from src.config.settings import Config
+from src.config.settings import Config, override_model_provider
+from src.services.conversation_manager import ConversationManager
+from src.utils.sse import sse_event, SSE_HEADERS
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -24,6 +29,20 @@ router = APIRouter(prefix="/agent", tags=["Agent"])
 # 全局 Agent 实例
 _agent: Optional[RAGAgent] = None
 
+# 进程内共享的对话管理器：全局 Agent 与池中 Agent 使用同一份内存会话，
+# 清空/删除会话后不会被其它 Agent 用旧的内存历史重新写回磁盘
+_conversation_manager: Optional[ConversationManager] = None
+_conversation_manager_lock = threading.Lock()
+
+
+def get_conversation_manager() -> ConversationManager:
+    """获取进程内共享的对话管理器"""
+    global _conversation_manager
+    with _conversation_manager_lock:
+        if _conversation_manager is None:
+            _conversation_manager = ConversationManager()
+        return _conversation_manager
+
 
 def get_or_create_agent(
     agent_type: str = "full",
@@ -33,18 +52,154 @@ def get_or_create_agent(
     global _agent
     
     if _agent is None or force_new:
+        conversation_manager = get_conversation_manager()
         if agent_type == "simple":
-            _agent = AgentBuilder.create_simple_agent()
+            _agent = AgentBuilder.create_simple_agent(conversation_manager)
         elif agent_type == "research":
-            _agent = AgentBuilder.create_research_agent()
+            _agent = AgentBuilder.create_research_agent(conversation_manager=conversation_manager)
         elif agent_type == "manager":
-            _agent = AgentBuilder.create_manager_agent()
+            _agent = AgentBuilder.create_manager_agent(conversation_manager)
         else:
-            _agent = AgentBuilder.create_full_agent()
+            _agent = AgentBuilder.create_full_agent(conversation_manager)
     
     return _agent
 
 
+# 按配置复用的 Agent 池：key -> 空闲 Agent 列表（按最近使用排序）
+# 每个 Agent 同一时间只借给一个请求，避免推理状态在并发请求间串扰
+_AGENT_POOL_SIZE = 8
+_agent_pool: "OrderedDict[Tuple, List[RAGAgent]]" = OrderedDict()
+_agent_pool_lock = threading.Lock()
+
+
+# 流式推理共享线程池，避免每个请求新建线程，同时限制并发推理数
+_STREAM_POOL = ThreadPoolExecutor(
+    max_workers=Config.STREAM_WORKERS or 16,
+    thread_name_prefix="agent-stream"
+)
+
+
+# 对话持久化队列：请求路径只同步更新内存中的会话，磁盘写入由后台任务批量完成
+_PERSIST_MAX_BATCH = 32
+_PERSIST_FLUSH_INTERVAL = 0.025  # 秒
+_persist_queue: Optional[asyncio.Queue] = None
+_persist_task: Optional[asyncio.Task] = None
+
+
+def _flush_conversations(batch: List[Tuple[ConversationManager, str]]):
+    """将一批待保存的会话写入磁盘，同一会话只写一次"""
+    for manager, conversation_id in dict.fromkeys(batch):
+        try:
+            manager.save_conversation(conversation_id)
+        except Exception as e:
+            logger.error(f"[Persist] 保存会话失败 - {conversation_id}: {e}")
+
+
+async def _persist_worker(queue: asyncio.Queue):
+    """后台持久化任务：攒批后在线程中写盘，不阻塞事件循环"""
+    batch: List[Tuple[ConversationManager, str]] = []
+    try:
+        while True:
+            batch = [await queue.get()]
+            await asyncio.sleep(_PERSIST_FLUSH_INTERVAL)
+            while len(batch) < _PERSIST_MAX_BATCH and not queue.empty():
+                batch.append(queue.get_nowait())
+            await asyncio.to_thread(_flush_conversations, batch)
+            batch = []
+    except asyncio.CancelledError:
+        # 关闭时已从队列取出、但尚未写入（或写入被取消）的会话同步写盘，重复保存不会重复追加消息
+        if batch:
+            _flush_conversations(batch)
+        raise
+
+
+def schedule_persist(manager: ConversationManager, conversation_id: str):
+    """登记一个需要写盘的会话（需在事件循环中调用），首次调用时启动后台任务"""
+    global _persist_queue, _persist_task
+    if _persist_queue is None:
+        _persist_queue = asyncio.Queue()
+    if _persist_task is None or _persist_task.done():
+        _persist_task = asyncio.get_running_loop().create_task(_persist_worker(_persist_queue))
+    _persist_queue.put_nowait((manager, conversation_id))
+
+
+async def flush_pending_conversations():
+    """停止后台任务并写入所有尚未保存的会话（应用关闭时调用）"""
+    global _persist_task
+    if _persist_task is not None:
+        # 等待任务退出，其手中的批次在取消时写入
+        _persist_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await _persist_task
+        _persist_task = None
+    if _persist_queue is None:
+        return
+    pending = []
+    while not _persist_queue.empty():
+        pending.append(_persist_queue.get_nowait())
+    if pending:
+        _flush_conversations(pending)
+
+
+def _save_turn(agent: RAGAgent, conversation_id: str, question: str, answer: str):
+    """记录一轮问答：内存立即可见，磁盘异步批量写入"""
+    manager = agent._conversation_manager
+    manager.add_turn(conversation_id, question, answer)
+    schedule_persist(manager, conversation_id)
+
+
+def _agent_pool_key(req: "AgentQueryRequest") -> Tuple:
+    """Agent 池的键：创建时绑定的配置（verbose 可原地修改，不参与）"""
+    provider = (req.provider or Config.get_model_provider() or "").strip().lower()
+    return (req.agent_type, provider, req.max_iterations, req.enable_reflection, req.enable_planning)
+
+
+def acquire_agent(req: "AgentQueryRequest", verbose: bool = True) -> RAGAgent:
+    """从池中借出与请求配置匹配的 Agent，没有空闲实例时新建
+
+    使用完毕后必须调用 release_agent 归还。
+    """
+    key = _agent_pool_key(req)
+
+    agent = None
+    with _agent_pool_lock:
+        idle = _agent_pool.get(key)
+        if idle:
+            agent = idle.pop()
+
+    if agent is None:
+        config = AgentConfig(
+            max_iterations=req.max_iterations,
+            enable_reflection=req.enable_reflection,
+            enable_planning=req.enable_planning,
+            verbose=verbose
+        )
+        agent = RAGAgent(config=config, conversation_manager=get_conversation_manager())
+        logger.info(f"[Agent Pool] 新建 Agent - 配置: {key}")
+    else:
+        agent.config.verbose = verbose
+        logger.info(f"[Agent Pool] 复用 Agent - 配置: {key}")
+
+    agent.set_conversation(req.conversation_id)
+    return agent
+
+
+def release_agent(req: "AgentQueryRequest", agent: RAGAgent):
+    """归还 Agent 到池中，超出容量时淘汰最久未使用的实例"""
+    key = _agent_pool_key(req)
+    with _agent_pool_lock:
+        _agent_pool.setdefault(key, []).append(agent)
+        _agent_pool.move_to_end(key)
+
+        total = sum(len(agents) for agents in _agent_pool.values())
+        while total > _AGENT_POOL_SIZE:
+            oldest_key, oldest = next(iter(_agent_pool.items()))
+            oldest.pop(0)
+            total -= 1
+            if not oldest:
+                del _agent_pool[oldest_key]
+
+
 # ========================
 # Request/Response Models
 # ========================
@@ -77,6 +232,11 @@ class SmartQueryRequest(BaseModel):
     conversation_id: Optional[str] = Field(None, description="会话ID（用于多轮对话）")
 
 
+class SmartQueryBatchRequest(BaseModel):
+    """批量智能查询请求（不保存对话历史）"""
+    questions: List[str] = Field(..., min_length=1, max_length=32, description="问题列表（最多 32 个）")
+
+
 class ConversationCreateResponse(BaseModel):
     """创建对话响应"""
     conversation_id: str
@@ -125,6 +285,15 @@ async def agent_status():
     }
 
 
+@router.get("/cache/stats")
+async def cache_stats():
+    """获取智能查询缓存统计"""
+    global _agent
+    if _agent is None:
+        return {"initialized": False}
+    return {"initialized": True, **_agent.query_cache.stats()}
+
+
 @router.get("/tools")
 async def list_tools() -> List[ToolInfo]:
     """列出所有可用工具"""
@@ -149,82 +318,74 @@ async def agent_query(req: AgentQueryRequest):
     if req.conversation_id:
         logger.info(f"[Agent Query] 使用会话ID: {req.conversation_id}")
     
-    # 注意：不再临时修改全局 Config.MODEL_PROVIDER，这在多线程环境下不安全
-    # 如果需要指定 provider，应该在创建 Agent 时传入或使用请求上下文
-    provider_to_use = req.provider or Config.MODEL_PROVIDER
+    # 指定的 provider 只在本请求上下文内生效（contextvars），不修改全局 Config.MODEL_PROVIDER
+    provider_to_use = req.provider or Config.get_model_provider()
     logger.info(f"[Agent Query] 使用 Provider: {provider_to_use}")
     
-    try:
-        # 创建 Agent
-        config = AgentConfig(
-            max_iterations=req.max_iterations,
-            enable_reflection=req.enable_reflection,
-            enable_planning=req.enable_planning,
-            verbose=True
-        )
+    with override_model_provider(req.provider):
+        agent = None
+        try:
+            # 从池中获取 Agent（新建时按请求上下文中的 provider 初始化 LLM）
+            agent = acquire_agent(req, verbose=True)
+            logger.info(f"[Agent Query] Agent已就绪，注册工具数: {len(agent.tools)}")
         
-        # TODO: 未来应该支持在 RAGAgent 初始化时传入 provider 参数
-        agent = RAGAgent(config=config)
-        logger.info(f"[Agent Query] Agent已创建，注册工具数: {len(agent.tools)}")
+            # 如果提供了 conversation_id，设置当前会话
+            if req.conversation_id:
+                logger.info(f"[Agent Query] 已设置会话ID: {req.conversation_id}")
+                # 获取历史上下文
+                history = agent._conversation_manager.format_history_for_llm(
+                    req.conversation_id, 
+                    max_turns=3
+                )
+            else:
+                # 如果没有 conversation_id，使用传统的 chat_history（向后兼容）
+                history = req.chat_history or ""
         
-        # 如果提供了 conversation_id，设置当前会话
-        if req.conversation_id:
-            agent.set_conversation(req.conversation_id)
-            logger.info(f"[Agent Query] 已设置会话ID: {req.conversation_id}")
-            # 获取历史上下文
-            history = agent._conversation_manager.format_history_for_llm(
-                req.conversation_id, 
-                max_turns=3
+            # 执行查询
+            logger.info(f"[Agent Query] 开始执行推理循环...")
+            result = await asyncio.to_thread(
+                agent.run,
+                req.question,
+                history
             )
-        else:
-            # 如果没有 conversation_id，使用传统的 chat_history（向后兼容）
-            history = req.chat_history or ""
         
-        # 执行查询
-        logger.info(f"[Agent Query] 开始执行推理循环...")
-        result = await asyncio.to_thread(
-            agent.run,
-            req.question,
-            history
-        )
-        
-        # 如果使用了 conversation_id，保存对话到历史
-        if req.conversation_id and result.success:
-            agent._conversation_manager.add_message(
-                req.conversation_id, "user", req.question
-            )
-            agent._conversation_manager.add_message(
-                req.conversation_id, "assistant", result.answer, save_to_disk=True
+            # 如果使用了 conversation_id，保存对话到历史
+            if req.conversation_id and result.success:
+                _save_turn(agent, req.conversation_id, req.question, result.answer)
+                logger.info(f"[Agent Query] 已保存对话到历史")
+        
+            elapsed = time.time() - start_time
+            logger.info(f"[Agent Query] 查询完成 - 耗时: {elapsed:.2f}秒, 迭代次数: {result.iterations}, 使用工具: {result.tools_used}")
+        
+            # 字段类型由 Agent 保证，跳过校验直接构造，并由 pydantic-core 一次性序列化为 JSON，
+            # 避免 response_model 再做一轮校验和 jsonable_encoder 转换
+            response = AgentQueryResponse.model_construct(
+                success=result.success,
+                answer=result.answer,
+                thought_process=[
+                    {
+                        "step": step.step,
+                        "thought": step.thought,
+                        "action": step.action,
+                        "action_input": step.action_input,
+                        "observation": step.observation,
+                        "reflection": step.reflection
+                    }
+                    for step in result.thought_process
+                ],
+                tools_used=result.tools_used,
+                iterations=result.iterations,
+                final_reflection=result.final_reflection
             )
-            logger.info(f"[Agent Query] 已保存对话到历史")
-        
-        elapsed = time.time() - start_time
-        logger.info(f"[Agent Query] 查询完成 - 耗时: {elapsed:.2f}秒, 迭代次数: {result.iterations}, 使用工具: {result.tools_used}")
+            return Response(content=response.model_dump_json(), media_type="application/json")
         
-        return AgentQueryResponse(
-            success=result.success,
-            answer=result.answer,
-            thought_process=[
-                {
-                    "step": step.step,
-                    "thought": step.thought,
-                    "action": step.action,
-                    "action_input": step.action_input,
-                    "observation": step.observation[:500] if step.observation else None,
-                    "reflection": step.reflection
-                }
-                for step in result.thought_process
-            ],
-            tools_used=result.tools_used,
-            iterations=result.iterations,
-            final_reflection=result.final_reflection
-        )
-        
-    except Exception as e:
-        elapsed = time.time() - start_time
-        logger.error(f"[Agent Query] 执行失败 - 耗时: {elapsed:.2f}秒, 错误: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
-            logger.info(f"[Agent Query] 已恢复 MODEL_PROVIDER = {original_provider}")
+        except Exception as e:
+            elapsed = time.time() - start_time
+            logger.error(f"[Agent Query] 执行失败 - 耗时: {elapsed:.2f}秒, 错误: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            if agent is not None:
+                release_agent(req, agent)
 
 
 @router.post("/smart-query")
@@ -276,6 +437,38 @@ async def smart_query(req: SmartQueryRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/smart-query-batch")
+async def smart_query_batch(req: SmartQueryBatchRequest):
+    """批量智能查询 - 一次请求处理多个问题，问题向量批量计算，结果按输入顺序返回"""
+    start_time = time.time()
+    logger.info(f"[Smart Query Batch] 开始处理 - 问题数: {len(req.questions)}")
+    
+    try:
+        agent = get_or_create_agent("full")
+        results = await asyncio.to_thread(agent.smart_query_batch, req.questions)
+        
+        elapsed = time.time() - start_time
+        logger.info(f"[Smart Query Batch] 完成 - 耗时: {elapsed:.2f}秒")
+        
+        return {
+            "results": [
+                {
+                    "question": question,
+                    "success": result.success,
+                    "answer": result.answer,
+                    "tools_used": result.tools_used,
+                    "iterations": result.iterations,
+                    "is_simple": result.iterations == 1 and len(result.tools_used) <= 1
+                }
+                for question, result in zip(req.questions, results)
+            ]
+        }
+        
+    except Exception as e:
+        logger.error(f"[Smart Query Batch] 失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/query-stream")
 async def agent_query_stream(req: AgentQueryRequest):
     """流式 Agent 查询 - 实时返回 LLM 推理过程（token 级别）"""
@@ -285,28 +478,21 @@ async def agent_query_stream(req: AgentQueryRequest):
     if req.conversation_id:
         logger.info(f"[Agent Stream] 使用会话ID: {req.conversation_id}")
     
-    # 如果指定了 provider，临时设置到 Config 中
-    original_provider = Config.MODEL_PROVIDER
-    if req.provider:
-        Config.MODEL_PROVIDER = req.provider
-        logger.info(f"[Agent Stream] 已设置 MODEL_PROVIDER = {req.provider}")
-    
     async def generate():
+        # 指定的 provider 只在本请求上下文内生效，不修改全局配置
+        with override_model_provider(req.provider):
+            async for chunk in _generate():
+                yield chunk
+    
+    async def _generate():
         final_answer = None
+        agent = None
+        worker_future: Optional[Future] = None
         try:
-            config = AgentConfig(
-                max_iterations=req.max_iterations,
-                enable_reflection=req.enable_reflection,
-                enable_planning=req.enable_planning,
-                verbose=False  # 禁用控制台输出
-            )
+            agent = acquire_agent(req, verbose=False)  # 禁用控制台输出
             
-            agent = RAGAgent(config=config)
-            
-            # 如果提供了 conversation_id，设置当前会话
+            # 如果提供了 conversation_id，获取历史上下文
             if req.conversation_id:
-                agent.set_conversation(req.conversation_id)
-                # 获取历史上下文
                 history = agent._conversation_manager.format_history_for_llm(
                     req.conversation_id, 
                     max_turns=3
@@ -314,51 +500,40 @@ async def agent_query_stream(req: AgentQueryRequest):
             else:
                 history = req.chat_history or ""
             
-            # 使用真正的流式推理
-            def run_stream_sync():
-                results = []
-                for event in agent.run_stream(req.question, history):
-                    results.append(event)
-                return results
+            # 使用真正的流式推理：后台线程产出事件，通过 call_soon_threadsafe
+            # 投递到事件循环上的 asyncio.Queue，异步侧直接 await，无需轮询
+            loop = asyncio.get_running_loop()
+            event_queue: asyncio.Queue = asyncio.Queue()
             
-            # 在线程中运行流式生成器
-            import concurrent.futures
-            import queue
-            
-            event_queue = queue.Queue()
+            def post(item):
+                try:
+                    loop.call_soon_threadsafe(event_queue.put_nowait, item)
+                except RuntimeError:
+                    pass  # 事件循环已关闭（服务停止），丢弃事件
             
             def stream_worker():
                 try:
                     for event in agent.run_stream(req.question, history):
-                        event_queue.put(event)
-                    event_queue.put(None)  # 结束标记
+                        post(event)
                 except Exception as e:
-                    event_queue.put(Exception(str(e)))
+                    post(Exception(str(e)))
+                finally:
+                    # 推理结束后才归还 Agent，客户端提前断开时也不会被其他请求复用
+                    release_agent(req, agent)
+                    post(None)  # 结束标记
             
-            # 启动后台线程
-            import threading
-            worker_thread = threading.Thread(target=stream_worker, daemon=True)
-            worker_thread.start()
+            # 提交到共享线程池，复制当前上下文使 provider 覆盖在工作线程中同样生效
+            worker_future = _STREAM_POOL.submit(contextvars.copy_context().run, stream_worker)
             
             # 从队列中读取事件并发送
             while True:
-                try:
-                    # 使用短超时以便能够响应
-                    event = await asyncio.get_event_loop().run_in_executor(
-                        None, 
-                        lambda: event_queue.get(timeout=0.1)
-                    )
-                except:
-                    # 超时，继续检查
-                    if not worker_thread.is_alive():
-                        break
-                    continue
+                event = await event_queue.get()
                 
                 if event is None:
                     break
                     
                 if isinstance(event, Exception):
-                    yield f"data: {json.dumps({'type': 'error', 'data': str(event)}, ensure_ascii=False)}\n\n"
+                    yield sse_event({'type': 'error', 'data': str(event)})
                     break
                 
                 # 将 StreamEvent 转换为 JSON
@@ -372,20 +547,12 @@ async def agent_query_stream(req: AgentQueryRequest):
                 if event.type == 'answer':
                     final_answer = event.data
                 
-                yield f"data: {json.dumps(event_data, ensure_ascii=False)}\n\n"
-                
-                # 对于 token 事件，不需要额外延迟
-                if event.type != 'token':
-                    await asyncio.sleep(0.01)
+                # 事件到达即发送，不做服务端节流（打字机效果由前端负责）
+                yield sse_event(event_data)
             
             # 如果使用了 conversation_id，保存对话到历史
             if req.conversation_id and final_answer:
-                agent._conversation_manager.add_message(
-                    req.conversation_id, "user", req.question
-                )
-                agent._conversation_manager.add_message(
-                    req.conversation_id, "assistant", final_answer, save_to_disk=True
-                )
+                _save_turn(agent, req.conversation_id, req.question, final_answer)
                 logger.info(f"[Agent Stream] 已保存对话到历史")
             
             # 记录完成日志
@@ -394,14 +561,13 @@ async def agent_query_stream(req: AgentQueryRequest):
             
         except Exception as e:
             logger.error(f"[Agent Stream] 执行失败 - 错误: {str(e)}")
-            yield f"data: {json.dumps({'type': 'error', 'data': str(e)})}\n\n"
+            yield sse_event({'type': 'error', 'data': str(e)})
         finally:
-            # 恢复原来的 provider
-            if req.provider:
-                Config.MODEL_PROVIDER = original_provider
-                logger.info(f"[Agent Stream] 已恢复 MODEL_PROVIDER = {original_provider}")
+            # 后台任务未提交时由这里归还 Agent
+            if agent is not None and worker_future is None:
+                release_agent(req, agent)
     
-    return StreamingResponse(generate(), media_type="text/event-stream")
+    return StreamingResponse(generate(), media_type="text/event-stream", headers=SSE_HEADERS)
 
 
 @router.post("/analyze")
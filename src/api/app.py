@@ -1,18 +1,29 @@
 """FastAPI 应用工厂"""
 import logging
 import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
+from typing import Optional
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from src.api.routes import router
-from src.api.agent_routes import router as agent_router
+from src.api.agent_routes import router as agent_router, flush_pending_conversations
 from src.utils.logger import setup_logging
 
 
+_log_listener: Optional[QueueListener] = None
+
+
 # 在应用启动时配置日志
 def configure_logging():
-    """配置全局日志"""
+    """配置全局日志
+    
+    根 logger 只挂一个 QueueHandler，控制台与文件输出由后台 QueueListener 线程完成，
+    请求处理中记录日志不会阻塞在 I/O 上。
+    """
+    global _log_listener
     log_dir = Path(__file__).parent.parent.parent / "logs"
     log_dir.mkdir(exist_ok=True)
     
@@ -24,6 +35,7 @@ def configure_logging():
     
     # 避免重复添加handler
     if not root_logger.handlers:
+        handlers = []
         # 控制台输出
         console_handler = logging.StreamHandler()
         console_handler.setLevel(logging.INFO)
@@ -31,17 +43,22 @@ def configure_logging():
             "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
         )
         console_handler.setFormatter(formatter)
-        root_logger.addHandler(console_handler)
+        handlers.append(console_handler)
         
         # 文件输出
         try:
             file_handler = logging.FileHandler(backend_log, encoding='utf-8')
             file_handler.setLevel(logging.INFO)
             file_handler.setFormatter(formatter)
-            root_logger.addHandler(file_handler)
+            handlers.append(file_handler)
             print(f"✓ 日志系统已初始化，日志文件: {backend_log}")
         except Exception as e:
             print(f"⚠️ 无法创建日志文件: {e}")
+        
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        root_logger.addHandler(QueueHandler(log_queue))
+        _log_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _log_listener.start()
 
 
 def create_app() -> FastAPI:
@@ -70,6 +87,13 @@ def create_app() -> FastAPI:
     app.include_router(router, prefix="/api")
     app.include_router(agent_router, prefix="/api")  # Agent 路由
     
+    @app.on_event("shutdown")
+    async def shutdown():
+        # 关闭前写入尚未落盘的对话历史
+        await flush_pending_conversations()
+        if _log_listener is not None:
+            _log_listener.stop()
+    
     @app.get("/")
     async def root():
         return {
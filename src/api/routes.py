@@ -6,20 +6,24 @@ import os
 import re
 import time
 import asyncio
-import traceback
 import logging
 import uuid
+import hashlib
+import threading
+from dataclasses import asdict, dataclass, replace
 from pathlib import Path
-from typing import Optional
+from typing import Optional, List
 
 from src.config.settings import Config
 from src.core.document_processor import DocumentProcessor
-from src.core.vector_store import VectorStore
+from src.core.vector_store import VectorStore, create_vector_store
 from src.services.rag_assistant import RAGAssistant
 from src.services.conversation_manager import ConversationManager
-from src.services.ollama_client import generate as ollama_generate, OllamaError
-from src.services.deepseek_client import generate as deepseek_generate, DeepSeekError
+from src.services.ollama_client import agenerate as ollama_agenerate, OllamaError
+from src.services.deepseek_client import agenerate as deepseek_agenerate, DeepSeekError
 from src.models.schemas import QueryRequest, BuildRequest, ConversationMessage
+from src.utils.answer_cache import AnswerCache
+from src.utils.sse import sse_event, SSE_DONE, SSE_HEADERS
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -30,13 +34,77 @@ router = APIRouter()
 # 全局状态管理
 _assistant: Optional[RAGAssistant] = None
 _conversation_manager: Optional[ConversationManager] = None
-_build_progress = {
-    "processing": False,
-    "progress": 0,
-    "total": 0,
-    "current_file": "",
-    "status": "idle"
-}
+_vector_store: Optional[VectorStore] = None
+_doc_processor: Optional[DocumentProcessor] = None
+_assistant_lock = threading.Lock()  # 保证并发请求只加载一次向量库
+
+
+@dataclass(frozen=True)
+class BuildProgress:
+    """知识库构建进度快照（不可变，更新时整体替换引用，读取方不会看到半更新的状态）"""
+    processing: bool
+    progress: int
+    total: int
+    current_file: str
+    status: str
+
+
+_build_progress = BuildProgress(processing=False, progress=0, total=0, current_file="", status="idle")
+
+
+def _update_build_progress(**changes):
+    """基于当前快照生成新的构建进度并替换"""
+    global _build_progress
+    _build_progress = replace(_build_progress, **changes)
+
+
+# 请求热路径上用到的配置项（Config 在启动时从环境变量读取，运行期不变）
+_SIM_THRESH = getattr(Config, 'SIMILARITY_THRESHOLD', None)
+_MAX_DIST = getattr(Config, 'MAX_DISTANCE', None)
+_TOP_K = Config.TOP_K
+_MAX_TOKENS = Config.MAX_TOKENS
+_TEMP = Config.TEMPERATURE
+
+# 知识库中没有相关内容时的固定回复（预编码）
+_NO_ANSWER_TEXT = '我无法根据现有知识库中的信息回答这个问题'
+_NO_ANSWER_FRAMES = (
+    sse_event({'type': 'sources', 'data': []}),
+    sse_event({'type': 'content', 'data': _NO_ANSWER_TEXT}),
+    SSE_DONE,
+)
+
+# 流式问答的答案缓存：(sources, final_text)，重复或近似重复的问题跳过检索与生成
+_answer_cache = AnswerCache(
+    max_size=512,
+    ttl=Config.ANSWER_CACHE_TTL,
+    semantic=Config.ENABLE_SEMANTIC_CACHE,
+)
+
+
+def _answer_cache_scope(req: QueryRequest, provider: str, history: List[ConversationMessage]) -> str:
+    """答案缓存的作用域：模型与检索参数，以及当前问题之前的对话上下文
+
+    从会话中加载的历史末尾已包含本次提问，计入摘要会使措辞不同的同义问题落入不同作用域，
+    因此只对之前的轮次计算摘要。
+    """
+    if provider == 'ollama':
+        model = req.ollama_model or Config.OLLAMA_MODEL
+        retrieval = f"{req.top_k or Config.TOP_K}"
+    elif provider == 'deepseek':
+        model = req.deepseek_model or Config.LLM_MODEL
+        retrieval = f"{req.top_k or Config.TOP_K}"
+    else:
+        model = Config.LLM_MODEL
+        retrieval = f"{req.method or 'vector'}|{bool(req.rerank)}|{req.top_k or Config.TOP_K}"
+
+    prior = list(history or [])
+    if prior and prior[-1].role == "user" and prior[-1].content == req.question:
+        prior.pop()
+
+    history_digest = hashlib.blake2b(digest_size=8)
+    for msg in prior[-6:]:
+        history_digest.update(f"{msg.role}:{msg.content}\x00".encode("utf-8"))
+    return f"{provider}|{model}|{retrieval}|{history_digest.hexdigest()}"
 
 
 def generate_trace_id() -> str:
@@ -44,9 +112,45 @@ def generate_trace_id() -> str:
     return str(uuid.uuid4())[:8]
 
 
+# LLM 返回中 answer 字段的兜底提取正则
+_ANSWER_RE = re.compile(r'"answer"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+# 流式问答的提示词模板（字面量花括号已转义，使用 format_map 填充）
+_OLLAMA_PROMPT_TMPL = (
+    "你必须只返回一个有效的 JSON 对象，格式严格如下:\n"
+    "{{\"answer\": \"这里是你的中文回答\"}}\n"
+    "重要规则：\n"
+    "1. 只输出 JSON 对象，不要输出任何其他文本\n"
+    "2. answer 字段的值必须是一段完整、连贯的中文回答\n"
+    "3. 不要在 JSON 前后添加任何额外的字符或解释\n"
+    "4. 确保 JSON 格式完全有效\n"
+    "5. 必须仅基于以下上下文回答，不能使用常识\n"
+    "5. 必须以提供的上下文为唯一信息源，不要引入外部未提供的信息。\n"
+    "6. 如果用户的问题是一个实体名或关键词，请直接从上下文中提取并用一到两句简短中文陈述该实体的事实。\n"
+    "7. 只有在上下文确实不包含任何与问题相关的事实时，answer 字段才应为：'我无法根据现有知识库中的信息回答这个问题'。\n"
+    "{conversation_context}"
+    "上下文信息:\n{context_text}\n\n问题: {question}\n\n"
+    "回答示例：{{\"answer\": \"这是示例答案\"}}\n"
+)
+
+_DEEPSEEK_PROMPT_TMPL = (
+    "你必须只返回一个有效的 JSON 对象，格式严格如下:\n"
+    '{{"answer": "这里是你的中文回答"}}\n'
+    "重要规则：只能基于下面的上下文回答，不要添加外部信息。\n\n"
+    "{conversation_context}"
+    "上下文信息:\n{context_text}\n\n问题: {question}\n"
+)
+
+
+_JSON_DECODER = json.JSONDecoder()
+
+
 def parse_llm_json_response(response_text: str) -> str:
     """从 LLM 响应中解析 JSON answer 字段
     
+    从第一个 `{` 开始用 raw_decode 一次解析出 JSON 对象（兼容前后带说明文字或代码块标记），
+    解析失败时再用正则提取 answer 字段。
+    
     Args:
         response_text: LLM 原始响应文本
         
@@ -54,39 +158,60 @@ def parse_llm_json_response(response_text: str) -> str:
         解析出的答案文本，如果解析失败则返回原文本
     """
     s = response_text.strip()
+    start_idx = s.find('{')
+    if start_idx == -1:
+        return s
     
-    # 尝试直接解析完整 JSON
     try:
-        parsed = json.loads(s)
+        parsed, _ = _JSON_DECODER.raw_decode(s, start_idx)
         if isinstance(parsed, dict) and "answer" in parsed:
             return str(parsed.get("answer", "")).strip()
-        return s
     except json.JSONDecodeError:
         pass
     
-    # 尝试从文本中提取 JSON 对象
-    start_idx = s.find('{')
-    end_idx = s.rfind('}')
-    if start_idx != -1 and end_idx != -1 and start_idx < end_idx:
-        try:
-            maybe_json = s[start_idx:end_idx+1]
-            parsed = json.loads(maybe_json)
-            if isinstance(parsed, dict) and "answer" in parsed:
-                return str(parsed.get("answer", "")).strip()
-        except json.JSONDecodeError:
-            pass
-        
-        # 使用正则表达式提取 answer 字段
-        answer_match = re.search(r'"answer"\s*:\s*"((?:[^"\\]|\\.)*)"', s)
-        if answer_match:
-            return answer_match.group(1).replace('\\"', '"').replace('\\n', '\n')
+    # 使用正则表达式提取 answer 字段
+    answer_match = _ANSWER_RE.search(s, start_idx)
+    if answer_match:
+        return answer_match.group(1).replace('\\"', '"').replace('\\n', '\n')
     
     return s
 
 
+_NL_TABLE = str.maketrans('\n\r\t', '   ')
+
+
+_PREVIEW_DOCS = 5  # 只为排名靠前的文档生成预览
+
+
+def _doc_to_source(doc, with_preview: bool = True) -> dict:
+    """将检索到的文档转换为前端展示用的来源信息（来源 + 前 200 字预览）"""
+    meta = getattr(doc, 'metadata', None) or {}
+    if not with_preview:
+        return {"source": meta.get('source', '未知来源'), "preview": ""}
+    content = getattr(doc, 'page_content', '') or ''
+    return {"source": meta.get('source', '未知来源'), "preview": content[:200].translate(_NL_TABLE)}
+
+
+def _docs_to_sources(docs) -> List[dict]:
+    """批量转换来源信息，预览只读取前 _PREVIEW_DOCS 个文档的正文"""
+    return [_doc_to_source(doc, i < _PREVIEW_DOCS) for i, doc in enumerate(docs)]
+
+
+def format_conversation_context(messages: List[ConversationMessage]) -> str:
+    """将最近的对话消息格式化为提示词中的【对话历史】段落"""
+    parts = ["【对话历史】\n"]
+    parts.extend(
+        f"{'用户' if msg.role == 'user' else '助手'}: {msg.content}\n" for msg in messages
+    )
+    parts.append("\n")
+    return "".join(parts)
+
+
 async def stream_text_in_chunks(text: str, chunk_size: int = 20):
     """分批流式发送文本，提高性能
     
+    答案已完整生成，按块直接发送，不再人为等待（原先每批 sleep 会让长答案多出数秒延迟）。
+    
     Args:
         text: 要发送的文本
         chunk_size: 每批发送的字符数
@@ -96,8 +221,7 @@ async def stream_text_in_chunks(text: str, chunk_size: int = 20):
     """
     for i in range(0, len(text), chunk_size):
         chunk = text[i:i+chunk_size]
-        yield f"data: {json.dumps({'type': 'content', 'data': chunk})}\n\n"
-        await asyncio.sleep(0.05)  # 每批等待 50ms，比逐字符更高效
+        yield sse_event({'type': 'content', 'data': chunk})
 
 
 def get_conversation_manager() -> ConversationManager:
@@ -108,6 +232,22 @@ def get_conversation_manager() -> ConversationManager:
     return _conversation_manager
 
 
+def get_vector_store() -> VectorStore:
+    """获取共享的向量库实例（嵌入模型只加载一次）"""
+    global _vector_store
+    if _vector_store is None:
+        _vector_store = create_vector_store()
+    return _vector_store
+
+
+def get_doc_processor() -> DocumentProcessor:
+    """获取共享的文档处理器实例"""
+    global _doc_processor
+    if _doc_processor is None:
+        _doc_processor = DocumentProcessor()
+    return _doc_processor
+
+
 def get_assistant() -> Optional[RAGAssistant]:
     """获取 RAG 助手实例"""
     return _assistant
@@ -120,21 +260,36 @@ def set_assistant(assistant: Optional[RAGAssistant]):
 
 
 def load_assistant() -> bool:
-    """加载助手"""
+    """加载助手
+    
+    已加载时直接返回，不做配置校验和磁盘检查；未加载时加锁，保证并发请求只加载一次。
+    """
     global _assistant
-    try:
-        Config.validate()
-        if _assistant is None:
-            vector_store = VectorStore()
+    if _assistant is not None:
+        return True
+    with _assistant_lock:
+        if _assistant is not None:
+            return True
+        try:
+            Config.validate()
+            vector_store = get_vector_store()
             vs = vector_store.load_vectorstore()
             if vs is None:
                 return False
-            _assistant = RAGAssistant(vector_store=vector_store)
-            _assistant.setup_qa_chain()
+            assistant = RAGAssistant(vector_store=vector_store)
+            assistant.setup_qa_chain()
+            _assistant = assistant
+            return True
+        except Exception as e:
+            logger.error(f"加载助手失败: {e}")
+            return False
+
+
+async def ensure_assistant() -> bool:
+    """异步版本的 load_assistant：已加载时无阻塞返回，否则在线程中加载，避免阻塞事件循环"""
+    if _assistant is not None:
         return True
-    except Exception as e:
-        print("加载助手失败:", e)
-        return False
+    return await asyncio.to_thread(load_assistant)
 
 
 @router.get("/status")
@@ -148,74 +303,72 @@ def status():
 def build(req: BuildRequest):
     """构建知识库"""
     try:
-        processor = DocumentProcessor()
+        processor = get_doc_processor()
         chunks = processor.process_documents(req.documents_path)
         if not chunks:
             return {"success": False, "message": "未找到可处理的文档"}
 
-        vector_store = VectorStore()
+        vector_store = get_vector_store()
         vector_store.create_vectorstore(chunks)
         
-        # 重新加载 assistant
+        # 重新加载 assistant，知识库变化后旧答案失效
         global _assistant
         _assistant = None
+        _answer_cache.clear()
         load_assistant()  # 立即重新加载
         return {"success": True, "processed_chunks": len(chunks)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def build_knowledge_base_background(documents_path: str):
-    """后台构建知识库并更新进度"""
-    global _build_progress, _assistant
+async def build_knowledge_base_background(documents_path: str):
+    """后台构建知识库并更新进度
+    
+    阻塞的文档解析与向量化放到线程中执行，进度只在事件循环中更新，无需加锁。
+    """
+    global _assistant
     try:
-        _build_progress["processing"] = True
-        _build_progress["status"] = "reading"
-        _build_progress["current_file"] = "扫描文档..."
-        _build_progress["progress"] = 0
-        _build_progress["total"] = 0
+        _update_build_progress(processing=True, status="reading", current_file="扫描文档...", progress=0, total=0)
         
-        processor = DocumentProcessor()
-        chunks = processor.process_documents(documents_path)
+        processor = get_doc_processor()
+        chunks = await asyncio.to_thread(processor.process_documents, documents_path)
         
         if not chunks:
-            _build_progress["status"] = "error"
-            _build_progress["current_file"] = "未找到可处理的文档"
-            _build_progress["processing"] = False
+            _update_build_progress(status="error", current_file="未找到可处理的文档", processing=False)
             return
         
-        _build_progress["total"] = len(chunks)
-        _build_progress["status"] = "building"
-        _build_progress["current_file"] = "生成向量..."
+        _update_build_progress(total=len(chunks), status="building", current_file="生成向量...")
         
-        vector_store = VectorStore()
+        vector_store = get_vector_store()
         
-        # 分批添加文档，逐步更新进度（每50个一批）
-        batch_size = 50
-        for i in range(0, len(chunks), batch_size):
-            batch = chunks[i:i+batch_size]
-            if i == 0:
-                vector_store.create_vectorstore(batch)
-            else:
-                vector_store.add_documents(batch)
-            
-            _build_progress["progress"] = min(i + batch_size, len(chunks))
-            _build_progress["current_file"] = f"已处理 {_build_progress['progress']}/{len(chunks)} 个文档块"
-            time.sleep(0.1)
+        # 分批添加文档，逐步更新进度；首批创建数据库，其余批次并行向量化写入
+        batch_size = max(1, Config.EMBED_BATCH_SIZE)
+        batches = [chunks[i:i+batch_size] for i in range(0, len(chunks), batch_size)]
+        semaphore = asyncio.Semaphore(max(1, Config.EMBED_PARALLEL))
+        
+        def report_progress(done: int):
+            progress = min(_build_progress.progress + done, len(chunks))
+            _update_build_progress(progress=progress, current_file=f"已处理 {progress}/{len(chunks)} 个文档块")
         
-        # 重新加载 assistant
+        async def embed_batch(batch):
+            async with semaphore:
+                await asyncio.to_thread(vector_store.add_documents, batch)
+            report_progress(len(batch))
+        
+        await asyncio.to_thread(vector_store.create_vectorstore, batches[0])
+        report_progress(len(batches[0]))
+        await asyncio.gather(*(embed_batch(batch) for batch in batches[1:]))
+        await asyncio.to_thread(vector_store.persist)
+        
+        # 重新加载 assistant，知识库变化后旧答案失效
         _assistant = None
-        load_assistant()
+        _answer_cache.clear()
+        await ensure_assistant()
         
-        _build_progress["progress"] = len(chunks)
-        _build_progress["status"] = "completed"
-        _build_progress["current_file"] = "完成"
-        _build_progress["processing"] = False
+        _update_build_progress(progress=len(chunks), status="completed", current_file="完成", processing=False)
         
     except Exception as e:
-        _build_progress["status"] = "error"
-        _build_progress["current_file"] = f"错误: {str(e)}"
-        _build_progress["processing"] = False
+        _update_build_progress(status="error", current_file=f"错误: {str(e)}", processing=False)
 
 
 @router.post("/upload")
@@ -243,14 +396,10 @@ async def upload_file(file: UploadFile = File(...)):
 @router.post("/build-start")
 async def build_start(background_tasks: BackgroundTasks):
     """启动后台知识库构建"""
-    if _build_progress["processing"]:
+    if _build_progress.processing:
         return {"success": False, "message": "已有构建任务进行中"}
     
-    _build_progress["processing"] = True
-    _build_progress["progress"] = 0
-    _build_progress["total"] = 0
-    _build_progress["status"] = "processing"
-    _build_progress["current_file"] = "初始化..."
+    _update_build_progress(processing=True, progress=0, total=0, status="processing", current_file="初始化...")
     
     background_tasks.add_task(build_knowledge_base_background, "./documents")
     return {"success": True, "message": "构建任务已启动"}
@@ -259,7 +408,7 @@ async def build_start(background_tasks: BackgroundTasks):
 @router.get("/build-progress")
 async def build_progress_endpoint():
     """获取构建进度"""
-    return _build_progress
+    return asdict(_build_progress)
 
 
 @router.get("/conversations")
@@ -271,31 +420,9 @@ async def list_conversations():
         
         conversations = []
         for conv_id in conversation_ids:
-            # 加载对话以获取摘要信息
-            conv_manager.load_conversation(conv_id)
-            history = conv_manager.get_history(conv_id, max_messages=2)
-            
-            # 获取第一条用户消息作为标题
-            title = "新对话"
-            last_time = None
-            message_count = len(conv_manager.get_history(conv_id))
-            
-            for msg in history:
-                if msg.role == "user":
-                    title = msg.content[:50] + ("..." if len(msg.content) > 50 else "")
-                    break
-            
-            # 获取最后消息时间
-            full_history = conv_manager.get_history(conv_id)
-            if full_history:
-                last_time = full_history[-1].timestamp
-            
-            conversations.append({
-                "id": conv_id,
-                "title": title,
-                "message_count": message_count,
-                "last_time": last_time
-            })
+            # 摘要信息带缓存，会话文件未变化时不会重复读盘
+            summary = conv_manager.get_summary(conv_id)
+            conversations.append({"id": conv_id, **summary})
         
         # 按时间倒序排列
         conversations.sort(key=lambda x: x["last_time"] or "", reverse=True)
@@ -359,13 +486,14 @@ async def query_stream(req: QueryRequest):
     start_time = time.time()
     logger.info(f"[{trace_id}] 开始处理查询 - 问题: {req.question[:100]}..., Provider: {req.provider}")
     
-    if not load_assistant():
+    if not await ensure_assistant():
         error_msg = "向量数据库未加载。请先构建或确认数据库目录。"
         async def error_generate():
-            yield f"data: {json.dumps({'type': 'error', 'data': error_msg})}\n\n"
-        return StreamingResponse(error_generate(), media_type="text/event-stream")
+            yield sse_event({'type': 'error', 'data': error_msg})
+        return StreamingResponse(error_generate(), media_type="text/event-stream", headers=SSE_HEADERS)
     
-    req_provider = (req.provider or Config.MODEL_PROVIDER or '').strip().lower()
+    assistant = get_assistant()
+    req_provider = (req.provider or Config.get_model_provider() or '').strip().lower()
     
     # 获取对话管理器并处理对话历史
     conv_manager = get_conversation_manager()
@@ -376,37 +504,73 @@ async def query_stream(req: QueryRequest):
         conversation_id = conv_manager.create_conversation()
         logger.info(f"[{trace_id}] 创建新会话: {conversation_id}")
     
-    # 添加用户消息到历史
-    conv_manager.add_message(conversation_id, "user", req.question)
+    def load_history() -> List[ConversationMessage]:
+        # 添加用户消息到历史，再获取历史消息（可能需要从磁盘加载）
+        conv_manager.add_message(conversation_id, "user", req.question)
+        return req.history if req.history else conv_manager.get_history(conversation_id, max_messages=6)
     
-    # 获取历史消息
-    history = req.history if req.history else conv_manager.get_history(conversation_id, max_messages=6)
+    history = await asyncio.to_thread(load_history)
     logger.info(f"[{trace_id}] 会话 {conversation_id} - 历史消息数: {len(history)}")
     
+    # 答案缓存：相同作用域下重复/近似重复的问题直接返回缓存的来源与答案
+    cache_enabled = Config.ANSWER_CACHE_TTL > 0
+    cache_scope = _answer_cache_scope(req, req_provider, history) if cache_enabled else ""
+    cache_key = AnswerCache.make_key(cache_scope, req.question) if cache_enabled else ""
+    question_embedding = None
+    
+    def remember_answer(sources: list, final_text: str):
+        """生成成功后写入答案缓存"""
+        if cache_enabled and final_text:
+            _answer_cache.put(cache_key, (sources, final_text), scope=cache_scope, embedding=question_embedding)
+    
+    # Ollama/DeepSeek 分支在线程中检索；精确缓存未命中后才发起，与语义缓存查询重叠执行
+    docs_task: Optional[asyncio.Future] = None
+    
+    def start_retrieval():
+        nonlocal docs_task
+        if docs_task is None and req_provider in ('ollama', 'deepseek'):
+            docs_task = asyncio.ensure_future(
+                asyncio.to_thread(assistant.retrieve_documents, req.question, k=_TOP_K)
+            )
+    
     async def generate():
+        nonlocal question_embedding
         try:
+            if cache_enabled:
+                cached = _answer_cache.get(cache_key)
+                if cached is None and _answer_cache.semantic_enabled:
+                    try:
+                        # 与检索共用 VectorStore 的问题向量缓存，检索时不再重复向量化
+                        question_embedding = await asyncio.to_thread(assistant.vector_store.embed_query, req.question)
+                        start_retrieval()
+                        cached = _answer_cache.get_similar(cache_scope, question_embedding)
+                    except Exception as e:
+                        logger.warning(f"[{trace_id}] 计算问题向量失败，跳过语义缓存: {e}")
+                if cached is not None:
+                    sources, final_text = cached
+                    logger.info(f"[{trace_id}] 命中答案缓存，跳过检索与生成")
+                    yield sse_event({'type': 'conversation_id', 'data': conversation_id})
+                    yield sse_event({'type': 'sources', 'data': sources})
+                    async for chunk in stream_text_in_chunks(final_text, chunk_size=20):
+                        yield chunk
+                    conv_manager.add_message(conversation_id, "assistant", final_text, save_to_disk=True)
+                    yield SSE_DONE
+                    return
+            
+            start_retrieval()
             if req_provider == 'ollama':
                 try:
-                    assistant = get_assistant()
-                    if assistant is None:
-                        load_assistant()
-                        assistant = get_assistant()
-                    
-                    logger.info(f"[Ollama] 开始检索文档...")
-                    docs = assistant.retrieve_documents(req.question, k=Config.TOP_K)
-                    logger.info(f"[Ollama] 问题: {req.question}")
-                    logger.info(f"[Ollama] 检索到 {len(docs)} 个文档")
+                    logger.info(f"[Ollama] 等待检索结果...")
+                    docs = await docs_task
                     logger.debug(f"[Ollama] 问题: {req.question}")
                     logger.debug(f"[Ollama] 检索到 {len(docs)} 个文档")
                     
                     # 如果检索结果为空（由于相似度阈值过滤）
                     if not docs:
-                        similarity_threshold = getattr(Config, 'SIMILARITY_THRESHOLD', None)
-                        if similarity_threshold is not None:
-                            logger.debug(f"[Ollama] 知识库中未找到与您的问题相关的文档（相似度阈值: {similarity_threshold})")
-                            yield f"data: {json.dumps({'type': 'sources', 'data': []})}\n\n"
-                            yield f"data: {json.dumps({'type': 'content', 'data': '我无法根据现有知识库中的信息回答这个问题'})}\n\n"
-                            yield f"data: {json.dumps({'type': 'done'})}\n\n"
+                        if _SIM_THRESH is not None:
+                            logger.debug(f"[Ollama] 知识库中未找到与您的问题相关的文档（相似度阈值: {_SIM_THRESH})")
+                            for frame in _NO_ANSWER_FRAMES:
+                                yield frame
                             return
                     
                     contexts = []
@@ -418,6 +582,14 @@ async def query_stream(req: QueryRequest):
                         else:
                             contexts.append(str(doc))
                     
+                    # 检索到的内容过少时不值得调用大模型，直接返回无法回答
+                    total_ctx = sum(map(len, contexts))
+                    if total_ctx < Config.MIN_CONTEXT_CHARS:
+                        logger.info(f"[Ollama] 上下文仅 {total_ctx} 字符，跳过模型调用")
+                        for frame in _NO_ANSWER_FRAMES:
+                            yield frame
+                        return
+                    
                     context_text = "\n\n".join(contexts)
                     logger.debug(f"[Ollama] 上下文总长度: {len(context_text)} 字符")
                     
@@ -428,58 +600,37 @@ async def query_stream(req: QueryRequest):
                         recent_history = history[-6:]  # 最多6条消息（3轮对话）
                         logger.info(f"[Conversation] 使用历史消息数: {len(recent_history)}")
                         if recent_history:
-                            conversation_context = "【对话历史】\n"
-                            for msg in recent_history:
-                                role_name = "用户" if msg.role == "user" else "助手"
-                                conversation_context += f"{role_name}: {msg.content}\n"
-                            conversation_context += "\n"
-                            logger.info(f"[Conversation] 对话历史上下文:\n{conversation_context}")
+                            conversation_context = format_conversation_context(recent_history)
+                            logger.debug(f"[Conversation] 对话历史上下文:\n{conversation_context}")
                     
-                    prompt = (
-                        "你必须只返回一个有效的 JSON 对象，格式严格如下:\n"
-                        "{\"answer\": \"这里是你的中文回答\"}\n"
-                        "重要规则：\n"
-                        "1. 只输出 JSON 对象，不要输出任何其他文本\n"
-                        "2. answer 字段的值必须是一段完整、连贯的中文回答\n"
-                        "3. 不要在 JSON 前后添加任何额外的字符或解释\n"
-                        "4. 确保 JSON 格式完全有效\n"
-                        "5. 必须仅基于以下上下文回答，不能使用常识\n"
-                        "5. 必须以提供的上下文为唯一信息源，不要引入外部未提供的信息。\n"
-                        "6. 如果用户的问题是一个实体名或关键词，请直接从上下文中提取并用一到两句简短中文陈述该实体的事实。\n"
-                        "7. 只有在上下文确实不包含任何与问题相关的事实时，answer 字段才应为：'我无法根据现有知识库中的信息回答这个问题'。\n"
-                        f"{conversation_context}"
-                        f"上下文信息:\n{context_text}\n\n问题: {req.question}\n\n"
-                        "回答示例：{\"answer\": \"这是示例答案\"}\n"
-                    )
+                    prompt = _OLLAMA_PROMPT_TMPL.format_map({
+                        "conversation_context": conversation_context,
+                        "context_text": context_text,
+                        "question": req.question,
+                    })
                     
                     model_name = req.ollama_model or Config.OLLAMA_MODEL
                     api_url = req.ollama_api_url or Config.OLLAMA_API_URL
                     
-                    sources = []
-                    for doc in docs:
-                        src = getattr(doc, 'metadata', {}).get('source', '未知来源') if hasattr(doc, 'metadata') else '未知来源'
-                        preview = getattr(doc, 'page_content', '')
-                        preview = preview[:200].replace('\n', ' ') if preview else ''
-                        sources.append({"source": src, "preview": preview})
+                    sources = _docs_to_sources(docs)
                     
                     # 先发送会话ID，确保前端立即获取
-                    yield f"data: {json.dumps({'type': 'conversation_id', 'data': conversation_id})}\n\n"
+                    yield sse_event({'type': 'conversation_id', 'data': conversation_id})
                     
                     meta_info = {'returned': len(docs)}
-                    if getattr(Config, 'MAX_DISTANCE', None) is not None:
-                        meta_info['note'] = f"应用 MAX_DISTANCE={Config.MAX_DISTANCE} 进行过滤"
-                    yield f"data: {json.dumps({'type': 'sources', 'data': sources, 'meta': meta_info})}\n\n"
+                    if _MAX_DIST is not None:
+                        meta_info['note'] = f"应用 MAX_DISTANCE={_MAX_DIST} 进行过滤"
+                    yield sse_event({'type': 'sources', 'data': sources, 'meta': meta_info})
                     
                     # 调用 Ollama 生成
                     logger.info(f"[Ollama] 开始调用AI生成答案 - 模型: {model_name}")
                     ai_start = time.time()
-                    ollama_result = ollama_generate(
+                    ollama_result = await ollama_agenerate(
                         model=model_name,
                         prompt=prompt,
-                        max_tokens=Config.MAX_TOKENS,
-                        temperature=Config.TEMPERATURE,
+                        max_tokens=_MAX_TOKENS,
+                        temperature=_TEMP,
                         api_url=api_url,
-                        stream=False
                     )
                     
                     ai_elapsed = time.time() - ai_start
@@ -498,6 +649,7 @@ async def query_stream(req: QueryRequest):
                         async for chunk in stream_text_in_chunks(final_text, chunk_size=20):
                             yield chunk
                         
+                        remember_answer(sources, final_text)
                         # 保存助手的回复到对话历史
                         conv_manager.add_message(conversation_id, "assistant", final_text, save_to_disk=True)
                         logger.info(f"[Conversation] 保存助手回复到会话 {conversation_id}")
@@ -505,32 +657,25 @@ async def query_stream(req: QueryRequest):
                     total_elapsed = time.time() - start_time
                     logger.info(f"[Ollama] 完整流程完成 - 总耗时: {total_elapsed:.2f}秒")
                     
-                    yield f"data: {json.dumps({'type': 'done'})}\n\n"
+                    yield SSE_DONE
                     
                 except OllamaError as oe:
-                    print(f"调用本地 Ollama 失败: {oe}")
-                    yield f"data: {json.dumps({'type': 'error', 'data': f'Ollama 错误: {str(oe)}'})}\n\n"
+                    logger.error(f"[{trace_id}] 调用本地 Ollama 失败: {oe}")
+                    yield sse_event({'type': 'error', 'data': f'Ollama 错误: {str(oe)}'})
                 except Exception as e:
-                    print(f"Ollama 分支异常: {e}")
-                    traceback.print_exc()
-                    yield f"data: {json.dumps({'type': 'error', 'data': f'Ollama 处理失败: {str(e)}'})}\n\n"
+                    logger.exception(f"[{trace_id}] Ollama 分支异常: {e}")
+                    yield sse_event({'type': 'error', 'data': f'Ollama 处理失败: {str(e)}'})
             elif req_provider == 'deepseek':
                 try:
                     logger.info(f"[DeepSeek] 开始处理请求")
-                    assistant = get_assistant()
-                    if assistant is None:
-                        load_assistant()
-                        assistant = get_assistant()
 
-                    logger.info(f"[DeepSeek] 开始检索文档...")
-                    docs = assistant.retrieve_documents(req.question, k=Config.TOP_K)
+                    logger.info(f"[DeepSeek] 等待检索结果...")
+                    docs = await docs_task
                     logger.info(f"[DeepSeek] 检索到 {len(docs)} 个文档")
                     if not docs:
-                        similarity_threshold = getattr(Config, 'SIMILARITY_THRESHOLD', None)
-                        if similarity_threshold is not None:
-                            yield f"data: {json.dumps({'type': 'sources', 'data': []})}\n\n"
-                            yield f"data: {json.dumps({'type': 'content', 'data': '我无法根据现有知识库中的信息回答这个问题'})}\n\n"
-                            yield f"data: {json.dumps({'type': 'done'})}\n\n"
+                        if _SIM_THRESH is not None:
+                            for frame in _NO_ANSWER_FRAMES:
+                                yield frame
                             return
 
                     contexts = []
@@ -542,6 +687,14 @@ async def query_stream(req: QueryRequest):
                         else:
                             contexts.append(str(doc))
 
+                    # 检索到的内容过少时不值得调用大模型，直接返回无法回答
+                    total_ctx = sum(map(len, contexts))
+                    if total_ctx < Config.MIN_CONTEXT_CHARS:
+                        logger.info(f"[DeepSeek] 上下文仅 {total_ctx} 字符，跳过模型调用")
+                        for frame in _NO_ANSWER_FRAMES:
+                            yield frame
+                        return
+                    
                     context_text = "\n\n".join(contexts)
 
                     # 构建对话历史上下文
@@ -550,47 +703,35 @@ async def query_stream(req: QueryRequest):
                         recent_history = history[-6:]  # 最多6条消息（3轮对话）
                         logger.info(f"[Conversation] 使用历史消息数: {len(recent_history)}")
                         if recent_history:
-                            conversation_context = "【对话历史】\n"
-                            for msg in recent_history:
-                                role_name = "用户" if msg.role == "user" else "助手"
-                                conversation_context += f"{role_name}: {msg.content}\n"
-                            conversation_context += "\n"
-
-                    prompt = (
-                        "你必须只返回一个有效的 JSON 对象，格式严格如下:\n"
-                        '{"answer": "这里是你的中文回答"}\n'
-                        "重要规则：只能基于下面的上下文回答，不要添加外部信息。\n\n"
-                        f"{conversation_context}"
-                        f"上下文信息:\n{context_text}\n\n问题: {req.question}\n"
-                    )
+                            conversation_context = format_conversation_context(recent_history)
+
+                    prompt = _DEEPSEEK_PROMPT_TMPL.format_map({
+                        "conversation_context": conversation_context,
+                        "context_text": context_text,
+                        "question": req.question,
+                    })
 
                     model_name = req.deepseek_model or Config.LLM_MODEL
                     api_url = req.deepseek_api_url or Config.DEEPSEEK_API_URL
                     api_key = req.deepseek_api_key or Config.DEEPSEEK_API_KEY
 
-                    sources = []
-                    for doc in docs:
-                        src = getattr(doc, 'metadata', {}).get('source', '未知来源') if hasattr(doc, 'metadata') else '未知来源'
-                        preview = getattr(doc, 'page_content', '')
-                        preview = preview[:200].replace('\n', ' ') if preview else ''
-                        sources.append({"source": src, "preview": preview})
+                    sources = _docs_to_sources(docs)
 
                     # 先发送会话ID，确保前端立即获取
-                    yield f"data: {json.dumps({'type': 'conversation_id', 'data': conversation_id})}\n\n"
+                    yield sse_event({'type': 'conversation_id', 'data': conversation_id})
                     
-                    yield f"data: {json.dumps({'type': 'sources', 'data': sources})}\n\n"
+                    yield sse_event({'type': 'sources', 'data': sources})
 
                     # 调用 DeepSeek
                     logger.info(f"[{trace_id}] DeepSeek 开始调用AI生成答案 - 模型: {model_name}")
                     ai_start = time.time()
-                    ds_result = deepseek_generate(
+                    ds_result = await deepseek_agenerate(
                         model=model_name,
                         prompt=prompt,
-                        max_tokens=Config.MAX_TOKENS,
-                        temperature=Config.TEMPERATURE,
+                        max_tokens=_MAX_TOKENS,
+                        temperature=_TEMP,
                         api_url=api_url,
                         api_key=api_key,
-                        stream=False,
                     )
                     
                     ai_elapsed = time.time() - ai_start
@@ -607,23 +748,24 @@ async def query_stream(req: QueryRequest):
                         async for chunk in stream_text_in_chunks(final_text, chunk_size=20):
                             yield chunk
                         
+                        remember_answer(sources, final_text)
                         # 保存助手的回复到对话历史
                         conv_manager.add_message(conversation_id, "assistant", final_text, save_to_disk=True)
                         logger.info(f"[{trace_id}] 保存助手回复到会话 {conversation_id}")
 
-                    yield f"data: {json.dumps({'type': 'done'})}\n\n"
+                    yield SSE_DONE
                 except DeepSeekError as dse:
-                    yield f"data: {json.dumps({'type': 'error', 'data': f'DeepSeek 错误: {str(dse)}'})}\n\n"
+                    logger.error(f"[{trace_id}] 调用 DeepSeek 失败: {dse}")
+                    yield sse_event({'type': 'error', 'data': f'DeepSeek 错误: {str(dse)}'})
                 except Exception as e:
-                    traceback.print_exc()
-                    yield f"data: {json.dumps({'type': 'error', 'data': f'DeepSeek 处理失败: {str(e)}'})}\n\n"
+                    logger.exception(f"[{trace_id}] DeepSeek 分支异常: {e}")
+                    yield sse_event({'type': 'error', 'data': f'DeepSeek 处理失败: {str(e)}'})
             else:
                 # 默认使用 RAGAssistant
                 try:
-                    assistant = get_assistant()
                     method = req.method or 'vector'
                     rerank = bool(req.rerank) if req.rerank is not None else False
-                    top_k = req.top_k or Config.TOP_K
+                    top_k = req.top_k or _TOP_K
                     
                     # 使用对话历史调用query
                     # 前端已经排除了当前用户消息，直接使用
@@ -639,38 +781,36 @@ async def query_stream(req: QueryRequest):
                         history if history else None
                     )
                     answer = result.get("answer", "")
-                    sources = []
-                    if "sources" in result and result["sources"]:
-                        for doc in result["sources"]:
-                            src = doc.metadata.get("source", "未知来源")
-                            preview = getattr(doc, "page_content", "")
-                            preview = preview[:200].replace("\n", " ") if preview else ""
-                            sources.append({"source": src, "preview": preview})
+                    sources = _docs_to_sources(result.get("sources") or [])
                     
                     # 先发送会话ID，确保前端立即获取
-                    yield f"data: {json.dumps({'type': 'conversation_id', 'data': conversation_id})}\n\n"
+                    yield sse_event({'type': 'conversation_id', 'data': conversation_id})
                     
-                    yield f"data: {json.dumps({'type': 'sources', 'data': sources})}\n\n"
+                    yield sse_event({'type': 'sources', 'data': sources})
                     
-                    for char in answer:
-                        yield f"data: {json.dumps({'type': 'content', 'data': char})}\n\n"
-                        await asyncio.sleep(0.01)
+                    # 分批流式发送（每批20字符，不逐字符发送）
+                    async for chunk in stream_text_in_chunks(answer, chunk_size=20):
+                        yield chunk
                     
+                    remember_answer(sources, answer)
                     # 保存助手的回复到对话历史
                     conv_manager.add_message(conversation_id, "assistant", answer, save_to_disk=True)
                     logger.info(f"[Conversation] 保存助手回复到会话 {conversation_id}")
                     
-                    yield f"data: {json.dumps({'type': 'done'})}\n\n"
+                    yield SSE_DONE
                 except Exception as query_err:
-                    print(f"RAG 查询异常: {query_err}")
-                    traceback.print_exc()
+                    logger.exception(f"[{trace_id}] RAG 查询异常: {query_err}")
                     err_detail = str(query_err)
                     if "APIConnectionError" in err_detail or "Connection" in err_detail:
                         err_detail = f"模型 API 连接失败。请检查网络连接和 API 配置\n原始错误: {err_detail}"
-                    yield f"data: {json.dumps({'type': 'error', 'data': err_detail})}\n\n"
+                    yield sse_event({'type': 'error', 'data': err_detail})
                 
         except Exception as e:
-            traceback.print_exc()
-            yield f"data: {json.dumps({'type': 'error', 'data': f'查询处理异常: {str(e)}'})}\n\n"
+            logger.exception(f"[{trace_id}] 查询处理异常: {e}")
+            yield sse_event({'type': 'error', 'data': f'查询处理异常: {str(e)}'})
+        finally:
+            # 命中语义缓存或客户端断开时丢弃尚未完成的检索
+            if docs_task is not None and not docs_task.done():
+                docs_task.cancel()
     
-    return StreamingResponse(generate(), media_type="text/event-stream")
+    return StreamingResponse(generate(), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -1,5 +1,7 @@
 """配置管理模块"""
 import os
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dotenv import load_dotenv
 from typing import Optional
 import pytz
@@ -17,6 +19,25 @@ except AttributeError:
     pass
 
 
+# 请求级别的模型提供者覆盖，None 表示使用全局的 Config.MODEL_PROVIDER
+_provider_ctx: ContextVar[Optional[str]] = ContextVar("model_provider", default=None)
+
+
+@contextmanager
+def override_model_provider(provider: Optional[str]):
+    """在当前上下文（请求/任务）内临时指定模型提供者，不修改全局配置
+
+    用法:
+        with override_model_provider(req.provider):
+            agent = RAGAgent(...)
+    """
+    token = _provider_ctx.set((provider or "").strip().lower() or None)
+    try:
+        yield
+    finally:
+        _provider_ctx.reset(token)
+
+
 class Settings:
     """环境设置类 - 用于不同环境的配置"""
     
@@ -91,12 +112,79 @@ class Config:
     except Exception:
         SIMILARITY_THRESHOLD = 0.2
     
+    # 检索上下文总字数低于该值时直接返回“无法回答”，不再调用大模型（0 表示关闭）
+    MIN_CONTEXT_CHARS = int(os.getenv("MIN_CONTEXT_CHARS", "80"))
+    
+    # 向量库后端：chroma 或 faiss（需要 faiss-cpu）
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+    # FAISS IVF 索引：倒排聚类数上限、PQ 子向量数、检索时探查的聚类数、
+    # 文档块数达到该值后才训练 IVF 量化索引（之前使用精确的 Flat 索引）
+    FAISS_NLIST = int(os.getenv("FAISS_NLIST", "4096"))
+    FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", "32"))
+    FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+    FAISS_MIN_TRAIN_SIZE = int(os.getenv("FAISS_MIN_TRAIN_SIZE", "10000"))
+    # IVF 索引的向量编码：pq（乘积量化，压缩率最高）或 sq8（逐维 int8 标量量化，精度更高）；
+    # 重排倍数 > 0 时额外保存原始 float32 向量，先用压缩编码取 k×倍数 个候选再精确重排
+    FAISS_CODEC = os.getenv("FAISS_CODEC", "pq").lower()
+    FAISS_REFINE_K_FACTOR = int(os.getenv("FAISS_REFINE_K_FACTOR", "0"))
+    
+    # Chroma HNSW 近似最近邻索引参数（仅在新建向量库时生效）
+    # M：每个节点的连接数；CONSTRUCTION_EF：建索引时的候选数；SEARCH_EF：查询时的候选数（Chroma 默认 10，过低会损失召回）
+    HNSW_M = int(os.getenv("HNSW_M", "16"))
+    HNSW_CONSTRUCTION_EF = int(os.getenv("HNSW_CONSTRUCTION_EF", "200"))
+    HNSW_SEARCH_EF = int(os.getenv("HNSW_SEARCH_EF", "64"))
+    
+    # 检索缓存：问题向量 LRU 的容量；检索结果语义缓存的容量（0 表示关闭）与命中所需的最小余弦相似度
+    QUERY_EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "1024"))
+    SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+    SEARCH_CACHE_THRESHOLD = float(os.getenv("SEARCH_CACHE_THRESHOLD", "0.98"))
+    
     # RAG 性能优化配置
     RAG_FAST_MODE = os.getenv("RAG_FAST_MODE", "true").lower() == "true"
     
+    # 知识库构建：每批向量化的文档块数量与并行批次数
+    EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+    EMBED_PARALLEL = int(os.getenv("EMBED_PARALLEL", "4"))
+    
+    # 本地嵌入模型：每次前向计算的批大小（0 表示按设备自动选择：GPU 128、CPU 32）、
+    # PyTorch CPU 线程数（0 表示不修改）、GPU 上是否使用半精度
+    EMBED_ENCODE_BATCH_SIZE = int(os.getenv("EMBED_ENCODE_BATCH_SIZE", "0"))
+    EMBED_NUM_THREADS = int(os.getenv("EMBED_NUM_THREADS", str(os.cpu_count() or 0)))
+    EMBED_FP16 = os.getenv("EMBED_FP16", "true").lower() == "true"
+    # CPU 推理时是否启用 BF16 自动混合精度（需要支持 AVX512-BF16/AMX 的 CPU，否则可能更慢）
+    EMBED_CPU_BF16 = os.getenv("EMBED_CPU_BF16", "false").lower() == "true"
+    # 本地嵌入模型的最大输入 token 数（超出截断，0 表示使用模型默认值；调小可减少填充计算，但需覆盖 CHUNK_SIZE）
+    EMBED_MAX_SEQ_LENGTH = int(os.getenv("EMBED_MAX_SEQ_LENGTH", "0"))
+    # 本地嵌入模型推理后端：torch 或 onnx（需要 optimum[onnxruntime]）；onnx 后端可导出图优化（O1-O4，
+    # O4 仅限 GPU，空字符串表示不优化）与 int8 动态量化模型
+    EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch").lower()
+    EMBED_ONNX_OPTIMIZATION = os.getenv("EMBED_ONNX_OPTIMIZATION", "O3")
+    EMBED_ONNX_QUANTIZE = os.getenv("EMBED_ONNX_QUANTIZE", "true").lower() == "true"
+    EMBED_ONNX_QUANT_CONFIG = os.getenv("EMBED_ONNX_QUANT_CONFIG", "avx512_vnni")
+    EMBED_ONNX_DIR = os.getenv("EMBED_ONNX_DIR", "./models/bge-small-zh-onnx")
+    # 本地嵌入模型加载后是否在后台预热一次，消除首次查询的冷启动延迟
+    EMBED_WARMUP = os.getenv("EMBED_WARMUP", "true").lower() == "true"
+    # 本地嵌入模型的文档向量磁盘缓存（按文本内容哈希，重建知识库时跳过未变化的文档块；空字符串表示关闭）
+    EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "./embed_cache/embeddings.sqlite3")
+    # 本地嵌入模型多进程编码：工作进程数（0 或 1 表示关闭；GPU 上开启时每块显卡一个进程）、启用多进程的最少文本数
+    EMBED_PROCESSES = int(os.getenv("EMBED_PROCESSES", "0"))
+    EMBED_MULTIPROCESS_MIN = int(os.getenv("EMBED_MULTIPROCESS_MIN", "256"))
+    
+    # Agent 流式推理的最大并发线程数
+    STREAM_WORKERS = int(os.getenv("STREAM_WORKERS", "16"))
+    
+    # 流式问答的答案缓存：有效期（秒，0 表示关闭）与是否启用语义相似度匹配
+    ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "300"))
+    ENABLE_SEMANTIC_CACHE = os.getenv("ENABLE_SEMANTIC_CACHE", "true").lower() == "true"
+    
     # 文档目录
     DOCUMENTS_PATH = "./documents"
     
+    @classmethod
+    def get_model_provider(cls) -> str:
+        """获取当前生效的模型提供者：优先使用请求上下文中的覆盖值"""
+        return _provider_ctx.get() or cls.MODEL_PROVIDER
+    
     @classmethod
     def validate(cls):
         """验证配置"""
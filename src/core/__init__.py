@@ -1,6 +1,7 @@
 """核心业务模块"""
 from src.core.document_processor import DocumentProcessor
-from src.core.vector_store import VectorStore
+from src.core.vector_store import VectorStore, create_vector_store
+from src.core.faiss_vector_store import FaissVectorStore
 from src.core.bm25_retriever import BM25Retriever
 
-__all__ = ["DocumentProcessor", "VectorStore", "BM25Retriever"]
+__all__ = ["DocumentProcessor", "VectorStore", "FaissVectorStore", "create_vector_store", "BM25Retriever"]
@@ -0,0 +1,237 @@
+"""FAISS 向量数据库模块 - IVF 倒排 + 量化（PQ / int8）索引，适合大规模知识库"""
+import logging
+import math
+import os
+from threading import Lock
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+from src.config.settings import Config
+from src.core.vector_store import VectorStore
+
+
+logger = logging.getLogger(__name__)
+
+# FAISS 建议每个聚类中心至少 39 个训练样本
+_MIN_POINTS_PER_CENTROID = 39
+_INDEX_FILE = "index.faiss"
+
+
+def _pq_subquantizers(dim: int, preferred: int) -> int:
+    """PQ 子向量数需整除向量维度，取不超过 preferred 的最大约数"""
+    for m in range(min(preferred, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def _index_description(n: int, dim: int) -> str:
+    """按数据量与配置生成 faiss.index_factory 描述串，如 IVF1024,PQ32x8 或 IVF1024,SQ8,RFlat"""
+    nlist = max(1, min(Config.FAISS_NLIST, int(4 * math.sqrt(n)), n // _MIN_POINTS_PER_CENTROID))
+    if Config.FAISS_CODEC == "sq8":
+        # 逐维 int8 标量量化：每维的取值范围在训练时标定
+        codec = "SQ8"
+    else:
+        codec = f"PQ{_pq_subquantizers(dim, Config.FAISS_PQ_M)}x8"
+    description = f"IVF{nlist},{codec}"
+    if Config.FAISS_REFINE_K_FACTOR > 0:
+        description += ",RFlat"
+    return description
+
+
+def build_ivf_index(vectors: np.ndarray):
+    """用给定向量训练 IVF 量化索引（PQ 或 SQ8，可选 float32 精确重排）并写入全部向量
+
+    聚类数随数据量自适应：不超过 Config.FAISS_NLIST、4·√N 和 N/39，保证每个聚类有足够训练样本。
+    """
+    n, dim = vectors.shape
+    index = faiss.index_factory(dim, _index_description(n, dim))
+    nlist = faiss.extract_index_ivf(index).nlist
+
+    # 训练样本数够用即可，超大知识库随机采样
+    max_train = nlist * 256
+    sample = vectors
+    if n > max_train:
+        sample = vectors[np.random.default_rng(0).choice(n, max_train, replace=False)]
+    index.train(sample)
+    index.add(vectors)
+    _set_search_params(index)
+    return index
+
+
+def _set_search_params(index):
+    """设置检索时探查的聚类数与重排倍数（Flat 索引无此参数）"""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = Config.FAISS_NPROBE
+    if isinstance(index, faiss.IndexRefine) and Config.FAISS_REFINE_K_FACTOR > 0:
+        index.k_factor = Config.FAISS_REFINE_K_FACTOR
+
+
+class FaissVectorStore(VectorStore):
+    """基于 FAISS 的向量数据库管理器，接口与 VectorStore 一致
+
+    文档块较少时使用精确的 IndexFlatL2；数量达到 Config.FAISS_MIN_TRAIN_SIZE 后，
+    用已有向量训练 IVF 量化索引替换，检索只比较 nprobe 个聚类内的压缩向量
+    （开启 FAISS_REFINE_K_FACTOR 时再用原始向量对候选精确重排）。
+    距离同为平方 L2，与 Chroma 的距离/相似度阈值换算一致。
+    """
+
+    def __init__(self, persist_directory: str = None, embeddings: Any = None):
+        if faiss is None:
+            raise ImportError("未安装 faiss，请运行 `pip install faiss-cpu` 或设置 VECTOR_BACKEND=chroma")
+        super().__init__(persist_directory=persist_directory, embeddings=embeddings)
+        # 索引与文档存储的写入需串行（构建知识库时多个批次并行向量化）
+        self._write_lock = Lock()
+
+    def create_vectorstore(self, documents: List[Any], batch_size: int = None) -> FAISS:
+        """创建向量数据库（按批向量化，写完后保存到磁盘）
+
+        Args:
+            documents: 文档列表
+            batch_size: 每批向量化的文档数，默认使用 Config.EMBED_BATCH_SIZE
+
+        Returns:
+            向量数据库实例
+        """
+        logger.info("开始创建向量数据库（FAISS），文档数量: %d", len(documents))
+
+        self._invalidate_search_caches()
+        self.vectorstore = None
+
+        batch_size = max(1, batch_size or Config.EMBED_BATCH_SIZE)
+        for start in range(0, len(documents), batch_size):
+            batch = documents[start:start + batch_size]
+            self._add_batch(batch)
+            logger.debug("已写入 %d/%d 个文档块", start + len(batch), len(documents))
+
+        self.persist()
+        logger.info("向量数据库创建成功，保存在: %s", self.persist_directory)
+        return self.vectorstore
+
+    def load_vectorstore(self) -> Optional[FAISS]:
+        """加载已存在的向量数据库
+
+        Returns:
+            向量数据库实例，如果不存在则返回 None
+        """
+        if not os.path.exists(os.path.join(self.persist_directory, _INDEX_FILE)):
+            logger.info("向量数据库不存在: %s", self.persist_directory)
+            return None
+
+        logger.info("加载向量数据库: %s", self.persist_directory)
+        self.clear_search_cache()
+        # 文档存储是本模块 save_local 写入的 pickle 文件
+        self.vectorstore = FAISS.load_local(
+            self.persist_directory,
+            self.embeddings,
+            allow_dangerous_deserialization=True,
+        )
+        _set_search_params(self.vectorstore.index)
+
+        logger.info("向量数据库加载成功")
+        return self.vectorstore
+
+    def add_documents(self, documents: List[Any]):
+        """向现有数据库添加文档（只写入内存，需调用 persist 保存）
+
+        Args:
+            documents: 文档列表
+        """
+        if self.vectorstore is None:
+            self.load_vectorstore()
+
+        if self.vectorstore is None:
+            self.create_vectorstore(documents)
+        else:
+            logger.debug("添加 %d 个文档到向量数据库", len(documents))
+            self._add_batch(documents)
+            self._invalidate_search_caches()
+            logger.debug("文档添加成功")
+
+    def _add_batch(self, documents: List[Any]):
+        """向量化一批文档并写入索引，必要时升级为 IVF 量化索引"""
+        if not documents:
+            return
+        texts = [doc.page_content for doc in documents]
+        metadatas = [doc.metadata for doc in documents]
+        # 向量化在锁外进行，并行批次只在写入索引时排队
+        vectors = self.embeddings.embed_documents(texts)
+
+        with self._write_lock:
+            if self.vectorstore is None:
+                self.vectorstore = FAISS(
+                    embedding_function=self.embeddings,
+                    index=faiss.IndexFlatL2(len(vectors[0])),
+                    docstore=InMemoryDocstore(),
+                    index_to_docstore_id={},
+                )
+            self.vectorstore.add_embeddings(zip(texts, vectors), metadatas=metadatas)
+            self._maybe_train()
+
+    def _maybe_train(self):
+        """Flat 索引的向量数达到阈值时，用全部向量训练 IVF 量化索引替换（调用方持有写锁）
+
+        向量按原顺序重建，索引位置到文档 ID 的映射保持不变。
+        """
+        index = self.vectorstore.index
+        if not isinstance(index, faiss.IndexFlat) or index.ntotal < max(1, Config.FAISS_MIN_TRAIN_SIZE):
+            return
+        logger.info("文档块数达到 %d，训练 IVF 量化索引", index.ntotal)
+        self.vectorstore.index = build_ivf_index(index.reconstruct_n(0, index.ntotal))
+
+    def _search_by_vector(self, embedding: List[float], k: int) -> List[tuple]:
+        """按问题向量检索，返回 (文档, 距离) 列表（距离转为 Python float，便于 JSON 序列化）"""
+        results = self.vectorstore.similarity_search_with_score_by_vector(embedding, k=k)
+        return [(doc, float(score)) for doc, score in results]
+
+    def _search_many_by_vectors(self, embeddings: List[List[float]], k: int) -> List[List[tuple]]:
+        """FAISS 在进程内检索，逐个问题查询即可，没有额外的往返开销"""
+        return [self._search_by_vector(embedding, k) for embedding in embeddings]
+
+    def count(self) -> int:
+        """知识库中的文档块数量"""
+        if not self._ensure_loaded():
+            return 0
+        return self.vectorstore.index.ntotal
+
+    def persist(self):
+        """将索引与文档存储保存到持久化目录"""
+        with self._write_lock:
+            if self.vectorstore is not None:
+                self.vectorstore.save_local(self.persist_directory)
+
+    def delete_collection(self):
+        """删除向量数据库（内存与磁盘）"""
+        if self.vectorstore is not None:
+            self.vectorstore = None
+            for name in (_INDEX_FILE, "index.pkl"):
+                path = os.path.join(self.persist_directory, name)
+                if os.path.exists(path):
+                    os.remove(path)
+            self._invalidate_search_caches()
+            logger.info("向量数据库已删除")
+
+    def get_document_list(self) -> List[str]:
+        """获取知识库中所有文档的列表
+
+        Returns:
+            文档来源路径列表（去重）
+        """
+        if not self._ensure_loaded():
+            return []
+
+        sources = {
+            doc.metadata["source"]
+            for doc in self.vectorstore.docstore._dict.values()
+            if doc.metadata and "source" in doc.metadata
+        }
+        return sorted(sources)
@@ -1,9 +1,19 @@
 """向量数据库模块"""
+import atexit
+import contextlib
+import logging
 import os
-from typing import List, Optional, Any
+import sqlite3
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from threading import Lock, Thread
+from typing import Iterable, Iterator, List, Optional, Any
 
 from typing import Any
-from langchain_community.vectorstores.chroma import Chroma
+import numpy as np
+from langchain_community.vectorstores.chroma import Chroma, _results_to_docs_and_scores
 
 try:
     from langchain_community.embeddings.openai import OpenAIEmbeddings
@@ -13,87 +23,446 @@ except Exception:
 # 当使用 Gemini 或本地嵌入时，使用 sentence-transformers 作为后备实现
 try:
     from sentence_transformers import SentenceTransformer
-    import numpy as np
 except Exception:
     SentenceTransformer = None
-    np = None
+
+try:
+    import torch
+except Exception:
+    torch = None
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
 from src.config.settings import Config
+from src.utils.embedding_cache import EmbeddingDiskCache
+from src.utils.semantic_cache import SemanticCache
+
+
+logger = logging.getLogger(__name__)
+
+_ONNX_OPTIMIZED_FILE = "onnx/model_{level}.onnx"
+_ONNX_QUANTIZED_FILE = "onnx/model_{suffix}.onnx"
+
+# 知识库内容代数：任一 VectorStore 实例写入或删除数据时递增。
+# 同一进程中可能有多个实例指向同一份数据（API 共享实例、各 Agent 工具各自的实例），
+# 检索结果缓存记录写入时的代数，代数变化后整体失效
+_store_generation = 0
+_store_generation_lock = Lock()
+
+
+def _bump_store_generation():
+    """知识库内容变化，所有实例的检索结果缓存失效"""
+    global _store_generation
+    with _store_generation_lock:
+        _store_generation += 1
+
+# Chroma 持久化目录中的 SQLite 文件；元数据按 (id, key, string_value) 行存储
+_CHROMA_SQLITE_FILE = "chroma.sqlite3"
+_DISTINCT_SOURCES_SQL = """
+    SELECT DISTINCT em.string_value
+    FROM embedding_metadata em
+    JOIN embeddings e ON e.id = em.id
+    JOIN segments s ON s.id = e.segment_id
+    WHERE em.key = 'source' AND em.string_value IS NOT NULL AND s.collection = ?
+"""
+
+
+def _filter_topk(distances, threshold, k):
+    """距离换算为相似度 1/(1+d)，过滤低于阈值的项并取相似度最高的 k 个
+
+    Returns:
+        (下标数组, 对应相似度数组)，按相似度从高到低排序
+    """
+    sims = 1.0 / (1.0 + distances)
+    candidates = np.flatnonzero(sims >= threshold)
+    top = candidates[np.argsort(-sims[candidates], kind="mergesort")[:k]]
+    return top, sims[top]
+
+
+# 安装了 numba 时编译为机器码（首次调用 JIT，cache=True 缓存到磁盘），否则使用 numpy 实现
+if njit is not None:
+    _filter_topk = njit(cache=True)(_filter_topk)
+
+
+def _load_onnx_model(model_name: str):
+    """以 ONNX Runtime 后端加载模型（首次加载时导出并缓存到本地）
+
+    可选先做图优化（算子融合，如 Attention/LayerNorm/GELU），再导出 int8 动态量化版本。
+    """
+    model = SentenceTransformer(model_name, backend="onnx")
+    level = Config.EMBED_ONNX_OPTIMIZATION
+    if not level and not Config.EMBED_ONNX_QUANTIZE:
+        return model
+
+    from sentence_transformers import export_dynamic_quantized_onnx_model, export_optimized_onnx_model
+
+    export_dir = Config.EMBED_ONNX_DIR
+    if not os.path.exists(export_dir):
+        model.save(export_dir)
+
+    if level:
+        file_name = _ONNX_OPTIMIZED_FILE.format(level=level)
+        if not os.path.exists(os.path.join(export_dir, file_name)):
+            logger.info("导出 %s 图优化 ONNX 模型到: %s", level, export_dir)
+            export_optimized_onnx_model(model, level, export_dir)
+        model = SentenceTransformer(export_dir, backend="onnx", model_kwargs={"file_name": file_name})
+        if not Config.EMBED_ONNX_QUANTIZE:
+            return model
+
+    # 在（优化后的）模型上做动态量化，文件名区分是否经过图优化
+    suffix = f"{level}_qint8_{Config.EMBED_ONNX_QUANT_CONFIG}" if level else f"qint8_{Config.EMBED_ONNX_QUANT_CONFIG}"
+    file_name = _ONNX_QUANTIZED_FILE.format(suffix=suffix)
+    if not os.path.exists(os.path.join(export_dir, file_name)):
+        logger.info("导出 int8 量化 ONNX 模型到: %s", export_dir)
+        export_dynamic_quantized_onnx_model(model, Config.EMBED_ONNX_QUANT_CONFIG, export_dir, file_suffix=suffix)
+    return SentenceTransformer(export_dir, backend="onnx", model_kwargs={"file_name": file_name})
+
+
+class LocalEmbeddings:
+    """本地 Embeddings 适配器，提供 embed_documents 与 embed_query 方法"""
+    def __init__(self, model_name: str = "BAAI/bge-small-zh-v1.5", batch_size: int = None):
+        # 使用支持中文的嵌入模型，提升中文语义检索效果
+        self.backend = "torch"
+        if Config.EMBED_BACKEND == "onnx":
+            try:
+                self.model = _load_onnx_model(model_name)
+                self.backend = "onnx"
+            except Exception as e:
+                # 缺少 optimum/onnxruntime 或导出失败时回退到 PyTorch
+                logger.warning("ONNX 后端加载失败，回退到 PyTorch: %s", e)
+        if self.backend == "torch":
+            self.model = SentenceTransformer(model_name)
+        if Config.EMBED_MAX_SEQ_LENGTH > 0:
+            self.model.max_seq_length = Config.EMBED_MAX_SEQ_LENGTH
+        on_gpu = str(self.model.device).startswith("cuda")
+        # GPU 上大批次能更好地填满算力；CPU 上受内存带宽限制，小批次即可
+        self.batch_size = batch_size or Config.EMBED_ENCODE_BATCH_SIZE or (128 if on_gpu else 32)
+        if torch is not None:
+            if Config.EMBED_NUM_THREADS > 0:
+                torch.set_num_threads(Config.EMBED_NUM_THREADS)
+            # GPU 上使用半精度推理
+            if self.backend == "torch" and Config.EMBED_FP16 and on_gpu:
+                self.model.half()
+        self._on_gpu = on_gpu
+        # CPU 上可选 BF16 自动混合精度，矩阵乘走 BF16 指令，输出仍转换为 float32
+        self._cpu_bf16 = (
+            torch is not None and self.backend == "torch" and not on_gpu and Config.EMBED_CPU_BF16
+        )
+        # 多进程编码池，首次批量编码时创建；同一时刻只允许一个调用使用（池的输入/输出队列是共享的）
+        self._pool = None
+        self._pool_lock = Lock()
+        # 文档向量磁盘缓存，命名空间包含所有会影响向量结果的模型配置
+        self._disk_cache: Optional[EmbeddingDiskCache] = None
+        if Config.EMBED_CACHE_PATH:
+            namespace = "|".join([
+                model_name,
+                self.backend,
+                Config.EMBED_ONNX_OPTIMIZATION if self.backend == "onnx" else "",
+                Config.EMBED_ONNX_QUANT_CONFIG if self.backend == "onnx" and Config.EMBED_ONNX_QUANTIZE else "",
+                "fp16" if self.backend == "torch" and Config.EMBED_FP16 and on_gpu else "",
+                "bf16" if self._cpu_bf16 else "",
+                str(self.model.max_seq_length),
+            ])
+            self._disk_cache = EmbeddingDiskCache(Config.EMBED_CACHE_PATH, namespace=namespace)
+        # 后台预热：提前完成 CUDA 上下文初始化与首次推理的内核加载，构造本身不阻塞
+        if Config.EMBED_WARMUP:
+            Thread(target=self._warmup, name="embed-warmup", daemon=True).start()
+
+    def _warmup(self):
+        """用与正式查询相同的精度与路径编码一次短文本"""
+        try:
+            with self._autocast():
+                self.model.encode("warmup", show_progress_bar=False, convert_to_numpy=True, normalize_embeddings=True)
+        except Exception as e:
+            logger.warning("嵌入模型预热失败: %s", e)
+
+    def _autocast(self):
+        """编码时使用的自动混合精度上下文（未启用时为空上下文）"""
+        if self._cpu_bf16:
+            return torch.autocast("cpu", dtype=torch.bfloat16)
+        return contextlib.nullcontext()
+
+    def _use_multi_process(self, count: int) -> bool:
+        """是否对本批文本使用多进程编码（仅 PyTorch 后端）"""
+        return self.backend == "torch" and Config.EMBED_PROCESSES > 1 and count >= Config.EMBED_MULTIPROCESS_MIN
+
+    def _get_pool(self):
+        """创建（或复用）多进程编码池，调用方需持有 _pool_lock"""
+        if self._pool is None:
+            if self._on_gpu:
+                target_devices = None  # 每块显卡一个进程
+            else:
+                target_devices = ["cpu"] * Config.EMBED_PROCESSES
+            # 每个 CPU 工作进程只用一个计算线程，避免多进程间线程超额订阅（子进程继承环境变量）
+            previous = os.environ.get("OMP_NUM_THREADS")
+            os.environ["OMP_NUM_THREADS"] = "1"
+            try:
+                self._pool = self.model.start_multi_process_pool(target_devices)
+            finally:
+                if previous is None:
+                    os.environ.pop("OMP_NUM_THREADS", None)
+                else:
+                    os.environ["OMP_NUM_THREADS"] = previous
+            atexit.register(self.close)
+        return self._pool
+
+    def close(self):
+        """停止多进程编码池"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self.model.stop_multi_process_pool(self._pool)
+                self._pool = None
+
+    def _encode_parallel(self, texts: List[str]) -> np.ndarray:
+        """多进程数据并行编码，返回 float32 矩阵"""
+        with self._pool_lock:
+            embs = self.model.encode_multi_process(
+                texts,
+                self._get_pool(),
+                batch_size=self.batch_size,
+                normalize_embeddings=True,
+            )
+        return embs.astype("float32", copy=False)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """编码一批文本，返回 float32 矩阵；文本数量较多且开启多进程时走进程池"""
+        if self._use_multi_process(len(texts)):
+            return self._encode_parallel(texts)
+        # 输出归一化向量，余弦相似度等价于点积；encode 内部已按文本长度排序分批并还原顺序
+        with self._autocast():
+            embs = self.model.encode(
+                texts,
+                batch_size=self.batch_size,
+                show_progress_bar=False,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+            )
+        return embs.astype("float32", copy=False)
+
+    def embed_documents_parallel(self, texts):
+        """多进程数据并行编码，适合大批量建库"""
+        return self._encode_parallel(list(texts)).tolist()
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        if self._disk_cache is None:
+            # 整个矩阵一次性转换为 Python 列表，避免逐个元素 float() 装箱
+            return self._encode(texts).tolist()
+
+        # 内容未变的文档块直接复用磁盘缓存中的向量，只对未命中的文本调用模型
+        vectors = self._disk_cache.get_many(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            embs = self._encode(missing_texts)
+            self._disk_cache.put_many(missing_texts, embs)
+            for i, emb in zip(missing, embs):
+                vectors[i] = emb
+        if not vectors:
+            return []
+        return np.vstack(vectors).tolist()
+
+    def embed_queries(self, texts):
+        """批量编码多个问题（一次前向计算，不写入文档向量磁盘缓存）"""
+        return self._encode(list(texts)).tolist()
+
+    def embed_query(self, text):
+        # 传入单个字符串，encode 直接返回一维向量，无需再取 [0]
+        with self._autocast():
+            emb = self.model.encode(text, show_progress_bar=False, convert_to_numpy=True, normalize_embeddings=True)
+        return emb.astype("float32", copy=False).tolist()
+
+
+@lru_cache(maxsize=4)
+def _create_embeddings(provider: str, model: Optional[str], api_key: Optional[str], api_base: Optional[str]) -> Any:
+    """按配置创建 Embedding 模型，相同配置在进程内只创建一次
+
+    provider 只取 "openai" 或 "local"（由 get_default_embeddings 归一化），
+    各模型提供者共用同一个本地模型实例。
+    """
+    if provider == "openai":
+        if OpenAIEmbeddings is None:
+            raise ImportError("OpenAIEmbeddings 未安装，请运行 `pip install langchain-openai` 或切换到其他 MODEL_PROVIDER")
+        return OpenAIEmbeddings(
+            model=model,
+            openai_api_key=api_key,
+            openai_api_base=api_base,
+        )
+
+    # 对于 gemini/ollama/deepseek 或本地回退（包括 provider 是 openai 但没有提供 key），使用 sentence-transformers
+    if SentenceTransformer is None:
+        raise ImportError("未安装 sentence-transformers，请运行 `pip install sentence-transformers` 或在 .env 中配置有效的 OPENAI_API_KEY/GEMINI_API_KEY")
+    return LocalEmbeddings()
+
+
+def get_default_embeddings() -> Any:
+    """获取当前配置对应的共享 Embedding 模型
+
+    所有未显式传入 embeddings 的 VectorStore 共用同一个模型实例，避免重复加载模型权重。
+    只有 OpenAI 可用时才按其配置区分，其它模型提供者都映射到同一个本地模型。
+    """
+    if (Config.get_model_provider() or "").lower() == "openai" and Config.OPENAI_API_KEY:
+        return _create_embeddings("openai", Config.EMBEDDING_MODEL, Config.OPENAI_API_KEY, Config.OPENAI_API_BASE)
+    return _create_embeddings("local", None, None, None)
+
+
+class _EmbedCache:
+    """Embedding 模型包装器：按归一化后的问题文本缓存 embed_query 结果（LRU）
+
+    Chroma/FAISS 的检索器内部也直接调用 embed_query，包装后所有检索路径共享同一缓存。
+    embed_documents 及其它属性原样转发给被包装的模型。
+    """
+
+    def __init__(self, embeddings: Any, maxsize: int = 1024):
+        self.embeddings = embeddings
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """NFKC 归一化（全角/半角等统一）并去掉首尾空白；不改变大小写，部分嵌入模型区分大小写"""
+        return unicodedata.normalize("NFKC", text).strip()
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self.normalize(text)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return embedding
+            self.misses += 1
+
+        embedding = self.embeddings.embed_query(key)
+        with self._lock:
+            self._entries[key] = embedding
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return embedding
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """批量计算问题向量：命中缓存的直接返回，其余一次批量编码"""
+        keys = [self.normalize(text) for text in texts]
+        results: List[Optional[List[float]]] = [None] * len(keys)
+        with self._lock:
+            for i, key in enumerate(keys):
+                embedding = self._entries.get(key)
+                if embedding is not None:
+                    self._entries.move_to_end(key)
+                    results[i] = embedding
+            hits = sum(1 for r in results if r is not None)
+            self.hits += hits
+            self.misses += len(keys) - hits
+
+        # 同一批次中重复的问题只编码一次
+        missing = list(dict.fromkeys(key for key, r in zip(keys, results) if r is None))
+        if missing:
+            batch_embed = getattr(self.embeddings, "embed_queries", None) or self.embeddings.embed_documents
+            computed = dict(zip(missing, batch_embed(missing)))
+            with self._lock:
+                for key, embedding in computed.items():
+                    self._entries[key] = embedding
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+            results = [r if r is not None else computed[key] for key, r in zip(keys, results)]
+        return results
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def __getattr__(self, name):
+        if name == "embeddings":  # 尚未初始化（如复制/反序列化时）
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
+
+    def stats(self) -> dict:
+        """获取缓存统计信息"""
+        with self._lock:
+            return {"size": len(self._entries), "max_size": self.maxsize, "hits": self.hits, "misses": self.misses}
 
 
 class VectorStore:
     """向量数据库管理器"""
     
-    def __init__(self, persist_directory: str = None):
+    def __init__(self, persist_directory: str = None, embeddings: Any = None):
         """初始化向量数据库
         
         Args:
             persist_directory: 数据库持久化目录
+            embeddings: Embedding 模型实例，默认使用进程内共享的模型
         """
         self.persist_directory = persist_directory or Config.VECTOR_DB_PATH
         
-        # 初始化 Embedding 模型：根据配置选择实现
-        use_local_embeddings = False
-
-        if Config.MODEL_PROVIDER == "openai":
-            if not Config.OPENAI_API_KEY:
-                # 虽然 provider 是 openai，但没有提供 key，则回退到本地嵌入
-                use_local_embeddings = True
-            elif OpenAIEmbeddings is None:
-                raise ImportError("OpenAIEmbeddings 未安装，请运行 `pip install langchain-openai` 或切换到其他 MODEL_PROVIDER")
-            else:
-                self.embeddings = OpenAIEmbeddings(
-                    model=Config.EMBEDDING_MODEL,
-                    openai_api_key=Config.OPENAI_API_KEY,
-                    openai_api_base=Config.OPENAI_API_BASE,
-                )
-        else:
-            use_local_embeddings = True
-
-        if use_local_embeddings:
-            # 对于 gemini 或本地回退，优先使用 sentence-transformers
-            if SentenceTransformer is None:
-                raise ImportError("未安装 sentence-transformers，请运行 `pip install sentence-transformers` 或在 .env 中配置有效的 OPENAI_API_KEY/GEMINI_API_KEY")
-
-            class LocalEmbeddings:
-                """本地 Embeddings 适配器，提供 embed_documents 与 embed_query 方法"""
-                def __init__(self, model_name: str = "BAAI/bge-small-zh-v1.5"):
-                    # 使用支持中文的嵌入模型，提升中文语义检索效果
-                    self.model = SentenceTransformer(model_name)
-
-                def embed_documents(self, texts):
-                    embs = self.model.encode(list(texts), show_progress_bar=False, convert_to_numpy=True)
-                    return [list(map(float, e)) for e in embs]
-
-                def embed_query(self, text):
-                    emb = self.model.encode([text], show_progress_bar=False, convert_to_numpy=True)[0]
-                    return list(map(float, emb))
-
-            self.embeddings = LocalEmbeddings()
+        # 初始化 Embedding 模型：根据配置选择实现，问题向量经 LRU 缓存（省去重复的向量化）
+        embeddings = embeddings or get_default_embeddings()
+        if not isinstance(embeddings, _EmbedCache):
+            embeddings = _EmbedCache(embeddings, maxsize=Config.QUERY_EMBED_CACHE_SIZE)
+        self.embeddings = embeddings
         
         self.vectorstore: Optional[Chroma] = None
+        self._load_attempted = False
+        self._load_lock = Lock()
+        # 流水线检索时在后台预先计算下一个问题的向量（线程在首次提交任务时才创建）
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed-prefetch")
+        
+        # 检索结果缓存：问题向量 -> 检索结果（近似重复的问题直接复用）
+        self._search_cache: Optional[SemanticCache] = None
+        self._search_cache_generation = _store_generation
+        if Config.SEARCH_CACHE_SIZE > 0:
+            self._search_cache = SemanticCache(
+                threshold=Config.SEARCH_CACHE_THRESHOLD,
+                max_entries=Config.SEARCH_CACHE_SIZE,
+            )
     
-    def create_vectorstore(self, documents: List[Any]) -> Chroma:
+    def create_vectorstore(self, documents: List[Any], batch_size: int = None) -> Chroma:
         """创建向量数据库
         
+        按批向量化并写入，峰值内存只与批大小相关，而不是一次性向量化全部文档。
+        
         Args:
             documents: 文档列表
+            batch_size: 每批向量化并写入的文档数，默认使用 Config.EMBED_BATCH_SIZE
             
         Returns:
             向量数据库实例
         """
-        print(f"\n开始创建向量数据库...")
-        print(f"文档数量: {len(documents)}")
+        logger.info("开始创建向量数据库，文档数量: %d", len(documents))
         
-        self.vectorstore = Chroma.from_documents(
-            documents=documents,
-            embedding=self.embeddings,
+        self._invalidate_search_caches()
+        self.vectorstore = Chroma(
             persist_directory=self.persist_directory,
+            embedding_function=self.embeddings,
+            collection_metadata=self.hnsw_metadata(),
         )
         
-        print(f"✓ 向量数据库创建成功，保存在: {self.persist_directory}")
+        batch_size = max(1, batch_size or Config.EMBED_BATCH_SIZE)
+        for start in range(0, len(documents), batch_size):
+            batch = documents[start:start + batch_size]
+            self.vectorstore.add_documents(batch)
+            logger.debug("已写入 %d/%d 个文档块", start + len(batch), len(documents))
+        
+        logger.info("向量数据库创建成功，保存在: %s", self.persist_directory)
         return self.vectorstore
     
+    @staticmethod
+    def hnsw_metadata() -> dict:
+        """新建集合时使用的 HNSW 索引参数（集合创建后不可更改）
+
+        距离度量保持 l2，与现有的距离/相似度阈值换算一致。
+        """
+        return {
+            "hnsw:space": "l2",
+            "hnsw:M": Config.HNSW_M,
+            "hnsw:construction_ef": Config.HNSW_CONSTRUCTION_EF,
+            "hnsw:search_ef": Config.HNSW_SEARCH_EF,
+        }
+    
     def load_vectorstore(self) -> Optional[Chroma]:
         """加载已存在的向量数据库
         
@@ -101,18 +470,37 @@ class VectorStore:
             向量数据库实例，如果不存在则返回 None
         """
         if not os.path.exists(self.persist_directory):
-            print(f"向量数据库不存在: {self.persist_directory}")
+            logger.info("向量数据库不存在: %s", self.persist_directory)
             return None
         
-        print(f"加载向量数据库: {self.persist_directory}")
+        logger.info("加载向量数据库: %s", self.persist_directory)
+        self.clear_search_cache()
         self.vectorstore = Chroma(
             persist_directory=self.persist_directory,
             embedding_function=self.embeddings,
         )
         
-        print("✓ 向量数据库加载成功")
+        logger.info("向量数据库加载成功")
         return self.vectorstore
     
+    def _ensure_loaded(self) -> bool:
+        """检索前确保向量库已加载：只自动尝试加载一次，之后不再重复检查磁盘
+        
+        首次加载失败（数据库尚未构建）后，需显式调用 load_vectorstore 或 create_vectorstore。
+        
+        Returns:
+            向量库是否可用
+        """
+        if self.vectorstore is None and not self._load_attempted:
+            # 并发的首批请求只由一个线程加载，其余线程等待后直接读取结果
+            with self._load_lock:
+                if self.vectorstore is None and not self._load_attempted:
+                    try:
+                        self.load_vectorstore()
+                    finally:
+                        self._load_attempted = True
+        return self.vectorstore is not None
+    
     def add_documents(self, documents: List[Any]):
         """向现有数据库添加文档
         
@@ -125,9 +513,32 @@ class VectorStore:
         if self.vectorstore is None:
             self.create_vectorstore(documents)
         else:
-            print(f"添加 {len(documents)} 个文档到向量数据库...")
+            logger.debug("添加 %d 个文档到向量数据库", len(documents))
             self.vectorstore.add_documents(documents)
-            print("✓ 文档添加成功")
+            self._invalidate_search_caches()
+            logger.debug("文档添加成功")
+    
+    def embed_query(self, query: str) -> List[float]:
+        """计算问题向量，相同问题文本只向量化一次（LRU）"""
+        return self.embeddings.embed_query(query)
+    
+    def clear_search_cache(self):
+        """清空本实例的检索结果缓存"""
+        if self._search_cache is not None:
+            self._search_cache.clear()
+    
+    def _invalidate_search_caches(self):
+        """知识库内容变化后调用：本实例及进程内其它实例的检索结果缓存全部失效"""
+        _bump_store_generation()
+        self.clear_search_cache()
+    
+    def _sync_search_cache(self) -> int:
+        """其它实例修改过知识库时先清空本实例的检索结果缓存，返回当前代数"""
+        generation = _store_generation
+        if self._search_cache is not None and self._search_cache_generation != generation:
+            self._search_cache.clear()
+            self._search_cache_generation = generation
+        return generation
     
     def similarity_search(self, query: str, k: int = None) -> List[Any]:
         """相似度搜索
@@ -139,15 +550,7 @@ class VectorStore:
         Returns:
             相关文档列表
         """
-        if self.vectorstore is None:
-            self.load_vectorstore()
-        
-        if self.vectorstore is None:
-            raise ValueError("向量数据库未初始化")
-        
-        k = k or Config.TOP_K
-        results = self.vectorstore.similarity_search(query, k=k)
-        return results
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k)]
     
     def similarity_search_with_score(self, query: str, k: int = None) -> List[tuple]:
         """带分数的相似度搜索
@@ -159,15 +562,131 @@ class VectorStore:
         Returns:
             (文档, 分数) 元组列表
         """
-        if self.vectorstore is None:
-            self.load_vectorstore()
+        # 未加载时先报错，不做无用的向量化
+        if not self._ensure_loaded():
+            raise ValueError("向量数据库未初始化")
+        return self.similarity_search_by_vector_with_score(self.embed_query(query), k=k)
+    
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = None) -> List[tuple]:
+        """按已计算好的问题向量检索（所有按文本检索的方法最终都走这里）
         
-        if self.vectorstore is None:
+        Args:
+            embedding: 问题向量
+            k: 返回结果数量
+            
+        Returns:
+            (文档, 分数) 元组列表
+        """
+        if not self._ensure_loaded():
+            raise ValueError("向量数据库未初始化")
+        
+        k = k or Config.TOP_K
+        
+        # 与已缓存问题足够相似且当时取回的结果数不少于 k 时，直接复用
+        generation = self._sync_search_cache()
+        if self._search_cache is not None:
+            hit = self._search_cache.lookup(embedding)
+            if hit is not None and hit[0] >= k:
+                return hit[1][:k]
+        
+        results = self._search_by_vector(embedding, k)
+        # 检索期间知识库被修改时，结果可能已过期，不写入缓存
+        if self._search_cache is not None and generation == _store_generation:
+            self._search_cache.add(embedding, (k, results))
+        return list(results)
+
+    def _search_by_vector(self, embedding: List[float], k: int) -> List[tuple]:
+        """按问题向量检索，返回 (文档, 距离) 列表"""
+        return self.vectorstore.similarity_search_by_vector_with_relevance_scores(embedding, k=k)
+
+    def _search_many_by_vectors(self, embeddings: List[List[float]], k: int) -> List[List[tuple]]:
+        """多个问题向量一次查询 Chroma，返回每个问题的 (文档, 距离) 列表"""
+        results = self.vectorstore._collection.query(
+            query_embeddings=embeddings,
+            n_results=k,
+            include=["documents", "metadatas", "distances"],
+        )
+        return [
+            _results_to_docs_and_scores({
+                "documents": [results["documents"][i]],
+                "metadatas": [results["metadatas"][i]],
+                "distances": [results["distances"][i]],
+            })
+            for i in range(len(embeddings))
+        ]
+
+    def similarity_search_many_with_score(self, queries: List[str], k: int = None) -> List[List[tuple]]:
+        """批量相似度搜索：问题一次批量向量化，未命中检索缓存的问题一次查询向量库
+        
+        Args:
+            queries: 查询文本列表
+            k: 每个问题返回的结果数量
+            
+        Returns:
+            与 queries 对齐的 (文档, 分数) 元组列表的列表
+        """
+        if not queries:
+            return []
+        if not self._ensure_loaded():
             raise ValueError("向量数据库未初始化")
         
         k = k or Config.TOP_K
-        results = self.vectorstore.similarity_search_with_score(query, k=k)
+        embeddings = self.embeddings.embed_queries(list(queries))
+        
+        results: List[Optional[List[tuple]]] = [None] * len(embeddings)
+        generation = self._sync_search_cache()
+        if self._search_cache is not None:
+            for i, embedding in enumerate(embeddings):
+                hit = self._search_cache.lookup(embedding)
+                if hit is not None and hit[0] >= k:
+                    results[i] = hit[1][:k]
+        
+        missing = [i for i, r in enumerate(results) if r is None]
+        if missing:
+            probed = self._search_many_by_vectors([embeddings[i] for i in missing], k)
+            for i, found in zip(missing, probed):
+                results[i] = list(found)
+                if self._search_cache is not None and generation == _store_generation:
+                    self._search_cache.add(embeddings[i], (k, found))
         return results
+    
+    def similarity_search_many(self, queries: List[str], k: int = None) -> List[List[Any]]:
+        """批量相似度搜索，只返回文档
+        
+        Args:
+            queries: 查询文本列表
+            k: 每个问题返回的结果数量
+            
+        Returns:
+            与 queries 对齐的文档列表的列表
+        """
+        return [[doc for doc, _ in found] for found in self.similarity_search_many_with_score(queries, k=k)]
+
+    def similarity_search_pipelined(self, queries: Iterable[str], k: int = None) -> Iterator[List[tuple]]:
+        """流水线检索：检索当前问题（以及调用方处理结果）的同时，后台线程计算下一个问题的向量
+        
+        适合问题事先已知、但需要逐个处理结果的场景；结果与逐个调用
+        similarity_search_with_score 相同。最多预取一个问题，内存占用不随问题数增长。
+        
+        Args:
+            queries: 查询文本序列
+            k: 每个问题返回的结果数量
+            
+        Yields:
+            按 queries 顺序，每个问题的 (文档, 分数) 元组列表
+        """
+        queries = list(queries)
+        if not queries:
+            return
+        if not self._ensure_loaded():
+            raise ValueError("向量数据库未初始化")
+        
+        pending = self._executor.submit(self.embed_query, queries[0])
+        for i in range(len(queries)):
+            embedding = pending.result()
+            if i + 1 < len(queries):
+                pending = self._executor.submit(self.embed_query, queries[i + 1])
+            yield self.similarity_search_by_vector_with_score(embedding, k=k)
 
     def similarity_search_with_score_threshold(self, query: str, k: int = None, max_distance: float = None) -> List[tuple]:
         """带阈值的相似度搜索（基于 Chroma 返回的距离，值越小越相似）
@@ -180,22 +699,17 @@ class VectorStore:
         Returns:
             (文档, 距离) 元组列表，已按距离升序并过滤超过阈值的项
         """
-        if self.vectorstore is None:
-            self.load_vectorstore()
+        results = self.similarity_search_with_score(query, k=k)
 
-        if self.vectorstore is None:
-            raise ValueError("向量数据库未初始化")
-
-        k = k or Config.TOP_K
-        results = self.vectorstore.similarity_search_with_score(query, k=k)
-
-        if max_distance is None:
+        if max_distance is None or not results:
             return results
 
-        # Chroma 返回的 score 是距离，越小表示越相似；过滤并保持升序
-        filtered = [(doc, score) for doc, score in results if score <= max_distance]
+        # Chroma 返回的 score 是距离，越小表示越相似；一次向量化比较完成过滤，并按距离稳定排序保证升序
+        distances = np.fromiter((score for _, score in results), dtype=np.float64, count=len(results))
+        keep = np.flatnonzero(distances <= max_distance)
+        keep = keep[np.argsort(distances[keep], kind="stable")]
         # 如果过滤后数量少于 k，仍返回过滤后的所有结果
-        return filtered
+        return [results[i] for i in keep]
     
     def similarity_search_with_score_filter(self, query: str, k: int = None, similarity_threshold: float = None) -> List[tuple]:
         """带相似度阈值的搜索（过滤低相似度结果）
@@ -216,12 +730,6 @@ class VectorStore:
         Returns:
             (文档, 相似度) 元组列表，按相似度从高到低排序，已过滤低相似度项
         """
-        if self.vectorstore is None:
-            self.load_vectorstore()
-
-        if self.vectorstore is None:
-            raise ValueError("向量数据库未初始化")
-
         k = k or Config.TOP_K
         
         # 先获取更多候选，确保过滤后仍有足够结果
@@ -229,27 +737,36 @@ class VectorStore:
         candidate_k = max(k * 3, 20)
         
         # 直接使用 similarity_search_with_score（返回距离值）
-        results = self.vectorstore.similarity_search_with_score(query, k=candidate_k)
+        results = self.similarity_search_with_score(query, k=candidate_k)
+        
+        if not results:
+            return []
         
-        # 将距离转换为相似度（similarity = 1 / (1 + distance)）
+        # 将距离转换为相似度（similarity = 1 / (1 + distance)），一次向量化完成换算、过滤与排序
         # 这样距离 0 变成相似度 1.0，距离越大相似度越低
-        results = [(doc, 1.0 / (1.0 + score)) for doc, score in results]
+        distances = np.fromiter((score for _, score in results), dtype=np.float64, count=len(results))
         
-        if similarity_threshold is None:
-            return results[:k]
-
         # 过滤：只保留相似度 >= threshold 的结果
-        filtered = [(doc, score) for doc, score in results if score >= similarity_threshold]
-        
-        # 如果过滤结果不足 k 个，仍返回所有过滤结果（不足为奇）
-        # 这样调用方可以判断是否有足够的相关文档
-        return filtered[:k]
+        # 如果过滤结果不足 k 个，仍返回所有过滤结果，这样调用方可以判断是否有足够的相关文档
+        threshold = similarity_threshold if similarity_threshold is not None else -np.inf
+        top, sims = _filter_topk(distances, float(threshold), k)
+        return [(results[i][0], float(sim)) for i, sim in zip(top, sims)]
+    
+    def count(self) -> int:
+        """知识库中的文档块数量"""
+        if not self._ensure_loaded():
+            return 0
+        return self.vectorstore._collection.count()
+    
+    def persist(self):
+        """将内存中的变更写入磁盘（Chroma 写入时已持久化，无需操作）"""
     
     def delete_collection(self):
         """删除向量数据库集合"""
         if self.vectorstore is not None:
             self.vectorstore.delete_collection()
-            print("✓ 向量数据库已删除")
+            self._invalidate_search_caches()
+            logger.info("向量数据库已删除")
     
     def get_document_list(self) -> List[str]:
         """获取知识库中所有文档的列表
@@ -257,12 +774,13 @@ class VectorStore:
         Returns:
             文档来源路径列表（去重）
         """
-        if self.vectorstore is None:
-            self.load_vectorstore()
-        
-        if self.vectorstore is None:
+        if not self._ensure_loaded():
             return []
         
+        sources = self._distinct_sources_sql()
+        if sources is not None:
+            return sources
+        
         try:
             collection = self.vectorstore._collection
             all_docs = collection.get(include=['metadatas'])
@@ -274,6 +792,25 @@ class VectorStore:
         except Exception:
             return []
     
+    def _distinct_sources_sql(self) -> Optional[List[str]]:
+        """直接在 Chroma 的 SQLite 上做 DISTINCT 查询，避免把全部元数据加载到内存
+        
+        依赖 Chroma 内部表结构，表结构变化或查询失败时返回 None，由调用方回退到 collection.get
+        """
+        db_path = os.path.join(self.persist_directory, _CHROMA_SQLITE_FILE)
+        if not os.path.exists(db_path):
+            return None
+        try:
+            collection_id = str(self.vectorstore._collection.id)
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+            try:
+                rows = conn.execute(_DISTINCT_SOURCES_SQL, (collection_id,)).fetchall()
+            finally:
+                conn.close()
+        except Exception:
+            return None
+        return sorted(row[0] for row in rows)
+    
     def get_retriever(self, k: int = None):
         """获取检索器
         
@@ -283,11 +820,16 @@ class VectorStore:
         Returns:
             检索器实例
         """
-        if self.vectorstore is None:
-            self.load_vectorstore()
-        
-        if self.vectorstore is None:
+        if not self._ensure_loaded():
             raise ValueError("向量数据库未初始化")
         
         k = k or Config.TOP_K
         return self.vectorstore.as_retriever(search_kwargs={"k": k})
+
+
+def create_vector_store(persist_directory: str = None, embeddings: Any = None) -> VectorStore:
+    """按 Config.VECTOR_BACKEND 创建向量库：chroma（默认）或 faiss"""
+    if Config.VECTOR_BACKEND == "faiss":
+        from src.core.faiss_vector_store import FaissVectorStore
+        return FaissVectorStore(persist_directory=persist_directory, embeddings=embeddings)
+    return VectorStore(persist_directory=persist_directory, embeddings=embeddings)
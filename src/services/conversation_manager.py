@@ -1,14 +1,43 @@
 """对话历史管理器 - 管理多轮对话上下文"""
 
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional, Iterable, Tuple
 from datetime import datetime
 import uuid
-import json
+import time
 from pathlib import Path
 from threading import Lock
 
+from pydantic import TypeAdapter
+
 from src.models.schemas import ConversationMessage
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# 整个会话文件一次性交给 pydantic 的 Rust 解析器校验，避免逐条构造
+_MESSAGE_LIST = TypeAdapter(List[ConversationMessage])
+
+# (整秒, 该秒的本地时间 ISO 字符串)，同一秒内的消息只需拼接微秒部分
+_iso_second_cache: Tuple[int, str] = (-1, "")
+
+
+def _now_iso() -> str:
+    """当前本地时间的 ISO 8601 字符串，格式同 datetime.now().isoformat()
+    
+    时区换算与日期格式化每秒只做一次，其余调用只拼接微秒，
+    存储与接口中的时间戳格式保持不变。
+    """
+    global _iso_second_cache
+    second, micros = divmod(time.time_ns() // 1000, 1_000_000)
+    cached_second, prefix = _iso_second_cache
+    if cached_second != second:
+        prefix = datetime.fromtimestamp(second).isoformat()
+        _iso_second_cache = (second, prefix)
+    return f"{prefix}.{micros:06d}"
+
 
 class ConversationManager:
     """对话管理器，负责维护和管理对话历史
@@ -28,8 +57,22 @@ class ConversationManager:
         # 内存中的活跃会话缓存
         self.active_sessions: Dict[str, List[ConversationMessage]] = {}
         
-        # 线程安全锁
+        # 线程安全锁；_io_lock 保证同一时刻只有一个线程写会话文件
         self._lock = Lock()
+        self._io_lock = Lock()
+        
+        # 会话ID -> 已写入磁盘的消息条数（追加写入的起点）
+        self._persisted: Dict[str, int] = {}
+        
+        # 每个会话的修改版本号，以及 (会话ID, 轮数) -> (版本号, 格式化文本) 的缓存
+        self._versions: Dict[str, int] = {}
+        self._formatted_cache: Dict[Tuple[str, int], Tuple[int, str]] = {}
+        # 会话ID -> (文件修改时间, 版本号, 摘要)
+        self._summary_cache: Dict[str, Tuple[Optional[int], int, Dict[str, Any]]] = {}
+    
+    def _bump_version(self, conversation_id: str):
+        """会话内容变化时递增版本号，使格式化缓存失效（调用方需持有锁）"""
+        self._versions[conversation_id] = self._versions.get(conversation_id, 0) + 1
         
     def create_conversation(self) -> str:
         """创建新的对话会话
@@ -63,19 +106,80 @@ class ConversationManager:
         message = ConversationMessage(
             role=role,
             content=content,
-            timestamp=datetime.now().isoformat()
+            timestamp=_now_iso()
         )
         
         with self._lock:
             if conversation_id not in self.active_sessions:
                 self.active_sessions[conversation_id] = []
             self.active_sessions[conversation_id].append(message)
+            self._bump_version(conversation_id)
         
         if save_to_disk:
             self.save_conversation(conversation_id)
         
         return message
     
+    def add_messages_batch(
+        self,
+        messages: Iterable[Tuple[str, str, str]],
+        save_to_disk: bool = False
+    ) -> List[ConversationMessage]:
+        """批量添加消息，每个会话最多写一次磁盘
+        
+        Args:
+            messages: (会话ID, 消息角色, 消息内容) 列表
+            save_to_disk: 是否立即保存到磁盘
+            
+        Returns:
+            添加的消息对象列表
+        """
+        added = []
+        touched = []
+        timestamp = _now_iso()
+        
+        with self._lock:
+            for conversation_id, role, content in messages:
+                message = ConversationMessage(role=role, content=content, timestamp=timestamp)
+                self.active_sessions.setdefault(conversation_id, []).append(message)
+                added.append(message)
+                if conversation_id not in touched:
+                    touched.append(conversation_id)
+            for conversation_id in touched:
+                self._bump_version(conversation_id)
+        
+        if save_to_disk:
+            for conversation_id in touched:
+                self.save_conversation(conversation_id)
+        
+        return added
+    
+    def add_turn(
+        self,
+        conversation_id: str,
+        user_message: str,
+        assistant_message: str,
+        save_to_disk: bool = False
+    ) -> List[ConversationMessage]:
+        """添加一轮问答（用户消息 + 助手回复），一次加锁、至多一次写盘
+        
+        Args:
+            conversation_id: 会话ID
+            user_message: 用户消息内容
+            assistant_message: 助手回复内容
+            save_to_disk: 是否立即保存到磁盘
+            
+        Returns:
+            添加的两条消息对象
+        """
+        return self.add_messages_batch(
+            [
+                (conversation_id, "user", user_message),
+                (conversation_id, "assistant", assistant_message),
+            ],
+            save_to_disk=save_to_disk,
+        )
+    
     def get_history(
         self, 
         conversation_id: str, 
@@ -115,22 +219,75 @@ class ConversationManager:
         Returns:
             格式化的历史文本
         """
-        history = self.get_history(conversation_id)
+        cache_key = (conversation_id, max_turns)
+        # 会话已在内存中时先查缓存，命中则无需再取历史
+        if conversation_id in self.active_sessions:
+            cached = self._formatted_cache.get(cache_key)
+            if cached is not None and cached[0] == self._versions.get(conversation_id, 0):
+                return cached[1]
         
-        # 只取最近的几轮对话
-        if len(history) > max_turns * 2:
-            history = history[-(max_turns * 2):]
+        # 只取最近的几轮对话（可能触发从磁盘加载，版本号在加载后读取）
+        history = self.get_history(conversation_id, max_messages=max_turns * 2)
+        version = self._versions.get(conversation_id, 0)
+        cached = self._formatted_cache.get(cache_key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
         
         if not history:
-            return "（无历史对话）"
+            formatted = "（无历史对话）"
+        else:
+            lines = []
+            for i, msg in enumerate(history, 1):
+                role_name = "👤 用户" if msg.role == "user" else "🤖 助手"
+                # 添加序号，让上下文更清晰
+                lines.append(f"{i}. {role_name}: {msg.content}")
+            formatted = "\n".join(lines).strip()
+        
+        self._formatted_cache[cache_key] = (version, formatted)
+        return formatted
+    
+    def get_summary(self, conversation_id: str) -> Dict[str, Any]:
+        """获取会话摘要（标题、消息数、最后消息时间）
+        
+        摘要按会话文件修改时间和内存版本号缓存：两者都未变化时直接返回，
+        文件被更新（可能由其他实例写入）时才重新从磁盘加载。
+        
+        Args:
+            conversation_id: 会话ID
+            
+        Returns:
+            包含 title、message_count、last_time 的字典
+        """
+        mtime = None
+        for file_path in (self._file_path(conversation_id), self._legacy_file_path(conversation_id)):
+            try:
+                mtime = file_path.stat().st_mtime_ns
+                break
+            except FileNotFoundError:
+                continue
+        
+        cached = self._summary_cache.get(conversation_id)
+        if cached is not None and cached[0] == mtime and cached[1] == self._versions.get(conversation_id, 0):
+            return dict(cached[2])
         
-        formatted = ""
-        for i, msg in enumerate(history, 1):
-            role_name = "👤 用户" if msg.role == "user" else "🤖 助手"
-            # 添加序号和时间戳，让上下文更清晰
-            formatted += f"{i}. {role_name}: {msg.content}\n"
+        if mtime is not None and (cached is None or cached[0] != mtime):
+            self.load_conversation(conversation_id)
+        history = self.get_history(conversation_id)
         
-        return formatted.strip()
+        # 取最近两条消息中的用户消息作为标题
+        title = "新对话"
+        for msg in history[-2:]:
+            if msg.role == "user":
+                title = msg.content[:50] + ("..." if len(msg.content) > 50 else "")
+                break
+        
+        summary = {
+            "title": title,
+            "message_count": len(history),
+            "last_time": history[-1].timestamp if history else None,
+        }
+        self._summary_cache[conversation_id] = (mtime, self._versions.get(conversation_id, 0), summary)
+        return dict(summary)
     
     def clear_conversation(self, conversation_id: str):
         """清空指定会话的历史
@@ -138,26 +295,81 @@ class ConversationManager:
         Args:
             conversation_id: 会话ID
         """
-        if conversation_id in self.active_sessions:
-            self.active_sessions[conversation_id] = []
+        with self._lock:
+            if conversation_id in self.active_sessions:
+                self.active_sessions[conversation_id] = []
+                self._bump_version(conversation_id)
+                self._persisted.pop(conversation_id, None)  # 下次保存时整体重写
+    
+    def _file_path(self, conversation_id: str) -> Path:
+        """会话文件路径（JSONL，每行一条消息）"""
+        return self.storage_path / f"{conversation_id}.jsonl"
+    
+    def _legacy_file_path(self, conversation_id: str) -> Path:
+        """旧版整文件 JSON 格式的会话文件路径（只读兼容）"""
+        return self.storage_path / f"{conversation_id}.json"
+    
+    @staticmethod
+    def _dump_line(message: ConversationMessage) -> bytes:
+        """将一条消息序列化为一行 JSON（优先 orjson，否则用 pydantic 的 Rust 序列化器，不经过标准库 json）"""
+        if orjson is not None:
+            return orjson.dumps(message.model_dump(), option=orjson.OPT_APPEND_NEWLINE)
+        return message.model_dump_json().encode("utf-8") + b"\n"
+    
+    @staticmethod
+    def _load_line(line: bytes) -> ConversationMessage:
+        """解析一行 JSON 为消息对象"""
+        if orjson is not None:
+            return ConversationMessage(**orjson.loads(line))
+        return ConversationMessage.model_validate_json(line)
     
     def save_conversation(self, conversation_id: str):
         """保存对话到磁盘
         
+        追加写入：只把上次保存之后新增的消息追加到文件末尾；
+        首次保存、会话被清空或从旧格式迁移时才整体重写。
+        
         Args:
             conversation_id: 会话ID
         """
-        if conversation_id not in self.active_sessions:
-            return
-        
-        file_path = self.storage_path / f"{conversation_id}.json"
-        
-        history_data = [
-            msg.model_dump() for msg in self.active_sessions[conversation_id]
-        ]
+        with self._io_lock:
+            with self._lock:
+                if conversation_id not in self.active_sessions:
+                    return
+                messages = list(self.active_sessions[conversation_id])
+            
+            file_path = self._file_path(conversation_id)
+            persisted = self._persisted.get(conversation_id)
+            if persisted is not None and persisted <= len(messages) and file_path.exists():
+                pending = messages[persisted:]
+                if pending:
+                    with open(file_path, 'ab') as f:
+                        f.write(b"".join(self._dump_line(msg) for msg in pending))
+            else:
+                file_path.write_bytes(b"".join(self._dump_line(msg) for msg in messages))
+                legacy_path = self._legacy_file_path(conversation_id)
+                if legacy_path.exists():
+                    legacy_path.unlink()
+            self._persisted[conversation_id] = len(messages)
+    
+    def _read_messages(self, conversation_id: str) -> Optional[List[ConversationMessage]]:
+        """读取会话文件，优先 JSONL，兼容旧版 JSON；文件不存在返回 None"""
+        file_path = self._file_path(conversation_id)
+        if file_path.exists():
+            data = file_path.read_bytes().strip()
+            if not data:
+                return []
+            # 每行都是不含裸换行的 JSON 对象，换行替换为逗号即可拼成 JSON 数组整体解析；
+            # 文件含空行或被截断的行时退回逐行解析
+            try:
+                return _MESSAGE_LIST.validate_json(b"[" + data.replace(b"\n", b",") + b"]")
+            except ValueError:
+                return [self._load_line(line) for line in data.splitlines() if line.strip()]
         
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(history_data, f, ensure_ascii=False, indent=2)
+        legacy_path = self._legacy_file_path(conversation_id)
+        if legacy_path.exists():
+            return _MESSAGE_LIST.validate_json(legacy_path.read_bytes())
+        return None
     
     def load_conversation(self, conversation_id: str) -> bool:
         """从磁盘加载对话
@@ -168,18 +380,19 @@ class ConversationManager:
         Returns:
             是否成功加载
         """
-        file_path = self.storage_path / f"{conversation_id}.json"
-        
-        if not file_path.exists():
-            return False
-        
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                history_data = json.load(f)
+            messages = self._read_messages(conversation_id)
+            if messages is None:
+                return False
             
-            self.active_sessions[conversation_id] = [
-                ConversationMessage(**msg) for msg in history_data
-            ]
+            with self._lock:
+                self.active_sessions[conversation_id] = messages
+                self._bump_version(conversation_id)
+                if self._file_path(conversation_id).exists():
+                    self._persisted[conversation_id] = len(messages)
+                else:
+                    # 旧格式文件：下次保存时整体重写为 JSONL
+                    self._persisted.pop(conversation_id, None)
             return True
         except Exception as e:
             print(f"加载对话失败: {e}")
@@ -191,7 +404,9 @@ class ConversationManager:
         Returns:
             会话ID列表
         """
-        return [f.stem for f in self.storage_path.glob("*.json")]
+        ids = {f.stem for f in self.storage_path.glob("*.jsonl")}
+        ids.update(f.stem for f in self.storage_path.glob("*.json"))
+        return list(ids)
     
     def delete_conversation(self, conversation_id: str):
         """删除对话
@@ -200,10 +415,15 @@ class ConversationManager:
             conversation_id: 会话ID
         """
         # 从内存中删除
-        if conversation_id in self.active_sessions:
-            del self.active_sessions[conversation_id]
+        with self._lock:
+            self.active_sessions.pop(conversation_id, None)
+            self._bump_version(conversation_id)
+            for key in [k for k in self._formatted_cache if k[0] == conversation_id]:
+                del self._formatted_cache[key]
+            self._summary_cache.pop(conversation_id, None)
+            self._persisted.pop(conversation_id, None)
         
         # 从磁盘删除
-        file_path = self.storage_path / f"{conversation_id}.json"
-        if file_path.exists():
-            file_path.unlink()
+        for file_path in (self._file_path(conversation_id), self._legacy_file_path(conversation_id)):
+            if file_path.exists():
+                file_path.unlink()
@@ -4,15 +4,38 @@
 如果你使用 `langchain_deepseek`，优先建议使用 LangChain 的集成；
 此文件用于直接通过 HTTP/REST 调用 DeepSeek 服务的场景。
 """
+import asyncio
 import json
+import threading
 from typing import Optional, Iterator
 import requests
+from requests.adapters import HTTPAdapter
 
 
 class DeepSeekError(Exception):
     pass
 
 
+# 复用连接池：同一服务的请求共享 keep-alive 连接，避免每次重新建立 TCP/TLS 连接
+_POOL_SIZE = 32
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    """获取共享的 HTTP 会话（首次调用时创建）"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=_POOL_SIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
 def generate(
     model: str,
     prompt: str,
@@ -63,7 +86,7 @@ def generate(
     timeout = (10, 120) if stream else 120
 
     try:
-        resp = requests.post(endpoint, headers=headers, json=payload, timeout=timeout, stream=stream)
+        resp = _get_session().post(endpoint, headers=headers, json=payload, timeout=timeout, stream=stream)
     except requests.RequestException as e:
         raise DeepSeekError(f"请求 DeepSeek API 失败: {e}")
 
@@ -77,6 +100,15 @@ def generate(
         return _parse_response(resp)
 
 
+async def agenerate(*args, **kwargs) -> str:
+    """`generate` 的异步版本（非流式）：在线程中执行请求，不阻塞事件循环
+
+    参数与 `generate` 相同，`stream` 固定为 False。
+    """
+    kwargs["stream"] = False
+    return await asyncio.to_thread(generate, *args, **kwargs)
+
+
 def _stream_response(resp) -> Iterator[str]:
     try:
         for line in resp.iter_lines(decode_unicode=True):
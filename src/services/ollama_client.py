@@ -1,7 +1,10 @@
 """Ollama 本地模型客户端"""
+import asyncio
+import threading
 import requests
 import json
 from typing import Optional, Iterator
+from requests.adapters import HTTPAdapter
 
 
 class OllamaError(Exception):
@@ -9,6 +12,26 @@ class OllamaError(Exception):
     pass
 
 
+# 复用连接池：同一服务的请求共享 keep-alive 连接，避免每次重新建立 TCP/TLS 连接
+_POOL_SIZE = 32
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    """获取共享的 HTTP 会话（首次调用时创建）"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=_POOL_SIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
 def generate(
     model: str,
     prompt: str,
@@ -48,7 +71,7 @@ def generate(
     timeout = (10, 120) if stream else 120
 
     try:
-        resp = requests.post(endpoint, json=payload, timeout=timeout, stream=stream)
+        resp = _get_session().post(endpoint, json=payload, timeout=timeout, stream=stream)
     except requests.RequestException as e:
         raise OllamaError(f"请求 Ollama API 失败: {e}")
 
@@ -61,6 +84,15 @@ def generate(
         return _generate_non_stream(resp)
 
 
+async def agenerate(*args, **kwargs) -> str:
+    """`generate` 的异步版本（非流式）：在线程中执行请求，不阻塞事件循环
+
+    参数与 `generate` 相同，`stream` 固定为 False。
+    """
+    kwargs["stream"] = False
+    return await asyncio.to_thread(generate, *args, **kwargs)
+
+
 def _generate_stream(resp):
     """处理流式响应"""
     try:
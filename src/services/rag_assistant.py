@@ -1,5 +1,7 @@
 """RAG 检索增强生成模块"""
 import logging
+import re
+from functools import lru_cache
 from typing import List, Optional, Any
 
 from langchain_classic.chains.retrieval_qa.base import RetrievalQA
@@ -7,7 +9,7 @@ from langchain.chat_models import init_chat_model
 from langchain_core.prompts import PromptTemplate
 
 from src.config.settings import Config
-from src.core.vector_store import VectorStore
+from src.core.vector_store import VectorStore, create_vector_store
 from src.core.bm25_retriever import BM25Retriever
 from src.models.schemas import ConversationMessage
 
@@ -18,10 +20,18 @@ try:
 except Exception:
     CrossEncoder = None
 
+# 预览文本中的换行/制表符替换为空格（一次 translate 完成）
+_NL_TABLE = str.maketrans('\n\r\t', '   ')
+
 
 class RAGAssistant:
     """RAG 知识库助手"""
     
+    # 查询改写用的关键词，预编译为正则交替式，一次扫描即可判断是否命中任一关键词
+    _DEEP_LEARNING_PATTERN = re.compile(r"深度学习|deep learning", re.IGNORECASE)
+    _ARCHITECTURE_PATTERN = re.compile(r"架构|architecture", re.IGNORECASE)
+    _MAIN_ARCHITECTURE_PATTERN = re.compile(r"主要架构|main architecture", re.IGNORECASE)
+    
     # 默认提示词模板（支持对话历史）
     DEFAULT_PROMPT_TEMPLATE = """你是一个严格遵守规则的知识库助手。你的回答必须且只能基于下面提供的"上下文信息"。
 
@@ -64,7 +74,7 @@ class RAGAssistant:
             max_tokens: 最大生成 token 数
             fast_mode: 是否使用快速模式（使用stuff chain，默认从Config读取）
         """
-        self.vector_store = vector_store or VectorStore()
+        self.vector_store = vector_store or create_vector_store()
         # 如果没有明确指定，从Config读取
         self.fast_mode = fast_mode if fast_mode is not None else Config.RAG_FAST_MODE
         
@@ -74,7 +84,7 @@ class RAGAssistant:
         max_tok = max_tokens or Config.MAX_TOKENS
         
         # 根据提供者初始化不同的 LLM
-        if Config.MODEL_PROVIDER == "ollama":
+        if Config.get_model_provider() == "ollama":
             # 使用 Ollama 的本地 LLM
             from langchain_community.llms import Ollama
             self.llm = Ollama(
@@ -83,7 +93,7 @@ class RAGAssistant:
                 temperature=temp,
                 num_predict=max_tok,
             )
-        elif Config.MODEL_PROVIDER == "deepseek":
+        elif Config.get_model_provider() == "deepseek":
             # 使用 DeepSeek 提供者（优先使用 langchain_deepseek 集成）
             try:
                 # 通过 langchain 的统一入口创建模型，传入 provider
@@ -201,10 +211,12 @@ class RAGAssistant:
         return self.qa_chain
     
     @staticmethod
+    @lru_cache(maxsize=4096)
     def optimize_query(question: str) -> str:
         """优化查询以改进检索排名
         
-        对某些通用查询进行改写，使用更具体的关键词以获得更好的检索结果
+        对某些通用查询进行改写，使用更具体的关键词以获得更好的检索结果。
+        纯函数，结果按问题缓存，重复问题直接查表（处理的是字符串，Numba 等数值 JIT 不适用）。
         
         Args:
             question: 用户原始问题
@@ -213,20 +225,16 @@ class RAGAssistant:
             优化后的查询文本
         """
         # 深度学习相关优化
-        if ("深度学习" in question or "deep learning" in question.lower()) and ("架构" in question or "architecture" in question.lower()):
+        is_deep_learning = RAGAssistant._DEEP_LEARNING_PATTERN.search(question) is not None
+        if is_deep_learning and RAGAssistant._ARCHITECTURE_PATTERN.search(question):
             return "CNN RNN Transformer GAN"
         
         # 神经网络架构相关
-        if ("主要架构" in question or "main architecture" in question.lower()):
-            if "深度学习" in question or "深度" in question:
+        if RAGAssistant._MAIN_ARCHITECTURE_PATTERN.search(question):
+            if is_deep_learning or "深度" in question:
                 return "CNN RNN Transformer GAN"
         
-        # 神经网络模型相关
-        if any(term in question for term in ["模型", "model", "网络", "network"]):
-            if any(term in question for term in ["CNN", "RNN", "Transformer", "GAN"]):
-                # 已包含具体术语，不需要优化
-                return question
-        
+        # 神经网络模型相关的问题（已包含具体术语时）不需要优化
         return question  # 如果不需要优化，返回原始查询
     
     def query(
@@ -371,7 +379,7 @@ class RAGAssistant:
                     
                     previews.append({
                         'source': src, 
-                        'preview': (txt or '')[:300].replace('\n', ' ')
+                        'preview': (txt or '')[:300].translate(_NL_TABLE)
                     })
                 except Exception as e:
                     # 处理异常的文档对象
@@ -582,7 +590,7 @@ class RAGAssistant:
                     print(f"\n参考来源 ({len(result['sources'])} 个文档片段):")
                     for i, doc in enumerate(result["sources"], 1):
                         source = doc.metadata.get("source", "未知来源")
-                        preview = doc.page_content[:100].replace("\n", " ")
+                        preview = doc.page_content[:100].translate(_NL_TABLE)
                         print(f"  [{i}] {source}")
                         print(f"      {preview}...")
                 
@@ -0,0 +1,140 @@
+"""答案缓存 - 精确匹配 + 语义相似度两级缓存
+
+以 (作用域, 归一化问题) 为键缓存生成结果，作用域描述影响答案的其它因素
+（模型、检索参数、对话上下文等），只有作用域相同的条目才能互相命中。
+"""
+
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+
+from src.utils.semantic_cache import SemanticCache
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerCache:
+    """LRU + TTL 的答案缓存，可选语义匹配
+
+    用法:
+        cache = AnswerCache(max_size=512, ttl=300)
+        key = cache.make_key(scope, question)
+        hit = cache.get(key) or cache.get_similar(scope, embedding)
+        if hit is None:
+            cache.put(key, value, scope=scope, embedding=embedding)
+    """
+
+    def __init__(
+        self,
+        max_size: int = 512,
+        ttl: float = 300.0,
+        semantic: bool = True,
+        semantic_threshold: float = 0.95,
+    ):
+        """
+        Args:
+            max_size: 最大缓存条目数
+            ttl: 条目有效期（秒）
+            semantic: 是否启用语义匹配
+            semantic_threshold: 语义命中所需的最小余弦相似度
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = Lock()
+        self._semantic: Optional[SemanticCache] = None
+        if semantic:
+            self._semantic = SemanticCache(threshold=semantic_threshold, max_entries=max_size)
+        self.hits = 0
+        self.misses = 0
+        self.semantic_hits = 0
+
+    @staticmethod
+    def make_key(scope: str, question: str) -> str:
+        """根据作用域和归一化后的问题生成缓存键"""
+        raw = f"{scope}|{question.strip().lower()}"
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self._semantic is not None
+
+    def _get_entry(self, key: str) -> Optional[Any]:
+        """读取条目（调用方持有锁），过期条目视为未命中并移除"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get(self, key: str) -> Optional[Any]:
+        """按精确键读取缓存"""
+        with self._lock:
+            value = self._get_entry(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def get_similar(self, scope: str, embedding) -> Optional[Any]:
+        """按问题向量查找同一作用域下语义相近的缓存"""
+        if self._semantic is None or embedding is None:
+            return None
+
+        # 只在同一作用域的条目中找最相近的，其它作用域更相近的条目不会遮挡
+        hit = self._semantic.lookup(embedding, accept=lambda value: value[0] == scope)
+        if hit is None:
+            return None
+        _, key = hit
+
+        with self._lock:
+            value = self._get_entry(key)
+            if value is not None:
+                self.semantic_hits += 1
+            return value
+
+    def put(self, key: str, value: Any, scope: str = "", embedding=None):
+        """写入缓存，超出容量时淘汰最久未使用的条目
+
+        Args:
+            key: 缓存键
+            value: 缓存值（调用方不应再修改）
+            scope: 作用域，语义匹配时用于校验
+            embedding: 问题向量（可选），提供时同时写入语义索引
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        if self._semantic is not None and embedding is not None:
+            self._semantic.add(embedding, (scope, key))
+
+    def clear(self):
+        """清空缓存（如知识库重建后）"""
+        with self._lock:
+            self._entries.clear()
+        if self._semantic is not None:
+            self._semantic.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "semantic_enabled": self.semantic_enabled,
+                "semantic_hits": self.semantic_hits,
+            }
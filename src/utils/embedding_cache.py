@@ -0,0 +1,79 @@
+"""向量磁盘缓存 - 按文本内容哈希持久化文档向量
+
+重建知识库时，内容未变的文档块直接读取已保存的向量，只有新增或修改的文档块需要模型计算。
+键同时包含命名空间（模型名称、推理后端等），模型配置变化后旧向量自然失效。
+"""
+
+import hashlib
+import sqlite3
+from pathlib import Path
+from threading import Lock
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+# SQLite 单条语句的参数数量上限较低，分批查询
+_QUERY_BATCH = 500
+
+
+class EmbeddingDiskCache:
+    """基于 SQLite 的文档向量缓存（线程安全）
+
+    用法:
+        cache = EmbeddingDiskCache("./embed_cache/embeddings.sqlite3", namespace="bge-small-zh")
+        vectors = cache.get_many(texts)      # 未命中的位置为 None
+        cache.put_many(missing_texts, missing_vectors)
+    """
+
+    def __init__(self, path: str, namespace: str = ""):
+        """
+        Args:
+            path: SQLite 文件路径
+            namespace: 命名空间，不同模型配置的向量互不命中
+        """
+        self.path = path
+        self.namespace = namespace
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL) WITHOUT ROWID"
+        )
+        self._conn.commit()
+        self._lock = Lock()
+
+    def _key(self, text: str) -> bytes:
+        """命名空间 + 文本内容的 128 位哈希"""
+        raw = f"{self.namespace}\0{text}".encode("utf-8")
+        return hashlib.blake2b(raw, digest_size=16).digest()
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """批量读取向量，返回与 texts 对齐的列表，未命中的位置为 None"""
+        keys = [self._key(text) for text in texts]
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _QUERY_BATCH):
+                batch = keys[start:start + _QUERY_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update(rows)
+        return [
+            np.frombuffer(found[key], dtype=np.float32) if key in found else None
+            for key in keys
+        ]
+
+    def put_many(self, texts: Sequence[str], vectors) -> None:
+        """批量写入向量（float32 原样保存，读出后与模型输出完全一致）"""
+        rows = [
+            (self._key(text), np.asarray(vector, dtype=np.float32).tobytes())
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
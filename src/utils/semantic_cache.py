@@ -0,0 +1,148 @@
+"""语义缓存 - 按向量余弦相似度命中近似重复的查询
+
+所有缓存向量预先 L2 归一化，连续存放在一个 (N, d) 的 float32 矩阵中（SoA 布局），
+一次查找只需一次矩阵-向量乘法，而不是逐条计算点积。
+"""
+
+import logging
+from threading import Lock
+from typing import Any, Callable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """基于余弦相似度的语义缓存
+
+    用法:
+        cache = SemanticCache(threshold=0.95)
+        hit = cache.lookup(query_embedding)
+        if hit is None:
+            cache.add(query_embedding, answer)
+    """
+
+    GROWTH_FACTOR = 1.5
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        max_entries: int = 512,
+        initial_capacity: int = 64,
+    ):
+        """
+        Args:
+            threshold: 命中所需的最小余弦相似度
+            max_entries: 最大缓存条目数，写满后覆盖最旧的条目
+            initial_capacity: 初始预分配的行数
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._initial_capacity = max(1, min(initial_capacity, max_entries))
+
+        # 归一化向量矩阵与对应的缓存值（两者按行对齐）
+        self._matrix: Optional[np.ndarray] = None
+        self._values: List[Any] = []
+        self._count = 0
+        self._cursor = 0  # 写满后下一个被覆盖的行（即最旧的条目）
+        self._lock = Lock()
+
+    @staticmethod
+    def _normalize(embedding) -> Optional[np.ndarray]:
+        """转换为 float32 并做 L2 归一化，零向量返回 None"""
+        vec = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(vec))
+        if norm == 0.0:
+            return None
+        return vec / norm
+
+    def _ensure_capacity(self, dim: int):
+        """按增长因子扩容矩阵，避免每次插入都重新分配"""
+        if self._matrix is None:
+            self._matrix = np.empty((self._initial_capacity, dim), dtype=np.float32)
+            return
+
+        capacity = self._matrix.shape[0]
+        if self._count < capacity or capacity >= self.max_entries:
+            return
+
+        new_capacity = min(self.max_entries, max(capacity + 1, int(capacity * self.GROWTH_FACTOR)))
+        grown = np.empty((new_capacity, dim), dtype=np.float32)
+        grown[:self._count] = self._matrix[:self._count]
+        self._matrix = grown
+
+    def lookup(self, embedding, accept: Optional[Callable[[Any], bool]] = None) -> Optional[Any]:
+        """查找与给定向量足够相似的缓存值
+
+        Args:
+            embedding: 查询向量
+            accept: 可选的过滤条件，按相似度从高到低返回第一个满足条件的缓存值
+
+        Returns:
+            命中的缓存值，未命中返回 None
+        """
+        query = self._normalize(embedding)
+        if query is None:
+            return None
+
+        with self._lock:
+            if self._count == 0 or self._matrix.shape[1] != query.shape[0]:
+                return None
+
+            sims = self._matrix[:self._count] @ query
+            if accept is None:
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    return self._values[best]
+                return None
+
+            candidates = np.flatnonzero(sims >= self.threshold)
+            for row in candidates[np.argsort(-sims[candidates], kind="stable")]:
+                value = self._values[row]
+                if accept(value):
+                    return value
+        return None
+
+    def add(self, embedding, value: Any):
+        """写入缓存
+
+        Args:
+            embedding: 查询向量
+            value: 缓存值
+        """
+        vec = self._normalize(embedding)
+        if vec is None:
+            return
+
+        with self._lock:
+            if self._matrix is not None and self._matrix.shape[1] != vec.shape[0]:
+                # 向量维度变化（如切换了嵌入模型），旧缓存已无意义
+                logger.info("[SemanticCache] 向量维度变化，清空缓存")
+                self._reset()
+
+            if self._count < self.max_entries:
+                self._ensure_capacity(vec.shape[0])
+                row = self._count
+                self._values.append(value)
+                self._count += 1
+            else:
+                row = self._cursor
+                self._values[row] = value
+                self._cursor = (self._cursor + 1) % self.max_entries
+
+            self._matrix[row] = vec
+
+    def _reset(self):
+        self._matrix = None
+        self._values = []
+        self._count = 0
+        self._cursor = 0
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._reset()
+
+    def __len__(self) -> int:
+        return self._count
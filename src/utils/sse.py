@@ -0,0 +1,34 @@
+"""SSE（Server-Sent Events）帧编码"""
+
+import json
+from typing import Any, Dict
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def sse_event(payload: Dict[str, Any]) -> bytes:
+    """编码一条 SSE 事件，安装了 orjson 时使用其 C 实现序列化
+
+    Args:
+        payload: 事件内容（JSON 可序列化的字典）
+
+    Returns:
+        `data: <json>\\n\\n` 格式的 UTF-8 字节串
+    """
+    if orjson is not None:
+        return b"data: " + orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS) + b"\n\n"
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+# 内容固定的事件帧，预先编码
+SSE_DONE = sse_event({"type": "done"})
+
+# SSE 响应头：禁止代理（如 Nginx）缓冲和压缩改写，保证事件即时送达
+SSE_HEADERS = {
+    "Cache-Control": "no-cache, no-transform",
+    "X-Accel-Buffering": "no",
+    "Connection": "keep-alive",
+}
@@ -0,0 +1,43 @@
+"""Agent 流式推理单元测试"""
+
+from src.agent.base import AgentConfig, BaseAgent
+
+
+class FakeStreamingLLM:
+    """按给定的 token 序列流式输出"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+
+    def stream(self, prompt):
+        return iter(self.tokens)
+
+
+class StreamAgent(BaseAgent):
+    """不带工具的最小 Agent"""
+
+    def __init__(self, tokens):
+        self.config = AgentConfig(max_iterations=1, verbose=False)
+        self.tools = {}
+        self.thought_history = []
+        self.llm_streaming = FakeStreamingLLM(tokens)
+
+    def setup_tools(self):
+        pass
+
+
+def _streamed_answer(tokens):
+    return "".join(event.data for event in StreamAgent(tokens).run_stream("q") if event.type == "answer_token")
+
+
+class TestAgentStream:
+    """BaseAgent.run_stream 测试类"""
+
+    def test_split_stop_marker_is_not_streamed(self):
+        """测试被拆到多个 token 的停止标记不会发送给客户端"""
+        tokens = ["Thought: x\nFinal Answer: hello", " world", "\n ", "\nThou", "ght: more"]
+        assert _streamed_answer(tokens) == "hello world"
+
+    def test_held_tail_is_released_when_not_a_marker(self):
+        """测试暂缓的结尾确认不是停止标记后照常发送"""
+        assert _streamed_answer(["Final Answer: a\nThou", "sands of", " things"]) == "a\nThousands of things"
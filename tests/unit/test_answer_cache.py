@@ -0,0 +1,62 @@
+"""答案缓存单元测试"""
+
+from unittest.mock import patch
+
+from src.api.routes import _answer_cache_scope
+from src.models.schemas import ConversationMessage, QueryRequest
+from src.utils.answer_cache import AnswerCache
+
+
+class TestAnswerCache:
+    """AnswerCache 测试类"""
+
+    def setup_method(self):
+        """测试前初始化"""
+        self.cache = AnswerCache(max_size=2, ttl=10.0)
+
+    def test_exact_hit(self):
+        """测试归一化后的问题精确命中"""
+        self.cache.put(AnswerCache.make_key("s", "What is RAG?"), "a")
+        assert self.cache.get(AnswerCache.make_key("s", "  what is rag? ")) == "a"
+
+    def test_scope_isolates_entries(self):
+        """测试不同作用域互不命中"""
+        self.cache.put(AnswerCache.make_key("s1", "q"), "a", scope="s1", embedding=[1.0, 0.0])
+        assert self.cache.get(AnswerCache.make_key("s2", "q")) is None
+        assert self.cache.get_similar("s2", [1.0, 0.0]) is None
+        assert self.cache.get_similar("s1", [0.99, 0.01]) == "a"
+
+    def test_similar_entry_in_other_scope_does_not_shadow(self):
+        """测试其它作用域中更相近的条目不影响本作用域的语义命中"""
+        self.cache.put(AnswerCache.make_key("s1", "q1"), "a1", scope="s1", embedding=[0.98, 0.2])
+        self.cache.put(AnswerCache.make_key("s2", "q2"), "a2", scope="s2", embedding=[1.0, 0.0])
+        assert self.cache.get_similar("s1", [1.0, 0.0]) == "a1"
+
+    def test_expired_entry(self):
+        """测试过期条目视为未命中"""
+        key = AnswerCache.make_key("s", "q")
+        with patch("src.utils.answer_cache.time.monotonic", return_value=0.0):
+            self.cache.put(key, "a")
+        with patch("src.utils.answer_cache.time.monotonic", return_value=11.0):
+            assert self.cache.get(key) is None
+
+    def test_clear(self):
+        """测试清空缓存"""
+        key = AnswerCache.make_key("s", "q")
+        self.cache.put(key, "a", scope="s", embedding=[1.0])
+        self.cache.clear()
+        assert self.cache.get(key) is None
+        assert self.cache.get_similar("s", [1.0]) is None
+
+    def test_paraphrase_hits_in_same_conversation_state(self):
+        """测试同一对话状态下的同义问题落入同一作用域并命中语义缓存"""
+        prior = [ConversationMessage(role="user", content="你好"), ConversationMessage(role="assistant", content="你好！")]
+
+        def scope(question):
+            req = QueryRequest(question=question, provider="ollama")
+            return _answer_cache_scope(req, "ollama", prior + [ConversationMessage(role="user", content=question)])
+
+        first, second = scope("什么是RAG"), scope("RAG是什么")
+        assert first == second
+        self.cache.put(AnswerCache.make_key(first, "什么是RAG"), "a", scope=first, embedding=[1.0, 0.0])
+        assert self.cache.get_similar(second, [0.99, 0.05]) == "a"
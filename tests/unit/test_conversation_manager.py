@@ -0,0 +1,115 @@
+"""对话管理器单元测试"""
+
+import json
+from unittest.mock import patch
+
+from src.services.conversation_manager import ConversationManager
+
+
+class TestConversationManager:
+    """ConversationManager 测试类"""
+
+    def test_batch_writes_each_conversation_once(self, tmp_path):
+        """测试批量添加消息时每个会话只写一次磁盘"""
+        manager = ConversationManager(storage_path=str(tmp_path))
+        with patch.object(manager, "save_conversation", wraps=manager.save_conversation) as save:
+            manager.add_messages_batch([
+                ("c1", "user", "q1"),
+                ("c1", "assistant", "a1"),
+                ("c2", "user", "q2"),
+            ], save_to_disk=True)
+
+        assert [call.args[0] for call in save.call_args_list] == ["c1", "c2"]
+        lines = (tmp_path / "c1.jsonl").read_text(encoding="utf-8").splitlines()
+        assert [json.loads(line)["content"] for line in lines] == ["q1", "a1"]
+
+    def test_batch_updates_memory_without_disk(self, tmp_path):
+        """测试不写盘时内存中的历史立即可见"""
+        manager = ConversationManager(storage_path=str(tmp_path))
+        manager.add_messages_batch([("c1", "user", "q"), ("c1", "assistant", "a")])
+
+        assert [msg.role for msg in manager.get_history("c1")] == ["user", "assistant"]
+        assert not (tmp_path / "c1.jsonl").exists()
+
+    def test_batch_returns_every_added_message(self, tmp_path):
+        """测试批量添加与添加一轮问答都返回全部新增的消息"""
+        manager = ConversationManager(storage_path=str(tmp_path))
+        added = manager.add_messages_batch([("c1", "user", "q1"), ("c2", "user", "q2"), ("c1", "assistant", "a1")])
+
+        assert [msg.content for msg in added] == ["q1", "q2", "a1"]
+        assert [msg.role for msg in manager.add_turn("c3", "q", "a")] == ["user", "assistant"]
+
+    def test_formatted_history_invalidated_on_new_message(self, tmp_path):
+        """测试格式化历史缓存在新增消息后失效"""
+        manager = ConversationManager(storage_path=str(tmp_path))
+        manager.add_message("c1", "user", "q1")
+        first = manager.format_history_for_llm("c1")
+
+        assert manager.format_history_for_llm("c1") is first
+        manager.add_message("c1", "assistant", "a1")
+        assert manager.format_history_for_llm("c1") == "1. 👤 用户: q1\n2. 🤖 助手: a1"
+
+    def test_add_turn_writes_once(self, tmp_path):
+        """测试一轮问答只写一次磁盘"""
+        manager = ConversationManager(storage_path=str(tmp_path))
+        with patch.object(manager, "save_conversation", wraps=manager.save_conversation) as save:
+            manager.add_turn("c1", "q", "a", save_to_disk=True)
+
+        assert save.call_count == 1
+        assert [msg.content for msg in manager.get_history("c1")] == ["q", "a"]
+
+    def test_summary_is_cached_until_file_changes(self, tmp_path):
+        """测试会话摘要在文件未变化时不重复读盘"""
+        manager = ConversationManager(storage_path=str(tmp_path))
+        manager.add_turn("c1", "q", "a", save_to_disk=True)
+        manager.get_summary("c1")
+
+        with patch.object(manager, "load_conversation", wraps=manager.load_conversation) as load:
+            summary = manager.get_summary("c1")
+        assert load.call_count == 0
+        assert summary["title"] == "q"
+        assert summary["message_count"] == 2
+
+        manager.add_message("c1", "user", "q2")
+        assert manager.get_summary("c1")["message_count"] == 3
+
+    def test_save_and_load_roundtrip(self, tmp_path):
+        """测试保存后重新加载得到相同的历史"""
+        manager = ConversationManager(storage_path=str(tmp_path))
+        manager.add_turn("c1", "你好", "你好！有什么可以帮你？", save_to_disk=True)
+
+        reloaded = ConversationManager(storage_path=str(tmp_path))
+        assert reloaded.load_conversation("c1")
+        assert [(m.role, m.content) for m in reloaded.get_history("c1")] == [
+            ("user", "你好"),
+            ("assistant", "你好！有什么可以帮你？"),
+        ]
+
+    def test_save_appends_only_new_messages(self, tmp_path):
+        """测试再次保存时只追加新增的消息"""
+        manager = ConversationManager(storage_path=str(tmp_path))
+        manager.add_turn("c1", "q1", "a1", save_to_disk=True)
+        manager.add_turn("c1", "q2", "a2", save_to_disk=True)
+
+        lines = (tmp_path / "c1.jsonl").read_text(encoding="utf-8").splitlines()
+        assert [json.loads(line)["content"] for line in lines] == ["q1", "a1", "q2", "a2"]
+
+        manager.clear_conversation("c1")
+        manager.add_message("c1", "user", "q3", save_to_disk=True)
+        lines = (tmp_path / "c1.jsonl").read_text(encoding="utf-8").splitlines()
+        assert [json.loads(line)["content"] for line in lines] == ["q3"]
+
+    def test_load_legacy_json_file(self, tmp_path):
+        """测试兼容旧版整文件 JSON，保存后迁移为 JSONL"""
+        (tmp_path / "c1.json").write_text(
+            json.dumps([{"role": "user", "content": "q", "timestamp": "2025-01-01T00:00:00"}]),
+            encoding="utf-8",
+        )
+        manager = ConversationManager(storage_path=str(tmp_path))
+        assert manager.list_conversations() == ["c1"]
+        assert manager.load_conversation("c1")
+
+        manager.add_message("c1", "assistant", "a", save_to_disk=True)
+        assert not (tmp_path / "c1.json").exists()
+        reloaded = ConversationManager(storage_path=str(tmp_path))
+        assert [m.content for m in reloaded.get_history("c1")] == ["q", "a"]
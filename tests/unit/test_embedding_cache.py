@@ -0,0 +1,27 @@
+"""向量磁盘缓存单元测试"""
+
+import numpy as np
+
+from src.utils.embedding_cache import EmbeddingDiskCache
+
+
+class TestEmbeddingDiskCache:
+    """EmbeddingDiskCache 测试类"""
+
+    def test_round_trip_keeps_order(self, tmp_path):
+        """测试写入后按原顺序读出，未命中的位置为 None"""
+        cache = EmbeddingDiskCache(str(tmp_path / "emb.sqlite3"), namespace="m")
+        cache.put_many(["a", "b"], np.array([[1.0, 2.0], [3.0, 4.0]], dtype=np.float32))
+
+        vectors = cache.get_many(["b", "c", "a"])
+        assert vectors[1] is None
+        np.testing.assert_array_equal(vectors[0], [3.0, 4.0])
+        np.testing.assert_array_equal(vectors[2], [1.0, 2.0])
+
+    def test_namespace_isolation(self, tmp_path):
+        """测试不同命名空间（模型配置）的向量互不命中"""
+        path = str(tmp_path / "emb.sqlite3")
+        EmbeddingDiskCache(path, namespace="model-a").put_many(["a"], [[1.0]])
+
+        assert EmbeddingDiskCache(path, namespace="model-b").get_many(["a"]) == [None]
+        assert EmbeddingDiskCache(path, namespace="model-a").get_many(["a"])[0] is not None
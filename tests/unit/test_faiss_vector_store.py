@@ -0,0 +1,72 @@
+"""FAISS 向量库单元测试"""
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from src.config.settings import Config
+from src.core.faiss_vector_store import FaissVectorStore, _pq_subquantizers
+
+
+class RandomEmbeddings:
+    """随机向量；以 "q" 开头的文本映射到固定的查询向量"""
+
+    def __init__(self, dim=16):
+        self.dim = dim
+        self.rng = np.random.default_rng(0)
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) if t.startswith("q") else list(self.rng.standard_normal(self.dim)) for t in texts]
+
+    def embed_query(self, text):
+        return [1.0] * self.dim
+
+
+class TestFaissVectorStore:
+    """FaissVectorStore 测试类"""
+
+    def test_pq_subquantizers_divide_dimension(self):
+        """测试 PQ 子向量数取能整除维度的最大值"""
+        assert _pq_subquantizers(512, 32) == 32
+        assert _pq_subquantizers(384, 32) == 32
+        assert _pq_subquantizers(100, 32) == 25
+        assert _pq_subquantizers(8, 32) == 8
+
+    def test_switches_to_ivfpq_and_persists(self, tmp_path, monkeypatch):
+        """测试文档块数达到阈值后升级为 IVF-PQ 索引，保存后可重新加载检索"""
+        faiss = pytest.importorskip("faiss")
+        monkeypatch.setattr(Config, "FAISS_MIN_TRAIN_SIZE", 1000)
+        docs = [Document(page_content=f"d{i}", metadata={"source": f"s{i % 3}"}) for i in range(1200)]
+        docs.append(Document(page_content="q", metadata={"source": "target"}))
+
+        store = FaissVectorStore(persist_directory=str(tmp_path), embeddings=RandomEmbeddings())
+        store.create_vectorstore(docs, batch_size=500)
+        assert isinstance(store.vectorstore.index, faiss.IndexIVFPQ)
+
+        reloaded = FaissVectorStore(persist_directory=str(tmp_path), embeddings=RandomEmbeddings())
+        assert reloaded.count() == len(docs)
+        assert reloaded.get_document_list() == ["s0", "s1", "s2", "target"]
+        doc, _ = reloaded.similarity_search_with_score("q", k=1)[0]
+        assert doc.metadata["source"] == "target"
+
+    def test_sq8_index_with_refine(self, tmp_path, monkeypatch):
+        """测试 int8 标量量化索引在开启重排时保存原始向量并恢复重排倍数"""
+        faiss = pytest.importorskip("faiss")
+        monkeypatch.setattr(Config, "FAISS_MIN_TRAIN_SIZE", 500)
+        monkeypatch.setattr(Config, "FAISS_CODEC", "sq8")
+        monkeypatch.setattr(Config, "FAISS_REFINE_K_FACTOR", 4)
+        docs = [Document(page_content=f"d{i}", metadata={"source": "s"}) for i in range(600)]
+        docs.append(Document(page_content="q", metadata={"source": "target"}))
+
+        store = FaissVectorStore(persist_directory=str(tmp_path), embeddings=RandomEmbeddings())
+        store.create_vectorstore(docs)
+        ivf = faiss.downcast_index(faiss.extract_index_ivf(store.vectorstore.index))
+        assert isinstance(ivf, faiss.IndexIVFScalarQuantizer)
+
+        reloaded = FaissVectorStore(persist_directory=str(tmp_path), embeddings=RandomEmbeddings())
+        reloaded.load_vectorstore()
+        assert isinstance(reloaded.vectorstore.index, faiss.IndexRefine)
+        assert reloaded.vectorstore.index.k_factor == 4
+        doc, distance = reloaded.similarity_search_with_score("q", k=1)[0]
+        assert doc.metadata["source"] == "target"
+        assert distance == pytest.approx(0.0, abs=1e-4)
@@ -0,0 +1,145 @@
+"""查询缓存单元测试"""
+
+from unittest.mock import patch
+
+from src.agent.base import AgentConfig, AgentResponse
+from src.agent.intent_router import IntentAnalysis, IntentType
+from src.agent.rag_agent import QueryCache, QueryCacheConfig, RAGAgent
+from src.agent.tools.base import ToolResult
+
+
+class TestQueryCache:
+    """QueryCache 测试类"""
+
+    def setup_method(self):
+        """测试前初始化"""
+        self.cache = QueryCache(QueryCacheConfig(max_size=2, ttl=10.0))
+
+    def test_key_is_normalized(self):
+        """测试问题归一化后生成相同的键"""
+        assert QueryCache.make_key("  What is RAG? ") == QueryCache.make_key("what is rag?")
+
+    def test_hit_returns_copy(self):
+        """测试命中时返回副本，修改不影响缓存"""
+        key = QueryCache.make_key("q")
+        self.cache.put(key, AgentResponse(success=True, answer="a", tools_used=["rag_search"]))
+
+        cached = self.cache.get(key)
+        cached.tools_used.append("web_search")
+
+        assert self.cache.get(key).tools_used == ["rag_search"]
+        assert self.cache.stats()["hits"] == 2
+
+    def test_miss(self):
+        """测试未命中计数"""
+        assert self.cache.get(QueryCache.make_key("unknown")) is None
+        assert self.cache.stats()["misses"] == 1
+
+    def test_expired_entry_is_dropped(self):
+        """测试过期条目视为未命中"""
+        key = QueryCache.make_key("q")
+        with patch("src.agent.rag_agent.time.monotonic", return_value=0.0):
+            self.cache.put(key, AgentResponse(success=True, answer="a"))
+        with patch("src.agent.rag_agent.time.monotonic", return_value=11.0):
+            assert self.cache.get(key) is None
+        stats = self.cache.stats()
+        assert stats["size"] == 0
+        assert stats["evictions"] == 1
+
+    def test_lru_eviction(self):
+        """测试超出容量时淘汰最久未使用的条目"""
+        k1, k2, k3 = (QueryCache.make_key(q) for q in ("q1", "q2", "q3"))
+        self.cache.put(k1, AgentResponse(success=True, answer="1"))
+        self.cache.put(k2, AgentResponse(success=True, answer="2"))
+        self.cache.get(k1)
+        self.cache.put(k3, AgentResponse(success=True, answer="3"))
+
+        assert self.cache.get(k2) is None
+        assert self.cache.get(k1).answer == "1"
+        assert self.cache.get(k3).answer == "3"
+
+    def test_evict_all(self):
+        """测试清空缓存"""
+        self.cache.put(QueryCache.make_key("q"), AgentResponse(success=True, answer="a"))
+        self.cache.evict()
+        assert self.cache.stats()["size"] == 0
+
+    def test_semantic_hit(self):
+        """测试语义相近的问题命中缓存"""
+        key = QueryCache.make_key("什么是RAG")
+        self.cache.put(key, AgentResponse(success=True, answer="a"), embedding=[1.0, 0.0])
+
+        assert self.cache.get_similar([0.99, 0.02]).answer == "a"
+        assert self.cache.get_similar([0.0, 1.0]) is None
+        stats = self.cache.stats()
+        assert stats["semantic_hits"] == 1
+        assert stats["semantic_misses"] == 1
+
+    def test_semantic_disabled(self):
+        """测试关闭语义匹配"""
+        cache = QueryCache(QueryCacheConfig(semantic=False))
+        cache.put(QueryCache.make_key("q"), AgentResponse(success=True, answer="a"), embedding=[1.0])
+        assert cache.get_similar([1.0]) is None
+
+    def test_negative_entry_expires(self):
+        """测试负缓存在较短有效期后失效"""
+        key = QueryCache.make_key("off topic")
+        with patch("src.agent.rag_agent.time.monotonic", return_value=0.0):
+            self.cache.put_negative(key)
+            assert self.cache.is_negative(key)
+        with patch("src.agent.rag_agent.time.monotonic", return_value=61.0):
+            assert not self.cache.is_negative(key)
+        assert self.cache.stats()["negative_hits"] == 1
+
+
+class FakeRouter:
+    """始终判定为高置信度的知识库问题"""
+
+    def analyze_intent(self, question, chat_history, current_date):
+        return IntentAnalysis(
+            intent=IntentType.KNOWLEDGE_BASE,
+            confidence=0.9,
+            reasoning="",
+            suggested_tools=["rag_search"],
+            sub_questions=[],
+            needs_realtime=False,
+            topic_keywords=[],
+        )
+
+    def get_routing_decision(self, analysis):
+        return {}
+
+
+class FakeRAGTool:
+    """模拟知识库中没有相关文档：生成路径返回无法回答的文本且没有来源"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def execute(self, **kwargs):
+        self.calls += 1
+        return ToolResult(
+            success=True,
+            output="**答案**: 我无法根据现有知识库中的信息回答这个问题",
+            data={"answer": "我无法根据现有知识库中的信息回答这个问题", "sources": []},
+        )
+
+
+class TestSmartQueryNegativeCache:
+    """smart_query 负缓存测试类"""
+
+    def test_repeated_miss_skips_tool(self):
+        """测试知识库无来源的问题再次提问时命中负缓存，不再调用检索工具"""
+        agent = object.__new__(RAGAgent)
+        agent.config = AgentConfig(verbose=False)
+        agent.query_cache = QueryCache(QueryCacheConfig(semantic=False))
+        agent._intent_router = FakeRouter()
+        agent._rag_tool = FakeRAGTool()
+        agent._current_conversation_id = None
+
+        agent.smart_query("不存在的问题", save_to_history=False)
+        response = agent.smart_query("不存在的问题", save_to_history=False)
+
+        assert agent._rag_tool.calls == 1
+        assert response.answer == QueryCache.NEGATIVE_ANSWER
+        assert agent.query_cache.stats()["negative_hits"] == 1
@@ -0,0 +1,67 @@
+"""语义缓存单元测试"""
+
+import numpy as np
+
+from src.utils.semantic_cache import SemanticCache
+
+
+class TestSemanticCache:
+    """SemanticCache 测试类"""
+
+    def setup_method(self):
+        """测试前初始化"""
+        self.cache = SemanticCache(threshold=0.95, max_entries=4, initial_capacity=2)
+
+    def test_hit_on_similar_vector(self):
+        """测试相似向量命中"""
+        self.cache.add([1.0, 0.0, 0.0], "answer")
+        assert self.cache.lookup([0.99, 0.01, 0.0]) == "answer"
+
+    def test_miss_on_dissimilar_vector(self):
+        """测试不相似向量不命中"""
+        self.cache.add([1.0, 0.0, 0.0], "answer")
+        assert self.cache.lookup([0.0, 1.0, 0.0]) is None
+
+    def test_lookup_is_scale_invariant(self):
+        """测试查询与向量长度无关"""
+        self.cache.add([2.0, 0.0], "answer")
+        assert self.cache.lookup([10.0, 0.0]) == "answer"
+
+    def test_zero_vector_ignored(self):
+        """测试零向量不会写入或命中"""
+        self.cache.add([0.0, 0.0], "answer")
+        assert len(self.cache) == 0
+        assert self.cache.lookup([0.0, 0.0]) is None
+
+    def test_grows_beyond_initial_capacity(self):
+        """测试超过初始容量后自动扩容"""
+        basis = np.eye(4)
+        for i in range(3):
+            self.cache.add(basis[i], i)
+        assert len(self.cache) == 3
+        for i in range(3):
+            assert self.cache.lookup(basis[i]) == i
+
+    def test_evicts_oldest_when_full(self):
+        """测试写满后覆盖最旧条目"""
+        basis = np.eye(5)
+        for i in range(5):
+            self.cache.add(basis[i], i)
+        assert len(self.cache) == 4
+        assert self.cache.lookup(basis[0]) is None
+        assert self.cache.lookup(basis[4]) == 4
+
+    def test_dimension_change_resets(self):
+        """测试向量维度变化时清空旧缓存"""
+        self.cache.add([1.0, 0.0], "old")
+        self.cache.add([1.0, 0.0, 0.0], "new")
+        assert len(self.cache) == 1
+        assert self.cache.lookup([1.0, 0.0]) is None
+        assert self.cache.lookup([1.0, 0.0, 0.0]) == "new"
+
+    def test_clear(self):
+        """测试清空缓存"""
+        self.cache.add([1.0, 0.0], "answer")
+        self.cache.clear()
+        assert len(self.cache) == 0
+        assert self.cache.lookup([1.0, 0.0]) is None
@@ -0,0 +1,137 @@
+"""向量库检索缓存单元测试"""
+
+from unittest.mock import patch
+
+from src.config.settings import Config
+from src.core import vector_store as vector_store_module
+from src.core.vector_store import VectorStore
+
+
+class FakeEmbeddings:
+    """按文本长度生成二维向量，并记录调用次数"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return [float(len(text)), 1.0]
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+class FakeCollection:
+    """按向量批量查询，记录调用次数"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def query(self, query_embeddings, n_results, include):
+        self.calls += 1
+        return {
+            "documents": [[f"{vec[0]}-{i}" for i in range(n_results)] for vec in query_embeddings],
+            "metadatas": [[None] * n_results for _ in query_embeddings],
+            "distances": [[float(i) for i in range(n_results)] for _ in query_embeddings],
+        }
+
+
+class FakeChroma:
+    """记录按向量检索的调用次数"""
+
+    def __init__(self):
+        self.calls = 0
+        self._collection = FakeCollection()
+
+    def add_documents(self, documents):
+        pass
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding, k=4):
+        self.calls += 1
+        return [(f"doc{i}", float(i)) for i in range(k)]
+
+
+class TestVectorStoreCache:
+    """VectorStore 检索缓存测试类"""
+
+    def setup_method(self):
+        """测试前初始化"""
+        self.embeddings = FakeEmbeddings()
+        self.store = VectorStore(persist_directory="unused", embeddings=self.embeddings)
+        self.store.vectorstore = FakeChroma()
+
+    def test_repeated_query_is_embedded_once(self):
+        """测试相同问题只向量化一次，检索结果直接复用"""
+        first = self.store.similarity_search_with_score("什么是RAG", k=3)
+        second = self.store.similarity_search_with_score("什么是RAG", k=3)
+
+        assert first == second
+        assert self.embeddings.calls == 1
+        assert self.store.vectorstore.calls == 1
+
+    def test_cached_results_need_enough_candidates(self):
+        """测试缓存的结果数少于请求的 k 时重新检索"""
+        self.store.similarity_search_with_score("q", k=2)
+        assert len(self.store.similarity_search_with_score("q", k=1)) == 1
+        assert len(self.store.similarity_search_with_score("q", k=5)) == 5
+        assert self.store.vectorstore.calls == 2
+
+    def test_clear_search_cache(self):
+        """测试知识库变化后检索缓存失效"""
+        self.store.similarity_search_with_score("q", k=2)
+        self.store.clear_search_cache()
+        self.store.similarity_search_with_score("q", k=2)
+        assert self.store.vectorstore.calls == 2
+
+    def test_write_through_other_instance_invalidates_cache(self):
+        """测试另一个实例写入知识库后，本实例的检索结果缓存失效"""
+        other = VectorStore(persist_directory="unused", embeddings=FakeEmbeddings())
+        other.vectorstore = FakeChroma()
+
+        self.store.similarity_search_with_score("q", k=2)
+        other.add_documents(["new"])
+        self.store.similarity_search_with_score("q", k=2)
+        assert self.store.vectorstore.calls == 2
+
+    def test_query_embedding_cache_normalizes_text(self):
+        """测试全角字符与首尾空白归一化后命中同一条向量缓存"""
+        self.store.embed_query("ＲＡＧ 是什么")
+        self.store.embed_query("  RAG 是什么\n")
+
+        assert self.embeddings.calls == 1
+        assert self.store.embeddings.stats()["hits"] == 1
+
+    def test_search_many_batches_embedding_and_query(self):
+        """测试批量检索只编码一次、查询一次，并复用单条检索的缓存"""
+        self.store.similarity_search_with_score("q", k=2)
+        results = self.store.similarity_search_many_with_score(["q", "qq", "qqq"], k=2)
+
+        assert [len(found) for found in results] == [2, 2, 2]
+        assert results[1][0][0].page_content == "2.0-0"
+        assert self.embeddings.calls == 2
+        assert self.store.vectorstore._collection.calls == 1
+
+    def test_pipelined_search_matches_serial(self):
+        """测试流水线检索按顺序返回与逐个检索相同的结果"""
+        queries = ["q", "qq", "qqq"]
+        pipelined = list(self.store.similarity_search_pipelined(queries, k=2))
+        self.store.clear_search_cache()
+
+        assert pipelined == [self.store.similarity_search_with_score(q, k=2) for q in queries]
+        assert self.embeddings.calls == 3
+
+    def test_local_providers_share_one_embedding_model(self):
+        """测试非 OpenAI 的模型提供者共用同一个本地 Embedding 模型"""
+        vector_store_module._create_embeddings.cache_clear()
+        try:
+            with patch.object(vector_store_module, "SentenceTransformer", object), \
+                    patch.object(vector_store_module, "LocalEmbeddings", FakeEmbeddings):
+                models = []
+                for provider in ("ollama", "deepseek", "gemini"):
+                    with patch.object(Config, "get_model_provider", return_value=provider):
+                        models.append(vector_store_module.get_default_embeddings())
+        finally:
+            vector_store_module._create_embeddings.cache_clear()
+
+        assert models[0] is models[1] is models[2]